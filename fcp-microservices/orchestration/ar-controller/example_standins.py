@@ -0,0 +1,50 @@
+'''
+    Example stand-ins for local_runner.py.
+
+    Mimic the event and response shapes of the three Lambdas the AR controller
+    state machine invokes, with a fixed delay in place of their real work.
+    Copy this module and replace the functions (or call the real handlers) to
+    profile something closer to production. FAIL_RATE makes the stand-ins fail
+    with a Lambda throttling error now and then, which exercises the Retry
+    policies of the definition.
+
+        STANDIN_DELAY_MS    simulated work per invocation (default 20)
+        STANDIN_FAIL_RATE   fraction of invocations throttled (default 0)
+'''
+import os
+import random
+from time import sleep
+
+from local_runner import StateError
+
+DELAY_MS = float(os.environ.get("STANDIN_DELAY_MS", "20"))
+FAIL_RATE = float(os.environ.get("STANDIN_FAIL_RATE", "0"))
+
+
+def simulate_work():
+    if random.random() < FAIL_RATE:
+        raise StateError("Lambda.TooManyRequestsException", "Rate Exceeded.")
+    sleep(DELAY_MS / 1000)
+
+
+def prompt_processor(event, context):
+    simulate_work()
+    return {**event, "entities": {"customer_name": "Kaiser", "subsidiary": None}}
+
+
+def sql_generator(event, context):
+    simulate_work()
+    customer = event.get("entities", {}).get("customer_name")
+    return {"statusCode": 200, "body": f"SELECT * FROM ar_aging WHERE customer_name ILIKE '%{customer}%'"}
+
+
+def sql_executor(event, context):
+    simulate_work()
+    return {"statusCode": 200, "body": {"query_string": event["input"]["query_string"], "user": event["input"]["user_info"]["username"], "rows": []}}
+
+
+STANDINS = {
+    "test_prompt_processor": prompt_processor,
+    "test_sql_gen": sql_generator,
+    "fincopilot_dalsf_dev_autodeploy_lambda_function": sql_executor,
+}
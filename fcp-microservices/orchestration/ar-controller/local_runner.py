@@ -0,0 +1,328 @@
+'''
+    Local runner for the AR controller state machine.
+
+    Interprets the Step Functions definition (Amazon States Language) in
+    fincopilot_arcontroller_dev_autodeploy_step_function.txt without AWS: every
+    Lambda the definition invokes is replaced by a Python stand-in, and the
+    latency of every state (with its retries) is recorded, so the pipeline can
+    be profiled end to end offline.
+
+    Supported subset of the language:
+        States      Task, Pass, Wait, Succeed, Fail
+        Tasks       arn:aws:states:::lambda:invoke (result wrapped in Payload,
+                    StatusCode, ...) and plain Lambda function ARNs
+        Paths       InputPath, Parameters (".$" keys, "$$." context paths),
+                    ResultSelector, ResultPath, OutputPath; JSONPath limited to
+                    $, .field, ['field'] and [index]
+        Errors      Retry (ErrorEquals, IntervalSeconds, MaxAttempts,
+                    BackoffRate, MaxDelaySeconds) and Catch
+
+    Stand-ins are callables taking (event, context), registered under the
+    function name, the function ARN, the FunctionName parameter or the state
+    name. A stand-in raising StateError fails the task with that error name
+    (for example "Lambda.TooManyRequestsException"); any other exception fails
+    it with the exception class name, like a Lambda errorType.
+
+    Usage:
+        python local_runner.py --input input.json --standins example_standins [--repeat N] [--no-wait]
+'''
+import argparse
+import copy
+import importlib
+import json
+import os
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+DEFAULT_DEFINITION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fincopilot_arcontroller_dev_autodeploy_step_function.txt")
+LAMBDA_INVOKE = "arn:aws:states:::lambda:invoke"
+FUNCTION_ARN = re.compile(r"^arn:aws:lambda:[^:]*:[^:]*:function:([^:]+)(?::.+)?$")
+PATH_TOKEN = re.compile(r"\.([^.\[\]]+)|\['([^']*)'\]|\[(\d+)\]")
+
+
+class StateError(Exception):
+    '''
+    Task failure with an explicit States Language error name.
+    '''
+    def __init__(self, error, cause=""):
+        super().__init__(f"{error}: {cause}" if cause else error)
+        self.error = error
+        self.cause = cause
+
+
+class ExecutionFailed(Exception):
+    def __init__(self, state, error, cause, trace):
+        super().__init__(f"{state} failed with {error}: {cause}")
+        self.state = state
+        self.error = error
+        self.cause = cause
+        self.trace = trace
+
+
+# JSONPath
+
+def read_path(path, data, context=None):
+    '''
+    Value at path in data, or in the context object for "$$." paths.
+    '''
+    if path.startswith("$$"):
+        data, path = context, path[1:]
+    if not path.startswith("$"):
+        raise StateError("States.Runtime", f"Invalid path {path}")
+    value = data
+    position = 1
+    for match in PATH_TOKEN.finditer(path, 1):
+        if match.start() != position:
+            raise StateError("States.Runtime", f"Unsupported path {path}")
+        position = match.end()
+        field, quoted, index = match.groups()
+        try:
+            value = value[int(index)] if index is not None else value[field if field is not None else quoted]
+        except (KeyError, IndexError, TypeError):
+            raise StateError("States.Runtime", f"Path {path} not found in the input")
+    if position != len(path):
+        raise StateError("States.Runtime", f"Unsupported path {path}")
+    return value
+
+
+def write_path(path, data, value):
+    # data with value stored at path (a reference path, "$" replaces data)
+    if path == "$":
+        return value
+    tokens = [match.groups() for match in PATH_TOKEN.finditer(path, 1)]
+    result = copy.deepcopy(data) if isinstance(data, dict) else {}
+    target = result
+    for i, (field, quoted, index) in enumerate(tokens):
+        key = int(index) if index is not None else field if field is not None else quoted
+        if i == len(tokens) - 1:
+            target[key] = value
+        else:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            target = target[key]
+    return result
+
+
+def apply_template(template, data, context):
+    # Parameters / ResultSelector: ".$" keys are paths, everything else is copied
+    if isinstance(template, dict):
+        result = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                result[key[:-2]] = read_path(value, data, context)
+            else:
+                result[key] = apply_template(value, data, context)
+        return result
+    if isinstance(template, list):
+        return [apply_template(value, data, context) for value in template]
+    return template
+
+
+# Runner
+
+class LocalRunner:
+    '''
+    Runs a state machine definition against Python stand-ins.
+    '''
+    def __init__(self, definition, standins, wait=True):
+        '''
+        Args:
+            definition: State machine definition (dict or JSON string)
+            standins: dict of function name, ARN, FunctionName or state name -> callable(event, context)
+            wait: Sleep for Retry intervals and Wait states; when False the
+                delays are only recorded
+        '''
+        self.definition = json.loads(definition) if isinstance(definition, str) else definition
+        self.standins = standins
+        self.wait = wait
+
+    def _delay(self, seconds):
+        if self.wait and seconds > 0:
+            sleep(seconds)
+
+    def _standin(self, function_name, state_name):
+        for name in (function_name, FUNCTION_ARN.sub(r"\1", function_name or ""), state_name):
+            if name in self.standins:
+                return self.standins[name]
+        raise StateError("Lambda.ResourceNotFoundException", f"No stand-in for {function_name}")
+
+    def _invoke(self, name, state, parameters, context):
+        resource = state["Resource"]
+        lambda_context = SimpleNamespace(function_name=None, aws_request_id=str(uuid.uuid4()))
+        if resource == LAMBDA_INVOKE:
+            function_name = parameters.get("FunctionName")
+            lambda_context.function_name = function_name
+            payload = self._standin(function_name, name)(copy.deepcopy(parameters.get("Payload")), lambda_context)
+            # Same shape as the optimized Lambda integration result
+            return {"ExecutedVersion": "$LATEST", "Payload": payload, "SdkHttpMetadata": {}, "SdkResponseMetadata": {}, "StatusCode": 200}
+        if FUNCTION_ARN.match(resource):
+            lambda_context.function_name = resource
+            return self._standin(resource, name)(copy.deepcopy(parameters), lambda_context)
+        raise StateError("States.Runtime", f"Unsupported resource {resource}")
+
+    @staticmethod
+    def _matches(error_equals, error):
+        return error in error_equals or "States.ALL" in error_equals or (
+            "States.TaskFailed" in error_equals and not error.startswith("States."))
+
+    def _run_task(self, name, state, effective_input, context, record):
+        parameters = apply_template(state["Parameters"], effective_input, context) if "Parameters" in state else effective_input
+        attempts = {}
+        while True:
+            record["attempts"] += 1
+            context["State"]["RetryCount"] = record["attempts"] - 1
+            try:
+                return self._invoke(name, state, parameters, context)
+            except Exception as e:
+                error = e.error if isinstance(e, StateError) else type(e).__name__
+                cause = e.cause if isinstance(e, StateError) else str(e)
+                record["errors"].append(error)
+                # The first retrier matching the error decides, its attempts are counted separately
+                index = next((i for i, r in enumerate(state.get("Retry", [])) if self._matches(r["ErrorEquals"], error)), None)
+                if index is None:
+                    raise StateError(error, cause)
+                retrier = state["Retry"][index]
+                attempts[index] = attempts.get(index, 0) + 1
+                if attempts[index] > retrier.get("MaxAttempts", 3):
+                    raise StateError(error, cause)
+                delay = retrier.get("IntervalSeconds", 1) * retrier.get("BackoffRate", 2.0) ** (attempts[index] - 1)
+                delay = min(delay, retrier.get("MaxDelaySeconds", delay))
+                record["retry_delay_s"] += delay
+                self._delay(delay)
+
+    def run(self, execution_input):
+        '''
+        Runs one execution.
+
+        Returns:
+            (output, trace): execution output and a list with one record per
+            state entered: name, type, attempts, errors, retry_delay_s, latency_ms
+        Raises:
+            ExecutionFailed: the execution failed, with the trace so far
+        '''
+        context = {
+            "Execution": {
+                "Id": f"local:{uuid.uuid4()}",
+                "Input": copy.deepcopy(execution_input),
+                "Name": "local",
+                "StartTime": datetime.now(timezone.utc).isoformat(),
+            },
+            "StateMachine": {"Id": "local", "Name": "local"},
+        }
+        trace = []
+        data = execution_input
+        name = self.definition["StartAt"]
+        while True:
+            state = self.definition["States"][name]
+            context["State"] = {"Name": name, "EnteredTime": datetime.now(timezone.utc).isoformat(), "RetryCount": 0}
+            record = {"name": name, "type": state["Type"], "attempts": 0, "errors": [], "retry_delay_s": 0.0}
+            trace.append(record)
+            start = perf_counter()
+            try:
+                data, next_state = self._run_state(name, state, data, context, record)
+            except StateError as e:
+                record["latency_ms"] = (perf_counter() - start) * 1000
+                catcher = next((c for c in state.get("Catch", []) if self._matches(c["ErrorEquals"], e.error)), None)
+                if catcher is None:
+                    raise ExecutionFailed(name, e.error, e.cause, trace)
+                data = write_path(catcher.get("ResultPath", "$"), data, {"Error": e.error, "Cause": e.cause})
+                name = catcher["Next"]
+                continue
+            record["latency_ms"] = (perf_counter() - start) * 1000
+            if next_state is None:
+                return data, trace
+            name = next_state
+
+    def _run_state(self, name, state, data, context, record):
+        kind = state["Type"]
+        if kind == "Fail":
+            raise StateError(state.get("Error", "States.Fail"), state.get("Cause", ""))
+        effective_input = read_path(state.get("InputPath", "$"), data, context) if state.get("InputPath", "$") is not None else {}
+
+        if kind == "Task":
+            result = self._run_task(name, state, effective_input, context, record)
+        elif kind == "Pass":
+            result = state["Result"] if "Result" in state else (
+                apply_template(state["Parameters"], effective_input, context) if "Parameters" in state else effective_input)
+        elif kind == "Wait":
+            seconds = state["Seconds"] if "Seconds" in state else read_path(state["SecondsPath"], effective_input, context)
+            record["retry_delay_s"] += seconds
+            self._delay(seconds)
+            result = effective_input
+        elif kind == "Succeed":
+            result = effective_input
+        else:
+            raise StateError("States.Runtime", f"Unsupported state type {kind}")
+
+        if kind in ("Task", "Pass"):
+            if "ResultSelector" in state and kind == "Task":
+                result = apply_template(state["ResultSelector"], result, context)
+            result_path = state.get("ResultPath", "$")
+            data = data if result_path is None else write_path(result_path, data, result)
+        else:
+            data = result
+        output_path = state.get("OutputPath", "$")
+        output = read_path(output_path, data, context) if output_path is not None else {}
+
+        if kind == "Succeed" or state.get("End"):
+            return output, None
+        return output, state["Next"]
+
+
+def load_standins(module_name):
+    # STANDINS dict of the module (imported by name or from a .py path)
+    if module_name.endswith(".py"):
+        sys.path.insert(0, os.path.dirname(os.path.abspath(module_name)))
+        module_name = os.path.splitext(os.path.basename(module_name))[0]
+    return importlib.import_module(module_name).STANDINS
+
+
+def print_profile(traces):
+    # Per-state latency over every run (traces is a list of run traces)
+    states = {}
+    for trace in traces:
+        for record in trace:
+            states.setdefault(record["name"], []).append(record)
+    print(f"{'state':<20} {'runs':>5} {'mean ms':>10} {'p50 ms':>10} {'max ms':>10} {'attempts':>9} {'retry wait s':>13}")
+    for name, records in states.items():
+        latencies = sorted(record["latency_ms"] for record in records)
+        print(f"{name:<20} {len(records):>5} {sum(latencies) / len(latencies):>10.3f} {latencies[len(latencies) // 2]:>10.3f} "
+              f"{latencies[-1]:>10.3f} {sum(r['attempts'] for r in records):>9} {sum(r['retry_delay_s'] for r in records):>13.1f}")
+    totals = sorted(sum(record["latency_ms"] for record in trace) for trace in traces)
+    print(f"{'execution':<20} {len(totals):>5} {sum(totals) / len(totals):>10.3f} {totals[len(totals) // 2]:>10.3f} {totals[-1]:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the AR controller state machine locally")
+    parser.add_argument("--definition", default=DEFAULT_DEFINITION)
+    parser.add_argument("--input", help="JSON file with the execution input")
+    parser.add_argument("--standins", default="example_standins", help="module (or .py file) defining STANDINS")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-wait", action="store_true", help="record Retry and Wait delays without sleeping")
+    args = parser.parse_args()
+    # Stand-in modules import StateError from local_runner, make that this module
+    sys.modules.setdefault("local_runner", sys.modules[__name__])
+
+    with open(args.definition) as f:
+        definition = f.read()
+    execution_input = {}
+    if args.input:
+        with open(args.input) as f:
+            execution_input = json.load(f)
+
+    runner = LocalRunner(definition, load_standins(args.standins), wait=not args.no_wait)
+    traces = []
+    output = None
+    for _ in range(args.repeat):
+        try:
+            output, trace = runner.run(execution_input)
+        except ExecutionFailed as e:
+            print(f"Execution failed in {e.state}: {e.error} {e.cause}")
+            trace = e.trace
+        traces.append(trace)
+    print(json.dumps(output, indent=2, default=str))
+    print_profile(traces)
@@ -0,0 +1,157 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_runner import ExecutionFailed, LocalRunner, StateError
+
+THROTTLED = "Lambda.TooManyRequestsException"
+
+
+def flaky(failures, error=THROTTLED):
+    '''
+    Stand-in failing with error for the first failures calls, then succeeding.
+    '''
+    calls = []
+
+    def standin(event, context):
+        calls.append(event)
+        if len(calls) <= failures:
+            raise StateError(error, "Rate Exceeded.")
+        return {"ok": True}
+    standin.calls = calls
+    return standin
+
+
+def definition(retry=None, catch=None):
+    task = {"Type": "Task", "Resource": "arn:aws:lambda:us-east-1:123456789012:function:work", "End": True}
+    if retry is not None:
+        task["Retry"] = retry
+    if catch is not None:
+        task["Catch"] = catch
+    return {
+        "StartAt": "Work",
+        "States": {
+            "Work": task,
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    }
+
+
+def test_retry_backs_off_until_the_task_succeeds():
+    work = flaky(2)
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": [THROTTLED], "IntervalSeconds": 2, "BackoffRate": 3}]),
+                         {"work": work}, wait=False)
+
+    output, trace = runner.run({"n": 1})
+
+    assert output == {"ok": True}
+    assert len(work.calls) == 3
+    assert trace[0]["attempts"] == 3 and trace[0]["errors"] == [THROTTLED, THROTTLED]
+    assert trace[0]["retry_delay_s"] == 2 + 6
+
+
+def test_retry_delay_is_capped_by_max_delay():
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 4, "MaxAttempts": 3,
+                                            "BackoffRate": 10, "MaxDelaySeconds": 5}]),
+                         {"work": flaky(3)}, wait=False)
+
+    _, trace = runner.run({})
+
+    assert trace[0]["retry_delay_s"] == 4 + 5 + 5
+
+
+def test_exhausted_retries_fail_the_execution():
+    work = flaky(10)
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": [THROTTLED], "MaxAttempts": 2}]), {"work": work}, wait=False)
+
+    with pytest.raises(ExecutionFailed) as failed:
+        runner.run({})
+
+    assert failed.value.state == "Work" and failed.value.error == THROTTLED
+    assert len(work.calls) == 3
+    assert failed.value.trace[0]["attempts"] == 3
+
+
+def test_max_attempts_zero_never_retries():
+    work = flaky(1)
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": [THROTTLED], "MaxAttempts": 0}]), {"work": work}, wait=False)
+
+    with pytest.raises(ExecutionFailed):
+        runner.run({})
+    assert len(work.calls) == 1
+
+
+def test_each_retrier_counts_its_own_attempts():
+    errors = iter(["A", "B", "A", "B"])
+
+    def work(event, context):
+        error = next(errors, None)
+        if error:
+            raise StateError(error)
+        return "done"
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": ["A"], "MaxAttempts": 2, "IntervalSeconds": 1},
+                                           {"ErrorEquals": ["B"], "MaxAttempts": 2, "IntervalSeconds": 1}]),
+                         {"work": work}, wait=False)
+
+    output, trace = runner.run({})
+
+    assert output == "done"
+    assert trace[0]["attempts"] == 5
+    # Both retriers back off from their own first attempt
+    assert trace[0]["retry_delay_s"] == 1 + 1 + 2 + 2
+
+
+def test_task_failed_does_not_match_states_errors():
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": ["States.TaskFailed"]}]),
+                         {"work": flaky(1, "States.Timeout")}, wait=False)
+
+    with pytest.raises(ExecutionFailed) as failed:
+        runner.run({})
+    assert failed.value.error == "States.Timeout"
+    assert failed.value.trace[0]["attempts"] == 1
+
+
+def test_python_exceptions_fail_with_the_class_name():
+    def work(event, context):
+        raise KeyError("input")
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": ["States.TaskFailed"], "MaxAttempts": 1}]),
+                         {"work": work}, wait=False)
+
+    with pytest.raises(ExecutionFailed) as failed:
+        runner.run({})
+    assert failed.value.error == "KeyError"
+    assert failed.value.trace[0]["attempts"] == 2
+
+
+def test_catch_after_retries_writes_the_error_at_result_path():
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": [THROTTLED], "MaxAttempts": 1}],
+                                    catch=[{"ErrorEquals": ["States.ALL"], "ResultPath": "$.error", "Next": "Recover"}]),
+                         {"work": flaky(10)}, wait=False)
+
+    output, trace = runner.run({"n": 1})
+
+    assert output == {"n": 1, "error": {"Error": THROTTLED, "Cause": "Rate Exceeded."}}
+    assert [record["name"] for record in trace] == ["Work", "Recover"]
+    assert trace[0]["attempts"] == 2
+
+
+def test_first_matching_catcher_wins_and_replaces_the_input_by_default():
+    runner = LocalRunner(definition(catch=[{"ErrorEquals": ["Other"], "Next": "Work"},
+                                           {"ErrorEquals": ["States.TaskFailed"], "Next": "Recover"}]),
+                         {"work": flaky(1)}, wait=False)
+
+    output, trace = runner.run({"n": 1})
+
+    assert output == {"Error": THROTTLED, "Cause": "Rate Exceeded."}
+    assert [record["name"] for record in trace] == ["Work", "Recover"]
+
+
+def test_missing_standin_is_not_retried_by_a_specific_retrier():
+    runner = LocalRunner(definition(retry=[{"ErrorEquals": [THROTTLED]}]), {}, wait=False)
+
+    with pytest.raises(ExecutionFailed) as failed:
+        runner.run({})
+    assert failed.value.error == "Lambda.ResourceNotFoundException"
@@ -0,0 +1,152 @@
+'''
+    Local benchmarks for the task controller calls. Nothing here talks to AWS:
+    a stub HTTP server on localhost stands in for the workbench API Gateway and
+    for the Lambda Invoke API, which a real boto3 client calls through
+    endpoint_url. Both transports therefore pay their serialization and a
+    local HTTP round trip, but neither pays the AWS side (API Gateway, the
+    Lambda service), so the numbers compare client side overhead only.
+
+    Usage:
+        python benchmark.py [iterations]
+'''
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+LAMBDA_INVOKE_PATH = "/2015-03-31/functions/"
+
+STUB_RESPONSES = {
+    "/get_task_filters": {"period": [{"id": 1, "display_name": "Jan 2024"}]},
+    "/getlookups": {"task_status": [{"id": 1, "name": "Open"}]},
+    "/task": [{"task_id": 1, "description": "Reconcile cash"}],
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep the connection alive
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = self.rfile.read(length) if length else b""
+        if self.path.startswith(LAMBDA_INVOKE_PATH):
+            # Lambda Invoke API: the event is an API Gateway proxy event, answer with a proxy response
+            event = json.loads(request_body)
+            body = json.dumps({"statusCode": 200, "body": json.dumps(STUB_RESPONSES.get(event["path"], {}))}).encode("utf-8")
+        else:
+            body = json.dumps(STUB_RESPONSES.get(self.path, {})).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Amz-Executed-Version", "$LATEST")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def timed(label, fn, iterations):
+    start = perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000 / iterations:8.3f} ms/call")
+    return elapsed
+
+
+def bench_connection_reuse(base_url, iterations):
+    import requests
+    import calls
+    from transport import TIMEOUT
+
+    print("Connection reuse")
+    bare = timed("requests.get (new connection per call)", lambda: requests.get(f"{base_url}/getlookups", timeout=TIMEOUT).json(), iterations)
+    pooled = timed("calls.getLookups (pooled session)", calls.getLookups, iterations)
+    print(f"{'speedup':<40} {bare / pooled:8.2f}x")
+
+
+def stub_lambda_client(base_url):
+    # Real boto3 client (request signing, botocore serialization) aimed at the stub server
+    import boto3
+    from botocore.config import Config
+    return boto3.client(
+        "lambda", endpoint_url=base_url, region_name="us-east-1",
+        aws_access_key_id="benchmark", aws_secret_access_key="benchmark",
+        config=Config(retries={"total_max_attempts": 1, "mode": "standard"})
+    )
+
+
+def bench_transports(base_url, iterations):
+    from transport import BACKENDS, HttpTransport, LambdaTransport
+
+    # Both go over local HTTP to the stub; in production the API Gateway hop
+    # and the Lambda service round trip come on top of these numbers
+    print("Transports (client side overhead, local stub endpoints)")
+    http = HttpTransport(base_url=base_url)
+    direct = LambdaTransport("stub_function", client=stub_lambda_client(base_url))
+    for backend, (method, path) in BACKENDS.items():
+        body = {"version": 1} if method == "POST" else None
+        assert http.request(method, path, body) == direct.request(method, path, body)
+        http_time = timed(f"{backend} via http", lambda: http.request(method, path, body), iterations)
+        lambda_time = timed(f"{backend} via lambda", lambda: direct.request(method, path, body), iterations)
+        print(f"{'http / lambda':<40} {http_time / lambda_time:8.2f}x")
+
+
+def bench_logging(iterations):
+    import contextlib
+    import io
+    import logging
+    import log_utils
+
+    print("Request logging")
+    request_dict = {
+        "version": "1.0", "get_filters": True, "get_tasks": True, "get_lookups": True, "is_default": False,
+        "filter_tasks": {"period_id": 42, "entity_id": -1000, "tags": "", "description": "x" * 200}
+    }
+    sink = io.StringIO()
+    logger = log_utils.get_logger("benchmark")
+    for handler in logger.handlers:
+        handler.stream = sink
+
+    def eager():
+        with contextlib.redirect_stdout(sink):
+            print("Received request body:", json.dumps(request_dict, indent=2))
+
+    def lazy(sample_rate):
+        def run():
+            log_utils.start_request(sample_rate)
+            log_utils.log_payload(logger, "Received request body:", request_dict)
+        return run
+
+    eager_time = timed("print(json.dumps(indent=2))", eager, iterations)
+    timed("log_payload, sampled", lazy(1), iterations)
+    lazy_time = timed("log_payload, not sampled", lazy(0), iterations)
+    print(f"{'eager / not sampled':<40} {eager_time / lazy_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server, base_url = start_stub_server()
+    # calls.py reads the base URL at import time
+    os.environ["WORKBENCH_API_URL"] = base_url
+    try:
+        bench_connection_reuse(base_url, iterations)
+        bench_transports(base_url, iterations)
+        bench_logging(iterations)
+    finally:
+        server.shutdown()
@@ -0,0 +1,177 @@
+'''
+    In-process cache for task reference data (filters, lookups).
+
+    Entries live for the lifetime of the Lambda container, so warm invocations
+    skip the backend call entirely until the entry expires or is invalidated.
+
+    Every container has its own copy, so an explicit invalidation has to reach
+    all of them: the cache generation is kept in an SSM parameter
+    (CACHE_VERSION_PARAMETER), which each container checks at most every
+    CACHE_VERSION_CHECK_SECONDS and drops its entries when it changed. Without
+    the parameter entries only expire by TTL.
+'''
+import os
+import threading
+import time
+from time import monotonic
+
+import boto3
+
+
+class SharedVersion:
+    '''
+    Cache generation stored in an SSM parameter, shared by every container.
+    The parameter is read at most once per check_interval; when it can't be
+    read the last known value is kept and entries expire by TTL.
+    '''
+    def __init__(self, parameter_name: str, check_interval: float, client=None):
+        self.parameter_name = parameter_name
+        self.check_interval = check_interval
+        self._client = client
+        self._value = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client("ssm")
+        return self._client
+
+    def current(self):
+        with self._lock:
+            now = monotonic()
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return self._value
+            self._checked_at = now
+        try:
+            value = self.client.get_parameter(Name=self.parameter_name)["Parameter"]["Value"]
+        except Exception as e:
+            print(f"Reading cache version {self.parameter_name} failed: {e}")
+            return self._value
+        with self._lock:
+            self._value = value
+        return value
+
+    def bump(self):
+        # A new generation, every container drops its entries on its next check
+        value = str(time.time_ns())
+        self.client.put_parameter(Name=self.parameter_name, Value=value, Type="String", Overwrite=True)
+        with self._lock:
+            self._value = value
+            self._checked_at = monotonic()
+        return value
+
+
+class TTLCache:
+    '''
+    Small thread safe key/value cache with a per-entry TTL and hit/miss counters.
+    With a SharedVersion, entries are dropped whenever the shared generation changes.
+    '''
+    def __init__(self, default_ttl: float, version: SharedVersion = None):
+        self.default_ttl = default_ttl
+        self.version = version
+        self._entries = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        generation = self.version.current()
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+
+    def get(self, key):
+        self._check_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._check_version()
+        with self._lock:
+            self._entries[key] = (monotonic() + ttl, value)
+
+    def get_or_load(self, key, loader, ttl: float = None):
+        '''
+        Return the cached value for key, calling loader() on a miss. Empty or
+        error results are returned but not cached.
+        '''
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = loader()
+        if value and not isinstance(value, str):
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        # Drop one entry (and anything derived from it), or everything when no key is given. This container only
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                return
+            for dropped in [key] + DEPENDENT_KEYS.get(key, []):
+                self._entries.pop(dropped, None)
+
+    def invalidate_everywhere(self):
+        '''
+        Drop every entry in every container: bumps the shared generation (other
+        containers follow within the version check interval) and clears this one.
+        Returns False when there is no shared version, only this container was cleared.
+        '''
+        self.invalidate()
+        if self.version is None:
+            return False
+        generation = self.version.bump()
+        with self._lock:
+            self._generation = generation
+        return True
+
+    def stats(self):
+        with self._lock:
+            now = monotonic()
+            total = self.hits + self.misses
+            return {
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": {key: round(expires_at - now, 1) for key, (expires_at, _) in self._entries.items() if expires_at > now}
+            }
+
+
+FILTERS_KEY = "task_filters"
+LOOKUPS_KEY = "lookups"
+PERIOD_INDEX_KEY = "period_index"    # display_name -> period id, built from the filters
+DEFAULT_TASKS_KEY = "default_tasks"  # {"period_id": ..., "tasks": [...]} for the landing view
+
+# Entries derived from another one are dropped together with it
+DEPENDENT_KEYS = {
+    FILTERS_KEY: [PERIOD_INDEX_KEY, DEFAULT_TASKS_KEY],
+    PERIOD_INDEX_KEY: [DEFAULT_TASKS_KEY],
+}
+
+# Shared by every request served by this container
+reference_cache = TTLCache(
+    default_ttl=float(os.getenv("REFERENCE_CACHE_TTL", "300")),
+    version=SharedVersion(os.environ["CACHE_VERSION_PARAMETER"], float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "30")))
+    if os.getenv("CACHE_VERSION_PARAMETER") else None
+)
+
+TTLS = {
+    FILTERS_KEY: float(os.getenv("TASK_FILTERS_CACHE_TTL", reference_cache.default_ttl)),
+    LOOKUPS_KEY: float(os.getenv("LOOKUPS_CACHE_TTL", reference_cache.default_ttl)),
+    DEFAULT_TASKS_KEY: float(os.getenv("DEFAULT_TASKS_CACHE_TTL", "120")),
+}
+TTLS[PERIOD_INDEX_KEY] = TTLS[FILTERS_KEY]
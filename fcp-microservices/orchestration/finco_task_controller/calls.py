@@ -5,18 +5,83 @@ import json
 import requests
 import boto3
 from botocore.exceptions import ClientError
+from transport import call_backend
+
+
+def requestError(error):
+    # HTTP errors, timeouts and connection failures all come back as their message
+    return error.args[0] if error.args and isinstance(error.args[0], str) else str(error)
 
 
 def getFilters(): # Get's task filters
     try:
-        r = requests.get("https://qchxfxriu8.execute-api.us-east-1.amazonaws.com/dev/workbench/get_task_filters") 
-        # ^ Simply make a request to the API Endpoint for filters 
-    except requests.exceptions.HTTPError as errh:
-        return errh.args[0]
+        r = call_backend("filters")
+        # ^ Simply make a request to the filters backend (HTTP or direct Lambda, see transport.py)
+    except requests.exceptions.RequestException as errh:
+        return requestError(errh)
+
+    return r
+
+def pagingOptions(page=None, page_size=None, fields=None):
+    # Paging and column projection passed through to the task backend, only when asked for
+    options = {}
+    if page is not None:
+        options["page"] = page
+    if page_size is not None:
+        options["page_size"] = page_size
+    if fields:
+        options["fields"] = list(fields)
+    return options
+
+def backendPage(response):
+    '''
+    The task response when the backend paged it itself, or None. A paged
+    response says so explicitly: {"tasks": [...], "page": ..., "total": ...}. A
+    plain list is the complete result, whatever paging was asked for.
+    '''
+    if isinstance(response, dict) and isinstance(response.get("tasks"), list) and ("page" in response or "total" in response):
+        return response
+    return None
+
+def shapeTasks(tasks, page=None, page_size=None, fields=None, paged=False):
+    '''
+    Apply paging and projection to a task list locally. tasks is the complete
+    list unless paged is set, in which case it already is the requested page.
+    Projection is idempotent, so rows the backend already projected are fine.
+    '''
+    if not isinstance(tasks, list):
+        return tasks
+    if page_size is not None and not paged:
+        start = ((page or 1) - 1) * page_size
+        tasks = tasks[start:start + page_size]
+    if fields:
+        tasks = [{field: task[field] for field in fields if field in task} if isinstance(task, dict) else task for task in tasks]
+    return tasks
+
+def taskPage(tasks, page=None, page_size=None, fields=None, total=None, paged=False):
+    '''
+    Shape a task list for the response. Without paging it is the list itself,
+    with paging {"tasks": [...], "page", "page_size", "total"} so the client
+    knows how many pages there are. total is the length of the complete list
+    unless the backend paged it (paged), then it is whatever the backend said.
+    '''
+    if not isinstance(tasks, list) or (page is None and page_size is None):
+        return shapeTasks(tasks, page, page_size, fields, paged)
+    return {
+        "tasks": shapeTasks(tasks, page, page_size, fields, paged),
+        "page": page or 1,
+        "page_size": page_size,
+        "total": total if paged else len(tasks),
+    }
 
-    return r.json()
+def shapeBackendTasks(response, page=None, page_size=None, fields=None):
+    backend_page = backendPage(response)
+    if backend_page is not None:
+        return taskPage(backend_page["tasks"], backend_page.get("page", page), backend_page.get("page_size", page_size),
+                        fields, total=backend_page.get("total"), paged=True)
+    return taskPage(response, page, page_size, fields)
 
-def getTasks(filters): # Get's Tasks
+def getTasks(filters, page=None, page_size=None, fields=None): # Get's Tasks
     # Make a id system for task statuses, One unique int for each. Also make it so that it can accept the simply task status as a text,make the API me able to take both task_status, and approval_status
     if not (filters): # This means empty filters, there's none provided
         try:
@@ -30,28 +95,28 @@ def getTasks(filters): # Get's Tasks
                 "assigned_performer_id": -1000,
                 "approval_status": -1000,
                 "tags": ""
-            }
-            r = requests.post("https://qchxfxriu8.execute-api.us-east-1.amazonaws.com/dev/workbench/task", json=body)
-            return r.json()
-        except requests.exceptions.HTTPError as errh:
-            return errh.args[0]
+            } | pagingOptions(page, page_size, fields)
+            r = call_backend("tasks", body)
+            return shapeBackendTasks(r, page, page_size, fields)
+        except requests.exceptions.RequestException as errh:
+            return requestError(errh)
     
     else:
         try:
-            body = filters
-            r = requests.post("https://qchxfxriu8.execute-api.us-east-1.amazonaws.com/dev/workbench/task", json=body)
-            return r.json()
-        except requests.exceptions.HTTPError as errh:
-            return errh.args[0]
+            body = filters | pagingOptions(page, page_size, fields)
+            r = call_backend("tasks", body)
+            return shapeBackendTasks(r, page, page_size, fields)
+        except requests.exceptions.RequestException as errh:
+            return requestError(errh)
         
 
 def getLookups(): # Get's lookups
     try:
-        r = requests.get("https://qchxfxriu8.execute-api.us-east-1.amazonaws.com/dev/workbench/getlookups")
-    except requests.exceptions.HTTPError as errh:
-        return errh.args[0]
+        r = call_backend("lookups")
+    except requests.exceptions.RequestException as errh:
+        return requestError(errh)
 
-    rdict = r.json()
+    rdict = r
     
     return rdict
 
@@ -0,0 +1,113 @@
+'''
+    Structured request logging for the controllers.
+
+    Records are written as one JSON object per line and carry the id of the
+    request they belong to. Payloads are wrapped in LazyJson and passed as
+    logging arguments, so they are only serialized when a record is actually
+    emitted; pass a callable (info_request.dict) to defer building the payload
+    too. Debug records are sampled per request: call start_request() at the top
+    of every request, and only the sampled fraction (LOG_DEBUG_SAMPLE_RATE)
+    emits debug output. Worker threads only see the request when they run in a
+    copy of its context (contextvars.copy_context().run).
+'''
+import json
+import logging
+import os
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+_request_sampled = ContextVar("request_sampled", default=False)
+_request_id = ContextVar("request_id", default=None)
+
+
+class LazyJson:
+    '''
+    Logging argument that serializes its payload on str(), i.e. only when the
+    record is formatted. A callable payload is only called then as well.
+    '''
+    __slots__ = ("payload", "indent")
+
+    def __init__(self, payload, indent=None):
+        self.payload = payload
+        self.indent = indent
+
+    def __str__(self):
+        payload = self.payload() if callable(self.payload) else self.payload
+        return json.dumps(payload, indent=self.indent, default=str)
+
+
+def start_request(sample_rate: float = None, request_id: str = None) -> bool:
+    '''
+    Start a new request: give it an id and decide whether debug logging is on
+    for it. Both are stored in context variables, so they follow the request
+    across awaits and asyncio.to_thread calls.
+    '''
+    rate = DEBUG_SAMPLE_RATE if sample_rate is None else sample_rate
+    sampled = rate >= 1 or random.random() < rate
+    _request_sampled.set(sampled)
+    _request_id.set(request_id or str(uuid.uuid4()))
+    return sampled
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def debug_sampled() -> bool:
+    return _request_sampled.get()
+
+
+def log_payload(logger: logging.Logger, message: str, payload, level: int = logging.DEBUG):
+    '''
+    Log message with payload attached. Debug payloads of unsampled requests are
+    dropped before a record is even created. payload may be a callable
+    returning the payload, which is then only called for records that are written.
+    '''
+    if level <= logging.DEBUG and not _request_sampled.get():
+        return
+    if logger.isEnabledFor(level):
+        logger.log(level, "%s %s", message, LazyJson(payload))
+
+
+class SampledDebugFilter(logging.Filter):
+    # Lets debug records through only for sampled requests
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or _request_sampled.get()
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": _request_id.get(),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name: str) -> logging.Logger:
+    '''
+    Logger writing structured records to stdout (CloudWatch in Lambda). The
+    logger level is DEBUG so sampled requests can emit debug records, the
+    handler level (LOG_LEVEL) and the sampling filter decide what is written.
+    '''
+    logger = logging.getLogger(name)
+    if not getattr(logger, "_structured", False):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter())
+        handler.addFilter(SampledDebugFilter())
+        handler.setLevel(os.getenv("LOG_LEVEL", "DEBUG"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger._structured = True
+    return logger
@@ -1,11 +1,15 @@
 from typing import List, Optional
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import json
-from calls import getFilters, getTasks, getLookups, invoke_lambda_function
+from pydantic import BaseModel, Field
+import asyncio
+from calls import getFilters, getTasks, getLookups, taskPage, invoke_lambda_function
+from log_utils import get_logger, start_request, log_payload
+from cache import reference_cache, FILTERS_KEY, LOOKUPS_KEY, PERIOD_INDEX_KEY, DEFAULT_TASKS_KEY, TTLS
 from mangum import Mangum
 from datetime import datetime
 
+logger = get_logger(__name__)
+
 app = FastAPI()
 
 class TaskRequest(BaseModel):
@@ -15,74 +19,161 @@ class TaskRequest(BaseModel):
     get_lookups: bool
     is_default: bool
     filter_tasks: Optional[dict] = None
+    # Paging and column projection for the task list, everything when not set
+    page: Optional[int] = Field(None, ge=1)
+    page_size: Optional[int] = Field(None, ge=1, le=1000)
+    fields: Optional[List[str]] = None
+
+
+def getCachedFilters():
+    # Filters and lookups are reference data, served from the container cache when fresh
+    return reference_cache.get_or_load(FILTERS_KEY, getFilters, TTLS[FILTERS_KEY])
+
+def getCachedLookups():
+    return reference_cache.get_or_load(LOOKUPS_KEY, getLookups, TTLS[LOOKUPS_KEY])
+
+
+def buildPeriodIndex(filters):
+    # display_name ('Jan 2024') -> period id, built once per filters load
+    return {item['display_name']: item['id'] for item in filters.get('period', [])}
+
+def getCachedPeriodIndex(filters):
+    return reference_cache.get_or_load(PERIOD_INDEX_KEY, lambda: buildPeriodIndex(filters), TTLS[PERIOD_INDEX_KEY])
+
+def currentPeriodName():
+    return datetime.now().strftime('%b %Y')  # 'Jan 2024', matches the period display_name
+
+def defaultTaskFilter(period_id):
+    # Current period, everything else -1000 (doesn't matter)
+    return {
+        "version": 1,
+        "entity_id": -1000,
+        "period_id": period_id,
+        "folder_id": -1000,
+        "description": "",
+        "task_status": -1000,
+        "assigned_performer_id": -1000,
+        "approval_status": -1000,
+        "tags": ""
+    }
+
+def getDefaultTasks(period_id):
+    '''
+    Tasks for the landing view, served from memory while fresh. The entry is
+    refreshed by the scheduled event (see handler) or on the first request after
+    it expires; a new month has a different period id and misses naturally.
+    '''
+    cached = reference_cache.get(DEFAULT_TASKS_KEY)
+    if cached is not None and cached["period_id"] == period_id:
+        return cached["tasks"]
+
+    tasks = getTasks(filters=defaultTaskFilter(period_id))
+    if tasks and not isinstance(tasks, str):
+        reference_cache.set(DEFAULT_TASKS_KEY, {"period_id": period_id, "tasks": tasks}, TTLS[DEFAULT_TASKS_KEY])
+    return tasks
+
+def refreshDefaultView():
+    '''
+    Reload the filters, the period index and the default tasks. Called from the
+    scheduled EventBridge rule so the landing view never waits on the backend.
+    '''
+    reference_cache.invalidate(FILTERS_KEY)
+    filters = getCachedFilters()
+    if isinstance(filters, str):
+        return {"message": f"Could not load the task filters: {filters}"}
+    current_period_id = getCachedPeriodIndex(filters).get(currentPeriodName())
+    if current_period_id is None:
+        return {"message": f"No period found for {currentPeriodName()}"}
+    getDefaultTasks(current_period_id)
+    return {"message": "Default task view refreshed", "data": reference_cache.stats()}
 
 @app.post("/")
 async def root(task_request: TaskRequest):
-    request_dict = task_request.dict()
-    
-    # Print the request body to the console
-    print("Received request body:", json.dumps(request_dict, indent=2))
+    # Request bodies are only serialized for the sampled fraction of requests
+    start_request()
+    log_payload(logger, "Received request body:", task_request.dict)
     
     response = {}
-    
-    if task_request.is_default and task_request.get_filters:
 
-        if task_request.get_tasks:
-            raise HTTPException(detail="Cannot have is_default and get_tasks both true", status_code=500)
+    if not (task_request.get_filters or task_request.get_tasks or task_request.get_lookups or task_request.is_default):
+        raise HTTPException(status_code=400, detail="No action specified in the request")
+
+    if task_request.is_default and task_request.get_filters and task_request.get_tasks:
+        raise HTTPException(detail="Cannot have is_default and get_tasks both true", status_code=500)
 
-        filters = getFilters()
+    # The calls are blocking (pooled requests session), so each one runs in a
+    # worker thread and independent calls overlap instead of running in sequence.
+    lookups_call = asyncio.create_task(asyncio.to_thread(getCachedLookups)) if task_request.get_lookups else None
+
+    if task_request.is_default and task_request.get_filters:
+
+        # Lookups keep loading while the default tasks wait on the filters
+        filters = await asyncio.to_thread(getCachedFilters)
+        if isinstance(filters, str):
+            # The backend call failed, the message is all there is
+            raise HTTPException(status_code=502, detail=filters)
         response['task_filters']  = filters
-        # Get the current date and time
-        now = datetime.now()
-        current_month = now.strftime('%b')  # 'Jan', 'Feb', etc.
-        current_year = now.strftime('%Y')   # '2024', '2025', etc.
-
-        # Create the display name for the current month and year
-        current_display_name = f'{current_month} {current_year}'
-
-
-        periods = filters['period']
-        for item in periods:
-            if item['display_name'] == current_display_name:
-                current_period_id = item['id']
-
-        filter_tasks = {
-                "version": 1,
-                "entity_id": -1000,
-                "period_id": current_period_id,
-                "folder_id": -1000,
-                "description": "",
-                "task_status": -1000,
-                "assigned_performer_id": -1000,
-                "approval_status": -1000,
-                "tags": ""
-        } #filter with right stuff heres
-        tasks = getTasks(filters=filter_tasks)
-        if len(tasks) > 0:
+
+        # Resolve the current month through the period index instead of scanning the list
+        current_display_name = currentPeriodName()
+        current_period_id = getCachedPeriodIndex(filters).get(current_display_name)
+        if current_period_id is None:
+            raise HTTPException(status_code=404, detail=f"No period found for {current_display_name}")
+
+        # The cached default view is the complete list, so it is always paged and projected here
+        tasks = await asyncio.to_thread(getDefaultTasks, current_period_id)
+        tasks = taskPage(tasks, task_request.page, task_request.page_size, task_request.fields)
+        if isinstance(tasks, dict) or len(tasks) > 0:
+            # A page past the end still carries the total
             response["tasks"] = tasks
         else:
             response["tasks"] = {"message":"No tasks found for this period."}
 
-    if task_request.get_filters:
-        if not task_request.is_default:
-            filters = getFilters()
-            response["task_filters"] = filters
-    
-    if task_request.get_tasks:
-        if not(task_request.is_default):
+    else:
+        calls = {}
+        if task_request.get_filters:
+            calls["task_filters"] = asyncio.to_thread(getCachedFilters)
+
+        if task_request.get_tasks and not task_request.is_default:
             filters_list = task_request.filter_tasks or {}
-            tasks = getTasks(filters=filters_list)
-            response["tasks"] = tasks
-    
-    if task_request.get_lookups:
-        lookups = getLookups()
-        response["lookups"] = lookups
-    
-    if not (task_request.get_filters or task_request.get_tasks or task_request.get_lookups or task_request.is_default):
-        raise HTTPException(status_code=400, detail="No action specified in the request")
-    
+            calls["tasks"] = asyncio.to_thread(
+                getTasks, filters=filters_list,
+                page=task_request.page, page_size=task_request.page_size, fields=task_request.fields
+            )
+
+        results = await asyncio.gather(*calls.values())
+        response.update(zip(calls.keys(), results))
+
+    if lookups_call:
+        response["lookups"] = await lookups_call
+
+
     msgString = "Request processed - Version "+task_request.version
     return {"message": msgString, "data": response}
 
 
-handler = Mangum(app)
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"message": "Cache statistics", "data": reference_cache.stats()}
+
+
+mangum_handler = Mangum(app)
+
+def invalidateCache():
+    '''
+    Drop the reference cache in every container. Only reachable by invoking the
+    function directly ({"action": "invalidate_cache"}), which IAM guards, never
+    through API Gateway.
+    '''
+    if reference_cache.invalidate_everywhere():
+        return {"message": "Cache invalidated", "data": reference_cache.stats()}
+    return {"message": "CACHE_VERSION_PARAMETER is not set, only this container was invalidated", "data": reference_cache.stats()}
+
+def handler(event, context):
+    # The EventBridge schedule keeps the default task view warm, direct invokes
+    # can invalidate the cache, everything else is HTTP
+    if event.get("source") == "aws.events":
+        return refreshDefaultView()
+    if event.get("action") == "invalidate_cache":
+        return invalidateCache()
+    return mangum_handler(event, context)
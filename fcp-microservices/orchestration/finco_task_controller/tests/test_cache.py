@@ -0,0 +1,64 @@
+import os
+import sys
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from cache import SharedVersion, TTLCache
+
+
+class FakeSSM:
+    # The parameter store the containers share
+    def __init__(self):
+        self.parameters = {}
+        self.reads = 0
+
+    def get_parameter(self, Name):
+        self.reads += 1
+        return {"Parameter": {"Name": Name, "Value": self.parameters[Name]}}
+
+    def put_parameter(self, Name, Value, Type, Overwrite):
+        self.parameters[Name] = Value
+
+
+def container(ssm, check_interval=0):
+    return TTLCache(default_ttl=300, version=SharedVersion("/fcp/task-cache-version", check_interval, client=ssm))
+
+
+def test_invalidation_reaches_every_container():
+    ssm = FakeSSM()
+    ssm.parameters["/fcp/task-cache-version"] = "1"
+    first, second = container(ssm), container(ssm)
+    first.set("task_filters", {"period": [1]})
+    second.set("task_filters", {"period": [1]})
+
+    first.invalidate_everywhere()
+
+    assert first.get("task_filters") is None
+    assert second.get("task_filters") is None
+    second.set("task_filters", {"period": [2]})
+    assert second.get("task_filters") == {"period": [2]}
+
+
+def test_version_is_read_once_per_interval():
+    ssm = FakeSSM()
+    ssm.parameters["/fcp/task-cache-version"] = "1"
+    cache = container(ssm, check_interval=60)
+    cache.set("lookups", {"a": 1})
+    for _ in range(10):
+        assert cache.get("lookups") == {"a": 1}
+    assert ssm.reads == 1
+
+
+def test_unreadable_version_keeps_the_entries():
+    ssm = FakeSSM()  # parameter missing, get_parameter raises
+    cache = container(ssm)
+    cache.set("lookups", {"a": 1})
+    assert cache.get("lookups") == {"a": 1}
+
+
+def test_invalidation_is_not_exposed_over_http():
+    client = TestClient(main.app)
+    assert client.post("/cache/invalidate", json={}).status_code in (404, 405)
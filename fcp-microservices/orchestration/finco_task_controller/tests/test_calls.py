@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import transport
+from cache import reference_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    reference_cache.invalidate()
+    yield
+    reference_cache.invalidate()
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def request_body(**flags):
+    return {"get_filters": False, "get_tasks": False, "get_lookups": False, "is_default": False} | flags
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ReadTimeout("Read timed out"), requests.exceptions.ConnectionError("Connection refused")])
+def test_backend_request_errors_use_the_error_shape(client, monkeypatch, error):
+    def fail(*args, **kwargs):
+        raise error
+    monkeypatch.setattr(transport.session, "request", fail)
+
+    response = client.post("/", json=request_body(get_filters=True, get_tasks=True, get_lookups=True))
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data == {"task_filters": str(error), "tasks": str(error), "lookups": str(error)}
+
+    # The default view needs the filters, without them it's a gateway error
+    response = client.post("/", json=request_body(get_filters=True, is_default=True))
+    assert response.status_code == 502
+    assert response.json()["detail"] == str(error)
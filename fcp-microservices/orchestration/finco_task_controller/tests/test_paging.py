@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calls
+import main
+from cache import reference_cache
+
+TASKS = [{"task_id": i, "description": f"Task {i}", "status": "Open"} for i in range(1, 31)]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    reference_cache.invalidate()
+    yield
+    reference_cache.invalidate()
+
+
+def test_short_result_past_the_first_page_is_empty():
+    # The backend ignored paging and returned fewer rows than a page
+    assert calls.shapeTasks(TASKS, page=2, page_size=50) == []
+    assert calls.shapeTasks(TASKS, page=1, page_size=50) == TASKS
+
+
+def test_second_page_of_a_full_list():
+    assert calls.shapeTasks(TASKS, page=2, page_size=10) == TASKS[10:20]
+    assert calls.shapeTasks(TASKS, page=2, page_size=10, fields=["task_id"]) == [{"task_id": i} for i in range(11, 21)]
+
+
+def test_backend_paged_response_passes_through(monkeypatch):
+    page = {"tasks": TASKS[10:20], "page": 2, "page_size": 10, "total": 30}
+    monkeypatch.setattr(calls, "call_backend", lambda backend, body=None: page)
+    assert calls.getTasks({"period_id": 1}, page=2, page_size=10) == page
+
+
+def test_backend_total_is_kept_with_projection(monkeypatch):
+    page = {"tasks": TASKS[:2], "page": 1, "total": 30}
+    monkeypatch.setattr(calls, "call_backend", lambda backend, body=None: page)
+    assert calls.getTasks({"period_id": 1}, page=1, page_size=2, fields=["task_id"]) == {
+        "tasks": [{"task_id": 1}, {"task_id": 2}], "page": 1, "page_size": 2, "total": 30
+    }
+
+
+def test_backend_plain_list_is_paged_locally(monkeypatch):
+    monkeypatch.setattr(calls, "call_backend", lambda backend, body=None: TASKS[:5])
+    assert calls.getTasks({"period_id": 1}, page=2, page_size=10) == {"tasks": [], "page": 2, "page_size": 10, "total": 5}
+
+
+def test_unpaged_request_returns_the_list(monkeypatch):
+    monkeypatch.setattr(calls, "call_backend", lambda backend, body=None: TASKS[:5])
+    assert calls.getTasks({"period_id": 1}) == TASKS[:5]
+
+
+def test_default_view_second_page(monkeypatch):
+    filters = {"period": [{"id": 7, "display_name": main.currentPeriodName()}]}
+    monkeypatch.setattr(main, "getFilters", lambda: filters)
+    monkeypatch.setattr(main, "getTasks", lambda filters: TASKS[:15])
+
+    response = TestClient(main.app).post("/", json={
+        "get_filters": True, "get_tasks": False, "get_lookups": False, "is_default": True, "page": 2, "page_size": 10
+    })
+
+    assert response.status_code == 200
+    assert response.json()["data"]["tasks"] == {"tasks": TASKS[10:15], "page": 2, "page_size": 10, "total": 15}
@@ -0,0 +1,54 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transport
+from transport import LambdaTransport
+
+
+class FakeLambdaClient:
+    def __init__(self, response, function_error=None):
+        self.response = response
+        self.function_error = function_error
+        self.events = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.events.append(json.loads(Payload))
+        result = {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(self.response).encode("utf-8"))}
+        if self.function_error:
+            result["FunctionError"] = self.function_error
+        return result
+
+
+def test_proxy_error_status_raises():
+    client = FakeLambdaClient({"statusCode": 500, "body": json.dumps({"message": "Database unavailable"})})
+    with pytest.raises(requests.HTTPError, match="500"):
+        LambdaTransport("tasks_function", client=client).request("POST", "/task", {"version": 1})
+
+
+def test_function_error_raises():
+    client = FakeLambdaClient({"errorMessage": "Task timed out"}, function_error="Unhandled")
+    with pytest.raises(requests.HTTPError, match="Task timed out"):
+        LambdaTransport("tasks_function", client=client).request("GET", "/getlookups")
+
+
+def test_proxy_success_is_unwrapped():
+    client = FakeLambdaClient({"statusCode": 200, "body": json.dumps([{"task_id": 1}])})
+    assert LambdaTransport("tasks_function", client=client).request("POST", "/task", {"version": 1}) == [{"task_id": 1}]
+    assert client.events[0]["httpMethod"] == "POST"
+
+
+def test_writes_are_not_retried(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(transport, "_lambda_clients", {})
+    reads = transport.get_lambda_client(retries=True)
+    writes = transport.get_lambda_client(retries=False)
+    assert reads is not writes
+    assert writes.meta.config.retries["total_max_attempts"] == 1
+    assert reads.meta.config.retries["total_max_attempts"] > 1
@@ -0,0 +1,165 @@
+'''
+    Transports used by calls.py to reach the workbench backends.
+
+    Each backend (filters, tasks, lookups) can be reached either through the
+    public API Gateway URL (HttpTransport) or by invoking its Lambda directly
+    (LambdaTransport), which skips the gateway hop. The choice is made per
+    backend through environment variables:
+
+        WORKBENCH_<BACKEND>_TRANSPORT   "http" (default) or "lambda"
+        WORKBENCH_<BACKEND>_FUNCTION    Lambda function name, needed for "lambda"
+'''
+import json
+import os
+import threading
+import boto3
+import requests
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, ConnectTimeoutError, ReadTimeoutError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE_URL = os.getenv("WORKBENCH_API_URL", "https://qchxfxriu8.execute-api.us-east-1.amazonaws.com/dev/workbench")
+
+# (connect, read) timeouts in seconds, so a hung backend can't pin the Lambda
+TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")), float(os.getenv("HTTP_READ_TIMEOUT", "20")))
+
+# backend -> (method, path under the API base URL)
+BACKENDS = {
+    "filters": ("GET", "/get_task_filters"),
+    "tasks": ("POST", "/task"),
+    "lookups": ("GET", "/getlookups"),
+}
+
+
+def build_session():
+    '''
+    Session shared by every HTTP call. The pooled adapter keeps the TLS
+    connection to API Gateway alive across calls and warm invocations. Only GETs
+    are retried (with exponential backoff), POSTs go out once.
+    '''
+    retry = Retry(
+        total=int(os.getenv("HTTP_MAX_RETRIES", "3")),
+        backoff_factor=float(os.getenv("HTTP_RETRY_BACKOFF", "0.3")),
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = build_session()
+
+_lambda_clients = {}
+_lambda_client_lock = threading.Lock()
+
+
+def get_lambda_client(retries=True):
+    '''
+    Lambda client shared by the container, created lazily (client creation isn't
+    thread safe). Like the HTTP session, only reads are retried: the client for
+    writes makes a single attempt, so a task invoke never runs twice.
+    '''
+    with _lambda_client_lock:
+        if retries not in _lambda_clients:
+            _lambda_clients[retries] = boto3.client('lambda', config=Config(
+                connect_timeout=TIMEOUT[0],
+                read_timeout=TIMEOUT[1],
+                retries={"max_attempts": int(os.getenv("HTTP_MAX_RETRIES", "3")), "mode": "standard"}
+                if retries else {"total_max_attempts": 1, "mode": "standard"}
+            ))
+    return _lambda_clients[retries]
+
+
+class HttpTransport:
+    '''
+    Calls the backend through API Gateway with the shared session.
+    '''
+    name = "http"
+
+    def __init__(self, base_url=None, http_session=None):
+        self.base_url = base_url or API_BASE_URL
+        self.session = http_session or session
+
+    def request(self, method, path, body=None):
+        r = self.session.request(method, f"{self.base_url}{path}", json=body, timeout=TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+
+class LambdaTransport:
+    '''
+    Invokes the backend Lambda directly with an API Gateway proxy style event,
+    so the function behaves as if it was called through the gateway, and
+    unwraps the proxy response. Failures raise requests exceptions like on the
+    HTTP path: error status codes and function errors raise HTTPError, client
+    timeouts Timeout.
+    '''
+    name = "lambda"
+
+    def __init__(self, function_name, client=None):
+        self.function_name = function_name
+        self.client = client
+
+    def request(self, method, path, body=None):
+        event = {
+            "resource": path,
+            "path": path,
+            "httpMethod": method,
+            "headers": {"Content-Type": "application/json"},
+            "queryStringParameters": None,
+            "pathParameters": None,
+            "requestContext": {},
+            "body": json.dumps(body) if body is not None else None,
+            "isBase64Encoded": False
+        }
+        client = self.client or get_lambda_client(retries=method == "GET")
+        try:
+            response = client.invoke(
+                FunctionName=self.function_name,
+                InvocationType='RequestResponse',
+                Payload=json.dumps(event).encode('utf-8')
+            )
+            payload = json.loads(response['Payload'].read())
+        except (ReadTimeoutError, ConnectTimeoutError) as e:
+            raise requests.Timeout(f"{self.function_name}: {e}") from e
+        except (BotoCoreError, ClientError) as e:
+            raise requests.RequestException(f"{self.function_name}: {e}") from e
+
+        if response.get('FunctionError'):
+            raise requests.HTTPError(f"502 Error from {self.function_name}: {payload.get('errorMessage', payload)}")
+
+        # Proxy responses carry the API result as a JSON string in body
+        if isinstance(payload, dict) and 'statusCode' in payload and 'body' in payload:
+            result = payload['body']
+            if int(payload['statusCode']) >= 400:
+                raise requests.HTTPError(f"{payload['statusCode']} Error from {self.function_name}: {result}")
+            return json.loads(result) if isinstance(result, str) else result
+        return payload
+
+
+def build_transport(backend):
+    # Transport for one backend, from WORKBENCH_<BACKEND>_TRANSPORT / _FUNCTION
+    prefix = f"WORKBENCH_{backend.upper()}"
+    kind = os.getenv(f"{prefix}_TRANSPORT", "http").lower()
+    if kind == "http":
+        return HttpTransport()
+    if kind == "lambda":
+        function_name = os.getenv(f"{prefix}_FUNCTION")
+        if not function_name:
+            raise ValueError(f"{prefix}_FUNCTION is required for the lambda transport")
+        return LambdaTransport(function_name)
+    raise ValueError(f"Unknown transport '{kind}' for {backend}")
+
+
+transports = {backend: build_transport(backend) for backend in BACKENDS}
+
+
+def call_backend(backend, body=None):
+    method, path = BACKENDS[backend]
+    return transports[backend].request(method, path, body)
@@ -1,21 +1,22 @@
-import logging
 from typing import Optional, Dict, Any
 from fastapi import FastAPI, Request
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import json
 from datetime import datetime
 from mangum import Mangum
-from invoker import invoke_lambda_function
+from invoker import invoke_lambda_function, invoke_lambda_function_stream
+from stream_parser import gzip_response, build_body, decode_chunks, open_proxy_payload, encode_requested_data
 from utils import send_log_to_sqs
+from log_utils import get_logger, start_request, log_payload
 from lib.exception.exception_codes import Reason
 from lib.exception.exceptions import AccountControllerException
 from fastapi.exceptions import RequestValidationError
 import os
+from itertools import chain
 
-# Setup logger
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Setup logger (structured, debug output sampled per request)
+logger = get_logger(__name__)
 
 app = FastAPI()
 
@@ -157,7 +158,15 @@ def validate_request(info_request: InfoRequest):
     logger.info("Request validation successful")
 
 
-def fetch_data(payload: Dict[str, Any]) -> Dict[str, Any]:
+def fetch_data(payload: Dict[str, Any], prefix: Optional[Dict[str, Any]] = None):
+    '''
+    Invoke the backend for the requested report and return an iterator of response
+    bytes for {"requested_data": "<body>"} (keys in prefix are written first).
+
+    The backend payload is parsed incrementally and re-encoded one row batch at a
+    time (see data_response), so the report is never held in memory decoded. The
+    status of the backend response is checked before anything is returned.
+    '''
     try:
         data_to_retrieve = payload.get("type")
         if not data_to_retrieve:
@@ -179,22 +188,22 @@ def fetch_data(payload: Dict[str, Any]) -> Dict[str, Any]:
         type_for_lambda = "BALANCE_SUMMARY" if type == "balance_summary" else "TRIAL_BALANCE"
         payload_for_lambda["type"] = type_for_lambda
 
-        logger.info(f"Fetching data for {data_to_retrieve}")
+        logger.info("Fetching data for %s", data_to_retrieve)
         
         # Invoke backend service
-        response_raw = invoke_lambda_function(lambda_function_mapping[data_to_retrieve], payload=json.dumps(payload_for_lambda))
+        stream = invoke_lambda_function_stream(lambda_function_mapping[data_to_retrieve], payload=json.dumps(payload_for_lambda))
         
-        # Parse the response
-        response_dict = json.loads(response_raw)
+        # Parse the envelope up to the body, the body itself is read lazily
+        envelope, body = open_proxy_payload(decode_chunks(stream))
         
         # Check if the response contains an error
-        if "error" in response_dict or response_dict.get("statusCode", 200) != 200:
+        if "error" in envelope or envelope.get("statusCode", 200) != 200:
             
-            body = json.loads(response_dict["body"])
+            body = json.loads(envelope["body"] if body is None else "".join(body))
             
             error_message = body.get("message", "Backend service error")
             print(error_message)
-            error_code = response_dict.get("statusCode", 500)
+            error_code = envelope.get("statusCode", 500)
             logger.error(f"Backend service returned an error: {error_message}")
             
             # Raise an exception based on backend error
@@ -204,8 +213,11 @@ def fetch_data(payload: Dict[str, Any]) -> Dict[str, Any]:
                 metadata={"status_code": error_code}
             )
 
-        logger.info(f"Data successfully retrieved for {data_to_retrieve}")
-        return {"requested_data": response_dict["body"]}
+        if body is None:
+            body = iter([envelope["body"]])
+
+        logger.info("Data successfully retrieved for %s", data_to_retrieve)
+        return encode_requested_data(body, prefix=prefix)
     
     except AccountControllerException as ace:
         # FastAPI will catch this and route it to the custom exception handler
@@ -220,6 +232,25 @@ def fetch_data(payload: Dict[str, Any]) -> Dict[str, Any]:
             e=e
         )
 
+def data_response(chunks, compress: bool) -> Response:
+    '''
+    Build the response from the chunks of fetch_data, gzip compressed when
+    compress is set. The body is complete before the response is created, so a
+    backend failure half way through still ends in an error response.
+    '''
+    try:
+        content = build_body(chunks, compress=compress)
+    except Exception as e:
+        logger.error(f"Error reading data: {str(e)}")
+        send_log_to_sqs(f"Error reading data: {str(e)}")
+        raise AccountControllerException(
+            message="Error retrieving data.",
+            reason=Reason.RETRIEVE_DATA_ERROR,
+            e=e
+        )
+    headers = {"Content-Encoding": "gzip"} if compress else None
+    return Response(content, media_type="application/json", headers=headers)
+
 
 def fetch_filters(payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     try:
@@ -257,7 +288,7 @@ def fetch_filters(payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
             account_filter_response  = json.loads(invoke_lambda_function("fincopilot_workbench_get_account_filter", payload=json.dumps(account_filter_payload)))
             account_filter_body = json.loads(account_filter_response.get("body", "[]"))
             response_data["account_filter"] = account_filter_body
-            logger.info(f"Account filter successfully retrieved for {type}")
+            logger.info("Account filter successfully retrieved for %s", type)
 
         return response_data
 
@@ -315,7 +346,8 @@ def update_payload_for_default_filter(payload: dict, current_period_int: int, cu
                 "subsidiary_id": default_subsidiary_id
             })
 
-        logger.info(f"Payload updated for {payload['type']}: {payload['parameters']}")
+        logger.info("Payload updated for %s", payload['type'])
+        log_payload(logger, "Updated parameters:", payload['parameters'])
         return payload
 
     except KeyError as e:
@@ -325,7 +357,7 @@ def update_payload_for_default_filter(payload: dict, current_period_int: int, cu
             reason=Reason.INVALID_INPUT
         )
 
-def fetch_default_filter(payload: dict) -> Dict[str, Any]:
+def fetch_default_filter(payload: dict, compress: bool = False) -> Response:
     try:
         response_dict = {}
 
@@ -366,9 +398,10 @@ def fetch_default_filter(payload: dict) -> Dict[str, Any]:
         
         # response_dict.update({"data": response_data.get("body")})
         # logger.info(f"Default filter data retrieved for {data_to_retrieve}")
-        response_dict.update(fetch_data(payload))
+        # Nest the data under requested_data next to the filters
+        data_chunks = fetch_data(payload, prefix=response_dict)
 
-        return {"requested_data": response_dict}
+        return data_response(chain([b'{"requested_data": '], data_chunks, [b'}']), compress)
     except AccountControllerException as ace:
         # FastAPI will catch this and route it to the custom exception handler
         raise ace
@@ -383,20 +416,24 @@ def fetch_default_filter(payload: dict) -> Dict[str, Any]:
         )
 
 @app.post("/")
-def root(info_request: InfoRequest):
+def root(info_request: InfoRequest, request: Request):
+    # Payload logging is sampled, unsampled requests never serialize the body
+    start_request()
+    log_payload(logger, "Received request body:", info_request.dict)
     try:
         validate_request(info_request)
 
         response_data = {}
+        compress = gzip_response(request.headers.get("accept-encoding"))
 
         if info_request.get_filters:
             response_data = fetch_filters(info_request.payload)
 
         if info_request.get_data:
-            response_data = fetch_data(info_request.payload)
+            response_data = data_response(fetch_data(info_request.payload), compress)
 
         if info_request.default_filter:
-            response_data = fetch_default_filter(info_request.payload)
+            response_data = fetch_default_filter(info_request.payload, compress)
 
         return response_data
     # Catch custom AccountControllerException and pass it to the custom handler
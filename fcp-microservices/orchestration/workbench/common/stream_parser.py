@@ -0,0 +1,323 @@
+'''
+    Incremental parsing of backend Lambda payloads.
+
+    The workbench backends answer with an API Gateway proxy envelope
+    ({"statusCode": ..., "body": "<json text>"}) where the body is itself a JSON
+    document encoded as a string. Loading that with json.loads keeps the raw
+    payload, the parsed envelope and the re-encoded response in memory at the
+    same time. The helpers below walk the payload chunk by chunk instead, so at
+    any point we only hold one chunk of input and one batch of decoded rows.
+
+    The controllers run behind Mangum, which returns the response to Lambda in
+    one piece, so the re-encoded response is still buffered. build_body can gzip
+    it as the batches are produced, which keeps that buffer at the size of the
+    compressed response.
+
+    Gzip is off unless WORKBENCH_GZIP_RESPONSES is set to true. Mangum returns a
+    compressed body base64 encoded (isBase64Encoded), and the REST API Gateway
+    only decodes it for clients when the stage lists the response type in
+    binaryMediaTypes (for example "*/*"). Without that setting clients would get
+    base64 text labelled Content-Encoding: gzip, so enable the flag only for
+    stages configured that way.
+
+    Shared by the workbench controllers; the dockerfiles copy common/ next to
+    each controller's modules.
+'''
+import codecs
+import io
+import json
+import os
+import re
+import zlib
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+ROW_BATCH_SIZE = 500
+GZIP_LEVEL = 6
+GZIP_RESPONSES = os.getenv("WORKBENCH_GZIP_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+# What may follow a complete number or literal
+_VALUE_END = frozenset(',]}:' + _WHITESPACE)
+_STRING_SPECIAL = re.compile(r'["\\]')
+_ARRAY_SEPARATOR = re.compile(r'[\s,]*')
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class PayloadFormatError(ValueError):
+    """Raised when the backend payload is not the expected proxy envelope."""
+
+
+class _ChunkReader:
+    '''
+    Cursor over an iterator of text chunks. Only the current chunk is kept.
+    '''
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self.buf = ''
+        self.pos = 0
+
+    def fill(self) -> bool:
+        # Make sure there is at least one unread character, returns False at EOF
+        while self.pos >= len(self.buf):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self.buf = chunk
+            self.pos = 0
+        return True
+
+    def extend(self) -> bool:
+        # Append the next chunk to whatever is still unread in the current one
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self) -> Optional[str]:
+        while self.fill():
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+        return None
+
+    def expect(self, char: str) -> None:
+        if self.skip_whitespace() != char:
+            raise PayloadFormatError(f"Expected '{char}' in backend payload")
+        self.pos += 1
+
+    def read_value(self) -> Any:
+        '''
+        Decode one JSON value (envelope keys, status codes, headers, rows).
+        Strings, objects and arrays are complete at their closing character.
+        Numbers and literals are only accepted once a delimiter follows them,
+        so one split across two chunks ("0" + ".1") is never decoded half way.
+        '''
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                if self.buf[end - 1] in '"]}' or (end < len(self.buf) and self.buf[end] in _VALUE_END):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                pass
+            if not self.extend():
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return value
+
+
+def decode_chunks(stream, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    '''
+    Turn a botocore StreamingBody (or any object with read()) into text chunks.
+    Multi-byte characters split across chunk boundaries are handled by the
+    incremental decoder.
+    '''
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _iter_string(reader: _ChunkReader) -> Iterator[str]:
+    '''
+    Yield the decoded contents of the JSON string at the reader's position,
+    roughly one input chunk at a time, without materializing the whole string.
+    '''
+    reader.expect('"')
+    out = []
+    while True:
+        if not reader.fill():
+            raise PayloadFormatError("Unterminated string in backend payload")
+        match = _STRING_SPECIAL.search(reader.buf, reader.pos)
+        if match is None:
+            out.append(reader.buf[reader.pos:])
+            reader.pos = len(reader.buf)
+            yield ''.join(out)
+            out = []
+            continue
+
+        start = match.start()
+        out.append(reader.buf[reader.pos:start])
+        reader.pos = start
+        if reader.buf[start] == '"':
+            reader.pos += 1
+            yield ''.join(out)
+            return
+
+        # Escape sequence: \uXXXX may be followed by a low surrogate, so make
+        # sure up to 12 characters are available before decoding it.
+        if len(reader.buf) - reader.pos < 12:
+            if out:
+                yield ''.join(out)
+                out = []
+            while len(reader.buf) - reader.pos < 12 and reader.extend():
+                pass
+        escape = reader.buf[reader.pos + 1:reader.pos + 2]
+        if escape in _SIMPLE_ESCAPES:
+            out.append(_SIMPLE_ESCAPES[escape])
+            reader.pos += 2
+            continue
+        length = 12 if reader.buf.startswith('\\u', reader.pos + 6) else 6
+        out.append(json.loads(f'"{reader.buf[reader.pos:reader.pos + length]}"'))
+        reader.pos += length
+
+
+def open_proxy_payload(chunks: Iterable[str]) -> Tuple[Dict[str, Any], Optional[Iterator[str]]]:
+    '''
+    Read the proxy envelope up to the start of "body".
+
+    Returns the envelope keys seen before the body and an iterator over the
+    decoded body text. When the body comes before statusCode, or the payload
+    has no body at all (Lambda errors), the remaining envelope is read eagerly
+    and the body iterator is None; the envelope then holds everything.
+    '''
+    reader = _ChunkReader(chunks)
+    envelope = {}
+    reader.expect('{')
+
+    if reader.skip_whitespace() == '}':
+        return envelope, None
+
+    while True:
+        key = reader.read_value()
+        reader.expect(':')
+        if key == 'body' and 'statusCode' in envelope and reader.skip_whitespace() == '"':
+            return envelope, _iter_body_then_rest(reader, envelope)
+        envelope[key] = reader.read_value()
+
+        separator = reader.skip_whitespace()
+        reader.pos += 1
+        if separator == '}':
+            return envelope, None
+        if separator != ',':
+            raise PayloadFormatError("Malformed envelope in backend payload")
+
+
+def _iter_body_then_rest(reader: _ChunkReader, envelope: Dict[str, Any]) -> Iterator[str]:
+    yield from _iter_string(reader)
+    # Trailing keys (headers, isBase64Encoded, ...) are small, keep them around
+    while reader.skip_whitespace() == ',':
+        reader.pos += 1
+        key = reader.read_value()
+        reader.expect(':')
+        envelope[key] = reader.read_value()
+
+
+def peek_text(pieces: Iterator[str]) -> Tuple[Optional[str], Iterator[str]]:
+    '''
+    Return the first non-whitespace character of a text stream together with
+    an iterator that still yields the full stream.
+    '''
+    seen = []
+    for piece in pieces:
+        seen.append(piece)
+        stripped = piece.lstrip(_WHITESPACE)
+        if stripped:
+            return stripped[0], chain(seen, pieces)
+    return None, iter(seen)
+
+
+def iter_array_rows(pieces: Iterable[str]) -> Iterator[Any]:
+    '''
+    Yield the elements of a JSON array given as text pieces, one row at a time.
+    Only the current row and the unread tail of the current piece are buffered.
+    '''
+    reader = _ChunkReader(pieces)
+    reader.expect('[')
+    while True:
+        if not reader.fill():
+            raise PayloadFormatError("Unterminated array in backend payload")
+        reader.pos = _ARRAY_SEPARATOR.match(reader.buf, reader.pos).end()
+        if reader.pos >= len(reader.buf):
+            continue
+        if reader.buf[reader.pos] == ']':
+            reader.pos += 1
+            return
+        yield reader.read_value()
+
+
+def iter_row_batches(rows: Iterable[Any], batch_size: int = ROW_BATCH_SIZE) -> Iterator[List[Any]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_requested_data(body_pieces: Iterator[str], prefix: Optional[Dict[str, Any]] = None,
+                          batch_size: int = ROW_BATCH_SIZE) -> Iterator[bytes]:
+    '''
+    Re-emit the backend body as {"requested_data": "<json text>"}, the same shape
+    fetch_data has always returned, one row batch at a time.
+
+    Array bodies are decoded row by row and re-serialized per batch. Any other
+    body is passed through piece by piece, escaped for the outer string.
+    Keys in prefix are written before requested_data.
+    '''
+    head = '{'
+    for key, value in (prefix or {}).items():
+        head += f'{json.dumps(key)}: {json.dumps(value)}, '
+    yield f'{head}"requested_data": "'.encode('utf-8')
+
+    first_char, body_pieces = peek_text(body_pieces)
+    if first_char == '[':
+        separator = '['
+        for batch in iter_row_batches(iter_array_rows(body_pieces), batch_size):
+            text = separator + ', '.join(json.dumps(row) for row in batch)
+            separator = ', '
+            yield json.dumps(text)[1:-1].encode('utf-8')
+        yield (']' if separator == ', ' else '[]').encode('utf-8')
+        # Drain the payload so trailing envelope keys are still read
+        for _ in body_pieces:
+            pass
+    else:
+        for piece in body_pieces:
+            yield json.dumps(piece)[1:-1].encode('utf-8')
+
+    yield b'"}'
+
+
+def gzip_response(accept_encoding: Optional[str]) -> bool:
+    # Whether to gzip the response: enabled for this deployment and accepted by the client
+    return GZIP_RESPONSES and accepts_gzip(accept_encoding)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    # True when the Accept-Encoding header allows gzip (and doesn't rule it out with q=0)
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def build_body(chunks: Iterable[bytes], compress: bool = False) -> bytes:
+    '''
+    Join response chunks into the response body, gzip compressed on the fly when
+    compress is set. Any error raised while the chunks are produced propagates
+    before a response exists, so callers can still answer with an error status.
+    '''
+    buffer = io.BytesIO()
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    for chunk in chunks:
+        buffer.write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        buffer.write(compressor.flush())
+    return buffer.getvalue()
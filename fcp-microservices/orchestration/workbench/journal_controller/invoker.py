@@ -1,9 +1,26 @@
+import threading
 import boto3
 from botocore.exceptions import ClientError
 
+_lambda_client = None
+_lambda_client_lock = threading.Lock()
+
+
+def get_lambda_client():
+    '''
+    Lambda client shared across invocations. Creating clients from the default
+    boto3 session is not thread safe, while using one client from several threads
+    is, so concurrent fetches go through this single instance.
+    '''
+    global _lambda_client
+    with _lambda_client_lock:
+        if _lambda_client is None:
+            _lambda_client = boto3.client('lambda')
+    return _lambda_client
+
 def invoke_lambda_function(function_name, payload=None):
-    # Create a Lambda client
-    client = boto3.client('lambda')
+    # Reuse the shared Lambda client
+    client = get_lambda_client()
 
     # Convert payload to bytes if it's not None
     if payload is not None:
@@ -28,3 +45,22 @@ def invoke_lambda_function(function_name, payload=None):
     except Exception as e:
         # Handle any other exceptions
         return(f"Exception: {e}")
+
+
+def invoke_lambda_function_stream(function_name, payload=None):
+    '''
+    Same as invoke_lambda_function, but hands back the undecoded response
+    stream so large payloads can be parsed incrementally (see stream_parser).
+    Errors are raised instead of being returned as strings.
+    '''
+    client = get_lambda_client()
+
+    if payload is not None:
+        payload = bytes(payload, 'utf-8')
+
+    response = client.invoke(
+        FunctionName=function_name,
+        InvocationType='RequestResponse',
+        Payload=payload if payload is not None else b''
+    )
+    return response['Payload']
@@ -1,20 +1,22 @@
-import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 from fastapi import FastAPI, Request
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import json
 from datetime import datetime
 from mangum import Mangum
-from invoker import invoke_lambda_function
+from invoker import invoke_lambda_function, invoke_lambda_function_stream
+from stream_parser import gzip_response, build_body, decode_chunks, open_proxy_payload, encode_requested_data
 from utils import send_log_to_sqs
+from log_utils import get_logger, start_request, log_payload
 from lib.exception.exception_codes import Reason
 from lib.exception.exceptions import JournalControllerException
 import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
-# Setup logger
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Setup logger (structured, debug output sampled per request)
+logger = get_logger(__name__)
 
 app = FastAPI()
 
@@ -33,13 +35,10 @@ async def journal_controller_exception_handler(request: Request, exc: JournalCon
     )
 
 def validate_request(info_request: InfoRequest):
-    # Ensure that get_data and get_filters are not both true
+    # get_data and get_filters together is the combined mode: both are fetched
+    # concurrently and returned in a single response
     if info_request.get_data and info_request.get_filters:
-        logger.error("Both 'get_data' and 'get_filters' cannot be true simultaneously.")
-        raise JournalControllerException(
-            message="Invalid request: 'get_data' and 'get_filters' cannot be true at the same time.",
-            reason=Reason.INVALID_INPUT
-        )
+        logger.info("Combined request: fetching filters and data together")
 
     logger.info("Request validation successful")
 
@@ -63,15 +62,28 @@ def fetch_filters():
             e=e
         )
 
-def fetch_data(filters: Dict[str, Any]) -> Dict[str, Any]:
+def fetch_data_body(filters: Dict[str, Any]):
+    '''
+    Invoke the journal backend and return an iterator over the decoded body text.
+    Journals can be large, so the payload is parsed incrementally instead of being
+    loaded with json.loads. Non-string bodies are returned as they are.
+    '''
     try:
-        response_raw = invoke_lambda_function(
+        stream = invoke_lambda_function_stream(
             "fincopilot_workbench_get_journals", 
             json.dumps(filters) if filters else None
         )
-        response_dict = json.loads(response_raw)
-        
-        return {"requested_data": response_dict["body"]}
+        envelope, body = open_proxy_payload(decode_chunks(stream))
+
+        if body is None:
+            # Small or unexpected payloads (e.g. Lambda errors) come back fully parsed
+            if "body" not in envelope:
+                raise ValueError(envelope.get("errorMessage", "Missing 'body' in backend response"))
+            if not isinstance(envelope["body"], str):
+                return envelope["body"]
+            body = iter([envelope["body"]])
+
+        return body
 
     except Exception as e:
         logger.error(f"Error retrieving data: {str(e)}")
@@ -82,19 +94,66 @@ def fetch_data(filters: Dict[str, Any]) -> Dict[str, Any]:
             e=e
         )
 
+def data_response(body, compress: bool, prefix: Optional[Dict[str, Any]] = None):
+    '''
+    Build {"requested_data": "<body>"} from the body one row batch at a time,
+    gzip compressed when compress is set. Keys in prefix are written before
+    requested_data. The body is complete before the response is created, so a
+    backend failure half way through still ends in an error response.
+    '''
+    if not isinstance(body, Iterator):
+        return (prefix or {}) | {"requested_data": body}
+    try:
+        content = build_body(encode_requested_data(body, prefix=prefix), compress=compress)
+    except Exception as e:
+        logger.error(f"Error reading data: {str(e)}")
+        send_log_to_sqs(f"Error reading data: {str(e)}")
+        raise JournalControllerException(
+            message="Error retrieving data.",
+            reason=Reason.RETRIEVE_DATA_ERROR,
+            e=e
+        )
+    headers = {"Content-Encoding": "gzip"} if compress else None
+    return Response(content, media_type="application/json", headers=headers)
+
+def fetch_data(filters: Dict[str, Any], compress: bool = False):
+    return data_response(fetch_data_body(filters), compress)
+
+def fetch_filters_and_data(filters: Dict[str, Any], compress: bool = False):
+    '''
+    Combined mode: invoke the filter and journal backends concurrently and return
+    {"filters": [...], "requested_data": "<body>"} in one response, which saves
+    the journal page a second round trip to the controller.
+    '''
+    # Each worker runs in a copy of the request context, so its logs keep the request id
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        filters_future = executor.submit(contextvars.copy_context().run, fetch_filters)
+        body_future = executor.submit(contextvars.copy_context().run, fetch_data_body, filters)
+        filters_response = filters_future.result()
+        body = body_future.result()
+
+    return data_response(body, compress, prefix=filters_response)
+
 
 @app.post("/")
-def root(info_request: InfoRequest):
+def root(info_request: InfoRequest, request: Request):
+    # Payload logging is sampled, unsampled requests never serialize the body
+    start_request()
+    log_payload(logger, "Received request body:", info_request.dict)
     try:
         validate_request(info_request)
 
         response_data = {}
+        compress = gzip_response(request.headers.get("accept-encoding"))
+
+        if info_request.get_filters and info_request.get_data:
+            return fetch_filters_and_data(info_request.filters, compress)
 
         if info_request.get_filters:
             response_data = fetch_filters()
 
         if info_request.get_data:
-            response_data = fetch_data(info_request.filters)
+            response_data = fetch_data(info_request.filters, compress)
 
         return response_data
 
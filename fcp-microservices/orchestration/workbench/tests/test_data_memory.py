@@ -0,0 +1,196 @@
+'''
+    End to end memory checks for the workbench data responses.
+
+    Drives each controller's Mangum handler with an API Gateway event while the
+    backend Lambda is replaced by a payload generated on the fly, so the only
+    large allocations tracemalloc sees are the controller's own.
+'''
+import base64
+import gzip
+import importlib
+import json
+import os
+import sys
+import tracemalloc
+from functools import lru_cache
+from types import SimpleNamespace
+
+import pytest
+
+WORKBENCH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTROLLER_MODULES = ("main", "invoker", "utils", "log_utils", "stream_parser")
+ROWS = 40000
+
+
+def load_controller(name):
+    # Both controllers use the same module names, import one of them fresh
+    for module in list(sys.modules):
+        if module in CONTROLLER_MODULES or module == "lib" or module.startswith("lib."):
+            del sys.modules[module]
+    paths = [os.path.join(WORKBENCH, name), os.path.join(WORKBENCH, "common")]
+    sys.path[:0] = paths
+    try:
+        main = importlib.import_module("main")
+    finally:
+        del sys.path[:len(paths)]
+    main.send_log_to_sqs = lambda message: None
+    return main
+
+
+def journal_row(i):
+    return {
+        "journal_id": f"JE-{i // 4:07d}",
+        "line": i % 4,
+        "account": f"4{i % 900:03d}0 - Revenue",
+        "memo": f"Invoice INV-{i:07d} for customer {i % 313}",
+        "debit": (i * 7919) % 100000 / 100,
+        "credit": 0,
+        "period": "Jan 2024",
+    }
+
+
+def payload_pieces(rows, fail_after=None):
+    # Proxy envelope with the rows as a JSON string body, one row at a time
+    yield b'{"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": "['
+    for i in range(rows):
+        if fail_after is not None and i == fail_after:
+            raise ConnectionError("Backend stream reset")
+        text = json.dumps(journal_row(i))
+        yield (", " if i else "").encode() + json.dumps(text)[1:-1].encode()
+    yield b']"}'
+
+
+class GeneratedStream:
+    '''
+    read() interface over payload_pieces, like the botocore StreamingBody.
+    '''
+    def __init__(self, pieces):
+        self._pieces = pieces
+        self._buffer = b""
+        self.size = 0
+
+    def read(self, size):
+        while len(self._buffer) < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            self._buffer += piece
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.size += len(data)
+        return data
+
+
+def api_gateway_event(body, accept_encoding="gzip, deflate"):
+    return {
+        "resource": "/",
+        "path": "/",
+        "httpMethod": "POST",
+        "headers": {"Content-Type": "application/json", "Accept-Encoding": accept_encoding},
+        "multiValueHeaders": {},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": None,
+        "stageVariables": None,
+        "requestContext": {"resourcePath": "/", "httpMethod": "POST", "path": "/", "stage": "test", "identity": {"sourceIp": "127.0.0.1"}},
+        "body": json.dumps(body),
+        "isBase64Encoded": False,
+    }
+
+
+REQUESTS = {
+    "journal_controller": {"get_filters": False, "get_data": True, "filters": {"period": "Jan 2024"}},
+    "account_controller": {"get_filters": False, "get_data": True, "default_filter": False,
+                           "payload": {"type": "trial_balance", "parameters": {"type": "trial_balance", "subsidiary_id": 1, "period_id": 1}}},
+}
+
+
+def run_handler(name, accept_encoding="gzip, deflate", rows=ROWS, fail_after=None, gzip_enabled=True):
+    '''
+    Returns (Lambda response, peak traced bytes during the handler call, backend
+    payload size). gzip_enabled stands for WORKBENCH_GZIP_RESPONSES.
+    '''
+    main = load_controller(name)
+    sys.modules["stream_parser"].GZIP_RESPONSES = gzip_enabled
+    event = api_gateway_event(REQUESTS[name], accept_encoding)
+    context = SimpleNamespace(function_name=name, aws_request_id="test")
+    # Warm up first, the one off cost of the first request is not what is measured
+    main.invoke_lambda_function_stream = lambda function_name, payload=None: GeneratedStream(payload_pieces(10))
+    main.handler(event, context)
+
+    stream = GeneratedStream(payload_pieces(rows, fail_after))
+    main.invoke_lambda_function_stream = lambda function_name, payload=None: stream
+    tracemalloc.start()
+    try:
+        response = main.handler(event, context)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return response, peak, stream.size
+
+
+@lru_cache(maxsize=None)
+def buffered_peak():
+    # What fetch_data used to cost: json.loads of the whole payload and the re-encoded response
+    raw = b"".join(payload_pieces(ROWS)).decode("utf-8")
+    tracemalloc.start()
+    try:
+        response_dict = json.loads(raw)
+        content = json.dumps({"requested_data": response_dict["body"]})
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del response_dict, content
+    return peak + len(raw)
+
+
+def response_json(response):
+    body = response["body"]
+    if response.get("isBase64Encoded"):
+        body = base64.b64decode(body)
+    if response["headers"].get("content-encoding") == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+@pytest.mark.parametrize("name", ["journal_controller", "account_controller"])
+def test_handler_peak_memory(name):
+    response, peak, payload_size = run_handler(name)
+
+    assert response["statusCode"] == 200
+    assert response["headers"]["content-encoding"] == "gzip"
+    rows = json.loads(response_json(response)["requested_data"])
+    assert len(rows) == ROWS and rows[-1] == journal_row(ROWS - 1)
+
+    # One row batch plus the compressed response, well under the payload itself
+    assert peak < payload_size * 0.6, (peak, payload_size)
+    assert peak < buffered_peak() / 6, (peak, buffered_peak())
+
+
+@pytest.mark.parametrize("name", ["journal_controller", "account_controller"])
+def test_handler_without_gzip(name):
+    response, _, _ = run_handler(name, accept_encoding="identity", rows=1000)
+
+    assert response["statusCode"] == 200
+    assert "content-encoding" not in response["headers"]
+    assert len(json.loads(response_json(response)["requested_data"])) == 1000
+
+
+@pytest.mark.parametrize("name", ["journal_controller", "account_controller"])
+def test_gzip_is_off_unless_enabled(name):
+    # Browsers always accept gzip, the gateway has to be set up for binary responses first
+    response, _, _ = run_handler(name, rows=1000, gzip_enabled=False)
+
+    assert response["statusCode"] == 200
+    assert "content-encoding" not in response["headers"]
+    assert not response.get("isBase64Encoded")
+    assert len(json.loads(json.loads(response["body"])["requested_data"])) == 1000
+
+
+@pytest.mark.parametrize("name", ["journal_controller", "account_controller"])
+def test_backend_failure_mid_stream(name):
+    response, _, _ = run_handler(name, rows=1000, fail_after=500)
+
+    # The controller's error response (status from the Reason table), never a truncated document
+    error = json.loads(response["body"])
+    assert "requested_data" not in error
+    assert "Error retrieving data." in json.dumps(error)
@@ -0,0 +1,42 @@
+'''
+    Request scoped logging in the workbench controllers.
+'''
+from test_data_memory import load_controller
+
+
+def test_unsampled_requests_never_build_the_payload():
+    main = load_controller("journal_controller")
+    calls = []
+
+    def payload():
+        calls.append(1)
+        return {"get_data": True}
+
+    main.start_request(0)
+    main.log_payload(main.logger, "Received request body:", payload)
+    assert calls == []
+
+    main.start_request(1)
+    main.log_payload(main.logger, "Received request body:", payload)
+    assert calls
+
+
+def test_combined_mode_workers_keep_the_request_id():
+    main = load_controller("journal_controller")
+    import log_utils
+    seen = {}
+
+    def fetch_filters():
+        seen["filters"] = log_utils.current_request_id()
+        return {"filters": []}
+
+    def fetch_data_body(filters):
+        seen["data"] = log_utils.current_request_id()
+        return "[]"
+
+    main.fetch_filters = fetch_filters
+    main.fetch_data_body = fetch_data_body
+    main.start_request(0, request_id="request-1")
+
+    assert main.fetch_filters_and_data({}) == {"filters": [], "requested_data": "[]"}
+    assert seen == {"filters": "request-1", "data": "request-1"}
@@ -0,0 +1,44 @@
+'''
+    Chunk boundaries in the incremental payload parser.
+'''
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+
+from stream_parser import gzip_response, iter_array_rows, open_proxy_payload  # noqa: E402
+
+
+def split_everywhere(text):
+    # Every way of cutting text into two chunks
+    for i in range(1, len(text)):
+        yield [text[:i], text[i:]]
+
+
+@pytest.mark.parametrize("text", [
+    '[0.1, -2e3, 12345, true, null, "a,b", {"x": 1.5}]',
+    '[1E+2,3]',
+    '[ 0 ]',
+])
+def test_array_rows_survive_any_chunk_boundary(text):
+    expected = json.loads(text)
+    for chunks in split_everywhere(text):
+        assert list(iter_array_rows(chunks)) == expected, chunks
+
+
+def test_number_split_before_the_fraction():
+    assert list(iter_array_rows(["[0", ".1]"])) == [0.1]
+    assert list(iter_array_rows(["[1", "e3, 2]"])) == [1000.0, 2]
+
+
+def test_envelope_status_code_split_across_chunks():
+    envelope, body = open_proxy_payload(['{"statusCode": 2', '00, "body": "[1]"}'])
+    assert envelope["statusCode"] == 200
+    assert "".join(body) == "[1]"
+
+
+def test_gzip_is_off_by_default():
+    assert not gzip_response("gzip, deflate, br")
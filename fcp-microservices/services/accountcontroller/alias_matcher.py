@@ -0,0 +1,116 @@
+'''
+    Subsidiary alias matcher for the entity resolver.
+
+    The subsidiaries of the system prompt in main.get_entities are listed here
+    with the aliases users type for them. The aliases are compiled once, at
+    import, into an Aho-Corasick automaton over normalized words (lower case,
+    punctuation dropped), so every mention in a prompt is found in a single
+    pass over its words, however many aliases there are.
+'''
+import re
+from collections import deque, namedtuple
+
+# Canonical subsidiary name -> aliases (the canonical name is always an alias)
+SUBSIDIARY_ALIASES = {
+    "DoorDash, Inc.": ["DD-US", "DD US", "DoorDash US", "US"],
+    "DoorDash Technologies Canada, Inc.": ["DD Canada", "DoorDash Canada", "DoorDash Technologies Canada", "Subsidiary Canada"],
+    "DoorDash Technologies Australia Pty Ltd": ["DD Australia", "DoorDash Australia", "DoorDash Technologies Australia", "Subsidiary Australia"],
+    "DoorDash Technologies New Zealand": ["DD New Zealand", "DD NZ", "DoorDash New Zealand", "Subsidiary New Zealand"],
+    "DoorDash Essentials, LLC": ["DoorDash Essentials", "DD Essentials"],
+    "DoorDash Kitchens": ["DD Kitchens"],
+    "DashLink Inc": ["DashLink"],
+    "DoorDash Giftcards LLC": ["DoorDash GiftCards", "DoorDash Gift Cards", "DD Giftcards"],
+    "Doordash G&C, LLC": ["DoorDash G&C", "DD G&C"],
+}
+# Aliases that are also common words only count when written exactly like this
+CASE_SENSITIVE_ALIASES = frozenset(["US"])
+
+WORD = re.compile(r"[A-Za-z0-9&]+")
+
+# text is the mention as written in the prompt, start/end its character span
+Mention = namedtuple("Mention", ["canonical", "text", "start", "end"])
+
+
+def normalize_words(text):
+    # (normalized word, start, end) for every word of text
+    return [(match.group().lower(), match.start(), match.end()) for match in WORD.finditer(text)]
+
+
+class AliasMatcher:
+    '''
+    Aho-Corasick automaton whose alphabet is normalized words. Each node is a
+    dict of word -> child; failure links and outputs are computed once when the
+    matcher is built.
+    '''
+    def __init__(self, aliases):
+        '''
+        Args:
+            aliases: dict of canonical name -> list of aliases
+        '''
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]  # node -> [(alias length in words, canonical, alias)]
+        for canonical, names in aliases.items():
+            for alias in [canonical] + list(names):
+                self._add(alias, canonical)
+        self._build_failure_links()
+
+    def _add(self, alias, canonical):
+        node = 0
+        words = [word for word, _, _ in normalize_words(alias)]
+        for word in words:
+            child = self._goto[node].get(word)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][word] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = child
+        output = (len(words), canonical, alias)
+        if output not in self._outputs[node]:
+            self._outputs[node].append(output)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                # A node also reports everything its failure node reports
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def find(self, text):
+        '''
+        Returns the subsidiary mentions in text as Mention tuples with character
+        spans, leftmost-longest and without overlaps.
+        '''
+        words = normalize_words(text)
+        candidates = []
+        node = 0
+        for index, (word, _, end) in enumerate(words):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, canonical, alias in self._outputs[node]:
+                start = words[index - length + 1][1]
+                if alias in CASE_SENSITIVE_ALIASES and text[start:end] != alias:
+                    continue
+                candidates.append(Mention(canonical, text[start:end], start, end))
+
+        mentions = []
+        for mention in sorted(candidates, key=lambda m: (m.start, m.start - m.end)):
+            if not mentions or mention.start >= mentions[-1].end:
+                mentions.append(mention)
+        return mentions
+
+
+subsidiary_matcher = AliasMatcher(SUBSIDIARY_ALIASES)
+
+
+def match_subsidiaries(text):
+    return subsidiary_matcher.find(text)
@@ -0,0 +1,320 @@
+'''
+    Local benchmarks for the entity resolver. Nothing here talks to OpenAI: a
+    stub server on localhost stands in for the chat completions endpoint and
+    answers every request with an empty tool call for the requested model.
+
+    The stub is plain HTTP, so the numbers leave out the TLS handshake a new
+    client pays against the real API on top of what is measured here.
+
+    Usage:
+        python benchmark.py [iterations]
+'''
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+
+from pydantic import BaseModel
+
+
+class BenchEntities(BaseModel):
+    # Same shape as main.entity_model (main.py needs the Lambda layers to import)
+    subsidiary: str = ""
+    brand: str = ""
+    customer_name: str = ""
+    customer_id: str = ""
+    customer_email: str = ""
+    business_unit: str = ""
+
+
+def completion_for(request):
+    '''
+    Chat completion answering the tool call instructor asks for, with every
+    property of the requested schema left empty.
+    '''
+    function = request["tools"][0]["function"]
+    arguments = {name: "" for name in function["parameters"].get("properties", {})}
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": request["model"],
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": "call_bench",
+                    "type": "function",
+                    "function": {"name": function["name"], "arguments": json.dumps(arguments)}
+                }]
+            }
+        }],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    }
+
+
+class StubCompletionsHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep the connection alive
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle delay the body
+    disable_nagle_algorithm = True
+    # Set by start_stub_server, returns (status, body[, headers]) for a request body
+    responder = staticmethod(lambda request: (200, completion_for(request)))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        status, response, *headers = self.responder(request)
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers[0] if headers else {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(responder=None):
+    handler = StubCompletionsHandler
+    if responder is not None:
+        handler = type("StubHandler", (StubCompletionsHandler,), {"responder": staticmethod(responder)})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def timed(label, fn, iterations):
+    start = perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000 / iterations:8.3f} ms/call")
+    return elapsed
+
+
+def bench_client_reuse(base_url, iterations):
+    import instructor
+    from openai import OpenAI
+    import llm_client
+
+    messages = [{"role": "user", "content": "open invoices for customer 123536"}]
+
+    def extract(client):
+        return client.chat.completions.create_with_completion(model="gpt-4", response_model=BenchEntities, messages=messages)
+
+    def new_client_per_call():
+        # What get_entities used to do on every invocation
+        extract(instructor.from_openai(OpenAI(api_key="bench-key", base_url=base_url)))
+
+    def cached_client():
+        extract(llm_client.get_client("bench-key", ("openai", "gpt-4")))
+
+    print("Client reuse")
+    before = timed("new client per call", new_client_per_call, iterations)
+    after = timed("llm_client.get_client", cached_client, iterations)
+    print(f"{'speedup':<40} {before / after:8.2f}x")
+
+
+# Prompts in the style of the system prompt examples
+SAMPLE_PROMPTS = [
+    "customer id 8620760",
+    "155617",
+    "customer 169239",
+    "walnutcreek@sourdoughandco.com",
+    "open invoices for DD Canada",
+    "AR aging for DoorDash Technologies Australia Pty Ltd",
+    "subsidiary DD-US customer 96461",
+    "balance for Wendy's in DD Canada",
+    "96461 Kaiser eSettlements",
+    "top 10 customers by balance",
+    "brand Wendy's open invoices",
+    "show all open invoices for WeWork",
+]
+
+
+def bench_pre_extraction(iterations):
+    from pre_extractor import pre_extract
+
+    # The stub LLM answers in milliseconds where GPT-4 takes seconds, so only
+    # the cost of the rules is measured; every hit saves one full completion
+    print("Pre-extraction")
+    hits = sum(pre_extract(prompt) is not None for prompt in SAMPLE_PROMPTS)
+    print(f"{'hit rate on sample prompts':<40} {hits / len(SAMPLE_PROMPTS):8.2%}")
+    elapsed = timed("pre_extract (all sample prompts)", lambda: [pre_extract(prompt) for prompt in SAMPLE_PROMPTS], iterations)
+    print(f"{'per prompt':<40} {elapsed * 1000 / iterations / len(SAMPLE_PROMPTS):8.3f} ms")
+
+
+
+def bench_alias_matcher(iterations):
+    from alias_matcher import SUBSIDIARY_ALIASES, match_subsidiaries
+
+    aliases = sum(len(names) + 1 for names in SUBSIDIARY_ALIASES.values())
+    print(f"Alias matcher ({aliases} aliases)")
+    long_prompt = " ".join(SAMPLE_PROMPTS)
+    timed("match_subsidiaries (sample prompts)", lambda: [match_subsidiaries(prompt) for prompt in SAMPLE_PROMPTS], iterations)
+    timed(f"match_subsidiaries ({len(long_prompt)} chars)", lambda: match_subsidiaries(long_prompt), iterations)
+
+
+
+def bench_result_cache(iterations):
+    import tempfile
+    from result_cache import ResultCache
+
+    print("Result cache")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(len(SAMPLE_PROMPTS), os.path.join(directory, "entities.db"))
+        keys = [cache.key(prompt, "gpt-4", "bench") for prompt in SAMPLE_PROMPTS]
+        for key in keys:
+            cache.set(key, BenchEntities().model_dump(), 1200, 2000.0)
+        timed("memory tier (sample prompts)", lambda: [cache.get(key) for key in keys], iterations)
+        # A new instance over the same file, like a restarted container
+        restarted = ResultCache(len(SAMPLE_PROMPTS), os.path.join(directory, "entities.db"))
+        timed("disk tier, first lookups", lambda: [restarted.get(key) for key in keys], 1)
+
+
+
+def bench_telemetry(iterations, sink_latency=0.005):
+    from telemetry import RequestTelemetry, TelemetryEmitter
+
+    # The sink sleeps like a network call to CloudWatch/SQS would take
+    def slow_sink(kind, message, payload):
+        sleep(sink_latency)
+
+    def request(emit):
+        telemetry = RequestTelemetry("bench", sample_rate=0.05)
+        telemetry.add_detail(user_prompt="open invoices for DD Canada")
+        telemetry.mark("llm")
+        emit(telemetry)
+
+    def synchronous(telemetry):
+        slow_sink("output", "", telemetry.summary())
+        if telemetry.detail:
+            slow_sink("detail", "", telemetry.detail)
+
+    emitter = TelemetryEmitter(slow_sink, max_queue=iterations)
+    print(f"Telemetry (sink takes {sink_latency * 1000:.0f} ms per record)")
+    before = timed("synchronous logging", lambda: request(synchronous), iterations)
+    after = timed("TelemetryEmitter.emit", lambda: request(emitter.emit), iterations)
+    print(f"{'speedup':<40} {before / after:8.2f}x")
+    emitter.flush()
+
+
+def bench_customer_index(customers=50000, iterations=2000):
+    import random
+    import tempfile
+    from customer_index import CustomerIndex
+
+    print(f"Customer index ({customers} customers)")
+    random.seed(0)
+    # Made up vocabulary, so names share trigrams about as much as real ones do
+    syllables = ["ka", "is", "er", "we", "wo", "rk", "pi", "zz", "ma", "rt", "fo", "od", "so", "ur", "do", "ug", "ki", "tc", "he", "gr"]
+    words = sorted({"".join(random.choices(syllables, k=random.randint(2, 4))).capitalize() for _ in range(3000)})
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "customers.csv")
+        names = [" ".join(random.sample(words, 2)) + f" {random.choice(['LLC', 'Inc', 'Co'])}" for _ in range(customers)]
+        with open(path, "w") as f:
+            f.write("customer_id,customer_number,customer_name\n")
+            for i, name in enumerate(names):
+                f.write(f'{i},{100000 + i},"{name}"\n')
+        index = CustomerIndex(path, refresh_seconds=3600)
+        timed("initial load", lambda: index.refresh(force=True), 1)
+        with open(path, "a") as f:
+            for i in range(customers, customers + 100):
+                f.write(f'{i},{100000 + i},"Appended Customer {i}"\n')
+        timed("incremental refresh (100 new rows)", lambda: index.refresh(force=True), 1)
+        # Same shapes as extracted customer names: a name, a number and a name, a bare number
+        known = customers // 2
+        for query in [names[known].rsplit(" ", 1)[0], f"{100000 + known} {names[known].split()[0]}", str(100000 + known)]:
+            timed(f"resolve {query!r}", lambda: index.resolve(query), iterations)
+
+
+class RateLimitedResponder:
+    '''
+    Stub responder enforcing a requests per second limit over a sliding
+    window, answering 429 with Retry-After like the OpenAI API. Completions
+    echo the user prompt as customer_name, so result order can be checked.
+    '''
+    def __init__(self, requests_per_second):
+        self.requests_per_second = requests_per_second
+        self.accepted = []
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            now = perf_counter()
+            self.accepted = [at for at in self.accepted if now - at < 1]
+            if len(self.accepted) >= self.requests_per_second:
+                self.rejected += 1
+                retry_after = 1 - (now - self.accepted[0])
+                error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                return 429, error, {"retry-after-ms": str(int(retry_after * 1000))}
+            self.accepted.append(now)
+        completion = completion_for(request)
+        arguments = json.loads(completion["choices"][0]["message"]["tool_calls"][0]["function"]["arguments"])
+        arguments["customer_name"] = request["messages"][-1]["content"]
+        completion["choices"][0]["message"]["tool_calls"][0]["function"]["arguments"] = json.dumps(arguments)
+        return 200, completion
+
+
+def bench_batch(prompts=120, requests_per_second=20):
+    import llm_client
+    from rate_limiter import RateLimiter, estimate_tokens, run_batch
+
+    # The limiter is configured above the stub's limit on purpose, so it has
+    # to adapt to the 429 responses
+    responder = RateLimitedResponder(requests_per_second)
+    server, base_url = start_stub_server(responder)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_MAX_RETRIES"] = "0"
+    limiter = RateLimiter(requests_per_minute=requests_per_second * 60 * 2, tokens_per_minute=10_000_000)
+    client = llm_client.get_client("bench-key", ("openai", "gpt-4"))
+
+    def extract(message):
+        messages = [{"role": "user", "content": message}]
+        estimated = estimate_tokens(messages)
+        limiter.acquire(estimated)
+        result, completion = client.chat.completions.create_with_completion(model="gpt-4", response_model=BenchEntities, messages=messages)
+        limiter.record_usage(estimated, completion.usage.total_tokens)
+        return result
+
+    inputs = [f"prompt {i}" for i in range(prompts)]
+    print(f"Batch extraction ({prompts} prompts, stub limited to {requests_per_second} requests/s)")
+    try:
+        start = perf_counter()
+        results = run_batch(extract, inputs, limiter, max_workers=16)
+        elapsed = perf_counter() - start
+    finally:
+        server.shutdown()
+    failed = [result for result in results if isinstance(result, Exception)]
+    in_order = all(getattr(result, "customer_name", None) == prompt for result, prompt in zip(results, inputs))
+    print(f"{'elapsed':<40} {elapsed:8.2f} s")
+    print(f"{'throughput':<40} {prompts / elapsed:8.2f} requests/s")
+    print(f"{'429 responses':<40} {responder.rejected:8d}")
+    print(f"{'failed prompts':<40} {len(failed):8d}")
+    print(f"{'results in input order':<40} {str(in_order):>8}")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server, base_url = start_stub_server()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    try:
+        bench_client_reuse(base_url, iterations)
+        bench_pre_extraction(iterations)
+        bench_alias_matcher(iterations)
+        bench_result_cache(iterations)
+        bench_telemetry(iterations)
+        bench_customer_index()
+    finally:
+        server.shutdown()
+    bench_batch()
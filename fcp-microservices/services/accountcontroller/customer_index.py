@@ -0,0 +1,257 @@
+'''
+    In-memory customer index for resolving extracted customers to ids.
+
+    entity_model only carries the customer as typed ("Kaiser", "147374 Wendy's",
+    "155617"). The index maps that text to candidate customers without a
+    database round trip, using
+        - a trigram index over normalized customer names, and
+        - a sorted list of customer numbers for number prefix lookups.
+
+    It is loaded from a customer export file (CSV with customer_id,
+    customer_number, customer_name columns and an optional deleted column) and
+    refreshed incrementally: rows appended to the file are read from where the
+    last refresh stopped, and a rewritten file is diffed against the index so
+    only changed customers are re-indexed. An append is told apart from a
+    rewrite by a hash of the part of the file already read, not by its size.
+    The index is loaded on the first lookup, not while the container
+    initializes. Configured through environment variables:
+
+        CUSTOMER_INDEX_PATH              customer export file (default: no index)
+        CUSTOMER_INDEX_REFRESH_SECONDS   minimum time between refresh checks (default 60)
+'''
+import bisect
+import csv
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import namedtuple
+from time import monotonic
+
+Customer = namedtuple("Customer", ["customer_id", "customer_number", "customer_name"])
+Candidate = namedtuple("Candidate", ["customer_id", "customer_number", "customer_name", "score"])
+# How far the export has been read: sha256 digest of its first offset bytes, the CSV header line
+FileState = namedtuple("FileState", ["inode", "offset", "mtime_ns", "header", "digest"])
+
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+LEADING_NUMBER = re.compile(r"^\s*(\d+)\b\s*(.*)$", re.DOTALL)
+
+# Customers scored per name lookup at most (beyond the rarest trigram's)
+MAX_CANDIDATES = 500
+
+
+def normalize_name(name):
+    return " ".join(NON_ALNUM.sub(" ", name.lower()).split())
+
+
+def trigrams(name):
+    # Trigrams of the normalized name, padded so short names and word starts count
+    padded = f"  {normalize_name(name)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CustomerIndex:
+    def __init__(self, path=None, refresh_seconds=60.0):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._customers = {}        # customer_id -> Customer
+        self._grams = {}            # customer_id -> trigrams of its name
+        self._postings = {}         # trigram -> set of customer_ids
+        self._numbers = []          # sorted (customer_number, customer_id)
+        # Guards the index: refresh changes it while lookups read it
+        self._lock = threading.Lock()
+        # One refresh at a time, lookups go on while it reads the file
+        self._refresh_lock = threading.Lock()
+        self._file_state = None     # FileState of the export read so far
+        self._checked_at = None
+
+    def __len__(self):
+        return len(self._customers)
+
+    # Loading
+
+    def refresh(self, force=False):
+        '''
+        Brings the index up to date with the export file. Appended rows are
+        read incrementally, a replaced or rewritten file is diffed. Returns
+        the number of customers added, changed or removed.
+        '''
+        if not self.path:
+            return 0
+        now = monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+            return 0
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+
+        with self._refresh_lock:
+            state = self._file_state
+            if state is not None and (state.inode, state.offset, state.mtime_ns) == (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+                return 0
+            with open(self.path, "rb") as f:
+                digest = hashlib.sha256()
+                if state is not None and state.inode == stat.st_ino and stat.st_size >= state.offset:
+                    # Unchanged up to where the last refresh stopped means rows were appended
+                    digest.update(f.read(state.offset))
+                    if digest.digest() == state.digest:
+                        data = self._complete_lines(f.read())
+                        digest.update(data)
+                        rows = self._parse(state.header + data)
+                        with self._lock:
+                            changes = sum(self._apply(row) for row in rows)
+                        self._file_state = FileState(stat.st_ino, state.offset + len(data), stat.st_mtime_ns, state.header, digest.digest())
+                        return changes
+                    # Rewritten in place, diff the whole file
+                    f.seek(0)
+                    digest = hashlib.sha256()
+                data = self._complete_lines(f.read())
+                digest.update(data)
+                header = data[:data.find(b"\n") + 1]
+                rows = self._parse(data)
+                with self._lock:
+                    changes = self._replace(rows)
+                self._file_state = FileState(stat.st_ino, len(data), stat.st_mtime_ns, header, digest.digest())
+            return changes
+
+    @staticmethod
+    def _complete_lines(data):
+        # A trailing partial line (export still being written) is left for the next refresh
+        return data[:data.rfind(b"\n") + 1]
+
+    @staticmethod
+    def _parse(data):
+        return list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+
+    def _replace(self, rows):
+        # Diff a full export against the index, customers missing from it are removed
+        seen = set()
+        changes = 0
+        for row in rows:
+            seen.add(row["customer_id"])
+            changes += self._apply(row)
+        for customer_id in [customer_id for customer_id in self._customers if customer_id not in seen]:
+            self._remove(customer_id)
+            changes += 1
+        return changes
+
+    def _apply(self, row):
+        customer_id = row["customer_id"]
+        if (row.get("deleted") or "").lower() in ("1", "true", "yes"):
+            if customer_id in self._customers:
+                self._remove(customer_id)
+                return 1
+            return 0
+        customer = Customer(customer_id, (row.get("customer_number") or "").strip(), (row.get("customer_name") or "").strip())
+        if self._customers.get(customer_id) == customer:
+            return 0
+        if customer_id in self._customers:
+            self._remove(customer_id)
+        self._customers[customer_id] = customer
+        grams = trigrams(customer.customer_name)
+        self._grams[customer_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(customer_id)
+        if customer.customer_number:
+            bisect.insort(self._numbers, (customer.customer_number, customer_id))
+        return 1
+
+    def _remove(self, customer_id):
+        customer = self._customers.pop(customer_id)
+        for gram in self._grams.pop(customer_id):
+            postings = self._postings[gram]
+            postings.discard(customer_id)
+            if not postings:
+                del self._postings[gram]
+        if customer.customer_number:
+            position = bisect.bisect_left(self._numbers, (customer.customer_number, customer_id))
+            del self._numbers[position]
+
+    # Lookups
+
+    def by_number_prefix(self, prefix, limit=10):
+        # Customers whose number starts with prefix, in number order
+        with self._lock:
+            start = bisect.bisect_left(self._numbers, (prefix,))
+            matches = []
+            for number, customer_id in self._numbers[start:start + limit]:
+                if not number.startswith(prefix):
+                    break
+                matches.append(self._customers[customer_id])
+            return matches
+
+    def by_name(self, name, limit=5, min_score=0.3):
+        '''
+        Customers with a similar name, scored by trigram Dice similarity.
+        Candidates come from the rarest trigrams of the name first, common ones
+        ("llc", "inc") are only used while fewer than MAX_CANDIDATES customers
+        have been collected. When even the rarest trigram is common, the
+        candidates are narrowed to customers sharing several trigrams. Either
+        way only a bounded number of customers is scored.
+        '''
+        grams = trigrams(name)
+        if not grams:
+            return []
+        with self._lock:
+            return self._by_name(grams, limit, min_score)
+
+    def _by_name(self, grams, limit, min_score):
+        ordered = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set()
+        if len(ordered[0]) <= MAX_CANDIDATES:
+            for postings in ordered:
+                if candidates and len(candidates) + len(postings) > MAX_CANDIDATES:
+                    break
+                candidates.update(postings)
+        else:
+            # Every trigram is common, narrow down to customers sharing several of them
+            candidates = ordered[0]
+            for postings in ordered[1:]:
+                if len(candidates) <= MAX_CANDIDATES:
+                    break
+                narrowed = candidates & postings
+                if len(narrowed) >= limit:
+                    candidates = narrowed
+        scored = []
+        for customer_id in candidates:
+            customer_grams = self._grams[customer_id]
+            score = 2 * len(grams & customer_grams) / (len(grams) + len(customer_grams))
+            if score >= min_score:
+                scored.append((score, customer_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self._customers[customer_id], score) for score, customer_id in scored[:limit]]
+
+    def resolve(self, text, limit=5):
+        '''
+        Candidate customers for an extracted customer name or number, best
+        first. "147374 Wendy's" style values use both the number and the name.
+
+        Returns:
+            list of Candidate(customer_id, customer_number, customer_name, score)
+        '''
+        self.refresh()
+        match = LEADING_NUMBER.match(text or "")
+        number, name = (match.group(1), match.group(2)) if match else ("", text or "")
+        has_name = bool(name.strip())
+        # With both a number and a name, the number is worth 0.6 and the name the rest
+        number_weight = 0.6 if has_name else 1.0
+        candidates = {}
+        if number:
+            for customer in self.by_number_prefix(number, limit):
+                # An exact number beats a prefix
+                score = number_weight if customer.customer_number == number else number_weight / 2
+                candidates[customer.customer_id] = Candidate(*customer, score)
+        if has_name:
+            for customer, score in self.by_name(name, limit):
+                previous = candidates.get(customer.customer_id)
+                # Once a number is given, a name alone is only worth its share
+                combined = (1 - number_weight) * score + (previous.score if previous else 0.0) if number else score
+                candidates[customer.customer_id] = Candidate(*customer, combined)
+        return sorted(candidates.values(), key=lambda candidate: (-candidate.score, candidate.customer_id))[:limit]
+
+
+# Loaded by the first resolve(), a cold start that never resolves a customer doesn't pay for it
+customer_index = CustomerIndex(os.environ.get("CUSTOMER_INDEX_PATH"), float(os.environ.get("CUSTOMER_INDEX_REFRESH_SECONDS", "60")))
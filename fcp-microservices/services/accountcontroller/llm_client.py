@@ -0,0 +1,93 @@
+'''
+    OpenAI clients shared across warm invocations.
+
+    Building an OpenAI client creates a new httpx connection pool, so creating
+    one per call pays a TCP and TLS handshake with the API on every request.
+    Clients are created once per API key and settings and kept for the lifetime
+    of the Lambda container. The pool and timeouts are configured through
+    environment variables:
+
+        OPENAI_BASE_URL              API base URL (default: the OpenAI API)
+        OPENAI_CONNECT_TIMEOUT       seconds to open a connection (default 5)
+        OPENAI_READ_TIMEOUT          seconds to wait for a response (default 60)
+        OPENAI_MAX_RETRIES           retries done by the OpenAI client (default 2)
+        OPENAI_MAX_CONNECTIONS       connections in the pool (default 10)
+        OPENAI_KEEPALIVE_EXPIRY      seconds an idle connection is kept (default 120)
+'''
+import hashlib
+import os
+import threading
+
+import httpx
+import instructor
+from openai import OpenAI
+
+
+def client_settings():
+    '''
+    Settings a client is built with. They are part of the cache key, so a
+    changed configuration gets a new client instead of a stale one.
+    '''
+    return (
+        os.environ.get('OPENAI_BASE_URL'),
+        float(os.environ.get('OPENAI_CONNECT_TIMEOUT', '5')),
+        float(os.environ.get('OPENAI_READ_TIMEOUT', '60')),
+        int(os.environ.get('OPENAI_MAX_RETRIES', '2')),
+        int(os.environ.get('OPENAI_MAX_CONNECTIONS', '10')),
+        float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', '120')),
+    )
+
+
+def build_client(api_key, settings):
+    base_url, connect_timeout, read_timeout, max_retries, max_connections, keepalive_expiry = settings
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+    openai_client = OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=max_retries,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        http_client=http_client
+    )
+    return instructor.from_openai(openai_client)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, model_settings=()):
+    '''
+    Returns the instructor patched client for api_key, creating it on first use.
+
+    Args:
+        api_key: OpenAI API key, None lets the client read OPENAI_API_KEY
+        model_settings: Model settings (e.g. provider and model name) the client
+            is used with, so clients are not shared across configurations
+    Returns:
+        Instructor patched OpenAI client
+    '''
+    # Keyed by a digest so the key itself does not show up in cache dumps
+    key = (hashlib.sha256((api_key or '').encode('utf-8')).hexdigest(), tuple(model_settings), client_settings())
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = build_client(api_key, key[2])
+                _clients[key] = client
+    return client
+
+
+def clear_clients():
+    # Closes and forgets every cached client
+    with _clients_lock:
+        for client in _clients.values():
+            client.client.close()
+        _clients.clear()
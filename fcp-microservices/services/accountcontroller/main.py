@@ -1,8 +1,15 @@
-import instructor
 from pydantic import BaseModel
-from openai import OpenAI
+import functools
 import json
-from time import time
+import os
+from llm_client import get_client
+from pre_extractor import pre_extract, pre_extraction_stats
+from alias_matcher import match_subsidiaries
+from result_cache import result_cache, template_hash
+from rate_limiter import RateLimiter, estimate_tokens, run_batch
+from prompt_templates import system_message, system_prompt_variant, template_tokens
+from telemetry import RequestTelemetry, TelemetryEmitter, prompt_hash
+from customer_index import customer_index
 from aws_logging_utils import log_cloudwatch, sqs_logging_enabled, LogLevel, LogType
 from exceptions import *
 
@@ -24,10 +31,70 @@ class entity_model(BaseModel):
     business_unit: str = ""
   
   
+# Computed once, the schema doesn't change at runtime
+ENTITY_SCHEMA = entity_model.model_json_schema()
+ENTITY_SCHEMA_JSON = json.dumps(ENTITY_SCHEMA, sort_keys=True)
+
+# Settings and statistics of the latest request, see finish_request
 model_information = {}
 model_information['run_statistics'] = {}
 model_information['settings'] = {}  
 
+TELEMETRY_LOG_TYPES = {"settings": LogType.FUNCTION_INPUT, "output": LogType.FUNCTION_OUTPUT, "detail": LogType.LLM_DETAIL}
+
+def write_telemetry(kind, message, payload):
+    if sqs_logging_enabled:
+        log_cloudwatch(log_level=LogLevel.INFO, log_type=TELEMETRY_LOG_TYPES[kind], message=message, args=payload)
+
+telemetry_emitter = TelemetryEmitter(write_telemetry)
+# Longest wait for the telemetry writes at the end of an invocation, before Lambda freezes the container
+TELEMETRY_FLUSH_SECONDS = float(os.environ.get('TELEMETRY_FLUSH_SECONDS', '2'))
+
+def flush_telemetry_after(handler):
+    '''
+    Decorator for the Lambda handler: get_entities only queues its telemetry,
+    the queued writes are waited for once, when the invocation ends.
+
+        @flush_telemetry_after
+        def lambda_handler(event, context):
+            ...
+    '''
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            telemetry_emitter.flush(TELEMETRY_FLUSH_SECONDS)
+    return wrapper
+
+def subsidiary_hint(message):
+    '''
+    Args:
+        message: User prompt
+    Returns:
+        str: Hint naming the canonical subsidiary of every subsidiary mention
+        in the prompt, empty when there is none
+    '''
+    mentions = match_subsidiaries(message)
+    if not mentions:
+        return ""
+    known = "; ".join(f'"{mention.text}" refers to the subsidiary {mention.canonical}' for mention in mentions)
+    return f"Subsidiary mentions recognized in the user prompt: {known}\nReturn the complete subsidiary name for them."
+
+def finish_request(telemetry, system_prompt=None):
+    '''
+    Publishes the request telemetry: model_information keeps the latest
+    request for existing readers and the emitter writes it in the background.
+    '''
+    model_information['settings'] = telemetry.settings
+    model_information['run_statistics'] = telemetry.summary()
+    telemetry_emitter.emit(telemetry, system_prompt)
+
+def record_failure(telemetry, error):
+    telemetry.mark('llm')
+    telemetry.usage['error'] = type(error).__name__
+    finish_request(telemetry)
+
 def get_entities(api_key, message):
     '''
     Args:
@@ -36,105 +103,20 @@ def get_entities(api_key, message):
     Returns:
         entity_model: Extracted entities from user prompt       
     '''
-    start = time()
-    # Patch the OpenAI client
-    client = instructor.from_openai(OpenAI(api_key=api_key))
-
-    system_prompt = {
-        "role": "system",
-        "content": """
-        You are an expert in extracting key information from a given user prompt.
-        Hello, sorry here using phone is very difficult. are you available this weekend?
-        And I am sure it is good to try to sign in all related accounts before everything.
-        do you want me to share the credintials now?
-        
-The user's prompt will be in the subject area of Accounts Receivables. 
-The primary objective of the user prompt is to extract information from Accounting System. 
-The Accounting system belongs to the Company Doordash.
-Your job is to evaluate the user prompt and look for key data elements and classify them into one of the following dimensions only if they are suitable.
-subsidiary, brand, customer, customerId, customerEmail, business_unit. 
-
-It is ok if the user prompt does not have any of the key data elements. 
-You can strictly return blanks if you are unable to identify and classify into the dimensions.
-Do not try to fill things on your own.
-Do not use emails in the user prompt to fill the entities. 
-
-1) subsidiary : Name of the company that is owned or controlled by the Doordash. 
-Doordash refers to the subsidiaries either by the complete name or a short name.
-Here are a few examples of Subsidiaries referenced by Complete Names
-DoorDash, Inc.
-DoorDash Technologies Canada, Inc.
-DoorDash Technologies Australia Pty Ltd
-DoorDash Essentials, LLC
-DoorDash Kitchens
-DashLink Inc
-DoorDash Giftcards LLC
-DoorDash GiftCards 
-Doordash G&C, LLC
-DoorDash Technologies New Zealand
-
-Here are a few examples of Subsidiaries referenced by short Names
-US
-DD-US
-DD Canada
-DD Australia
-
-User prompts may also specifically prefix the key word subsidiary followed by the subsidiary name.
-Please note the difference between the words "Subsidiary Canada" and "All subsidiaries". 
-The words "Subsidiary Canada" references to a specific subsidiary and Canada will be extracted from user prompt for Subsidiary dimension.
-The words "All subsidiaries" references to all Subsidiaries. So no specific subsidiary can be referenced. Hence you will not extract any keyword for Subsidiary dimension.
-
-If there is no subsidiary extracted from the user prompt, strictly return an empty string for subsidiary.
-If there is a subsidiary return the entire subsidiary name.
-
-2) customer : refers to an individual, business, or organization or a merchant that does business with the company.
-Customers are referenced by 
-a) customer number only or 
-b) customer name only or
-c) customer number and name together or 
-d) customer email or
-d) customer Ids 
-When identifying numbers, note that 'customer id' is ALWAYS prefixed while the 'customer number' may or may not be prefixed: customer id 12345 and customer 67890. 'customer number' needs to be classified as customer name. 
-Here are some examples: 
-a) "customer id 8620760" is classified as customer id 
-b) 155617 is classified as customer_name 
-c) "customer id 8585857" is classified as customer id 
-d) customer 169239 is classified as customer_name
-When searching by customer email, users will type in an email that belongs to a customer. The email needs to be classified as customer_mail. If the email does not belong to the customer, do not extract it. strictly return an empty string. 
-Example of a customer email is 
-walnutcreek@sourdoughandco.com
-When searching generally, they may or may not use the word "Customer" as a prefix.
-If they use the prefix customer, it needs to be classified as customer_name. 
-Say the prompt says "Top 10 customers" or "All customers" where no specific customer has been referenced, customer entity need not be extracted. 
-
-Examples of customer number and name that start with a number followed by name.
-96461 Kaiser eSettlements
-121835 We Work Management, LLC
-149206 Jake's Franchising, LLC
-147374 Wendy's
-121852 We Work Management, LLC 
-
-Examples of customer name
-Kaiser
-WeWork
-Wendy's
-
-Examples of customer Ids
-97342232
-123536
-1232984
-
-If there is no customer in the user prompt strictly return an empty string for customer. 
-If there is a customer return the entire customer name.
-
-User prompts may also specifically prefix the key word brand followed by the brand name which needs to be extracted for brand. 
-
-
-Business unit will be specified as BU. Do not include BU in the entity extraction.
-        """
-    }
-    messages = [system_prompt] + [{"role": "user", "content": message}]
-    
+    return extract_entities(api_key, message)
+
+def extract_entities(api_key, message, rate_limiter=None):
+    '''
+    get_entities with the LLM call throttled by rate_limiter, used by the batch
+
+    Args:
+        api_key: OpenAI API key
+        message: User prompt
+        rate_limiter: RateLimiter the LLM call acquires from (batch extraction)
+    Returns:
+        entity_model: Extracted entities from user prompt       
+    '''
+    # A misconfigured function fails on every prompt, also the ones the rules answer
     MODEL_NAME = os.environ.get('MODEL_NAME')
     MODEL_PROVIDER = os.environ.get('MODEL_PROVIDER')
     if MODEL_NAME is None: 
@@ -144,9 +126,64 @@ Business unit will be specified as BU. Do not include BU in the entity extractio
         raise EntityResolverException("Model provider not supported", Reason.UNSUPPORTED_MODEL_PROVIDER_IN_CONFIG) 
     
     if MODEL_NAME != "gpt-4":
-        raise EntityResolverException("Language model not supported", Reason.UNSUPPORTED_LLM_IN_CONFIG) from e
+        raise EntityResolverException("Language model not supported", Reason.UNSUPPORTED_LLM_IN_CONFIG)
+
+    telemetry = RequestTelemetry("extract-structured-data")
+    telemetry.add_detail(user_prompt=message)
+
+    # Prompts the rules fully understand don't need the LLM
+    pre_extracted = pre_extract(message)
+    telemetry.mark('pre_extract')
+    pre_extraction_stats.record(pre_extracted is not None, telemetry.timings_ms['pre_extract'] / 1000)
+    if pre_extracted is not None:
+        structured_outputs = entity_model(**pre_extracted)
+        telemetry.source = "rules"
+        telemetry.statistics = pre_extraction_stats.stats()
+        telemetry.add_detail(extracted_output=structured_outputs.model_dump())
+        finish_request(telemetry)
+        return structured_outputs
+
+    # Static template first, so every request starts with the same prefix
+    prompt_variant = system_prompt_variant()
+    system_prompt = system_message(prompt_variant)
+    messages = [system_prompt] + [{"role": "user", "content": message}]
+
+    # Subsidiary mentions the alias matcher recognized are passed on as a hint
+    additional_context = subsidiary_hint(message)
+    if additional_context:
+        messages = [system_prompt, {"role": "system", "content": additional_context}, {"role": "user", "content": message}]
+    telemetry.add_detail(additional_user_prompt_context=additional_context)
+
+    telemetry.settings = {
+        'model_provider': MODEL_PROVIDER,
+        'model': MODEL_NAME,
+        'system_prompt_variant': prompt_variant,
+        'system_prompt_hash': prompt_hash(system_prompt['content']),
+        'system_prompt_tokens': template_tokens(prompt_variant),
+    }
+
+    # Answers to prompts seen before, for the same hint, model and prompt template
+    cache_key = result_cache.key(message, MODEL_NAME, template_hash(prompt_variant, system_prompt['content'], ENTITY_SCHEMA_JSON), additional_context)
+    cached = result_cache.get(cache_key)
+    telemetry.mark('result_cache')
+    telemetry.statistics = pre_extraction_stats.stats() | result_cache.stats()
+    if cached is not None:
+        structured_outputs = entity_model(**cached['output'])
+        telemetry.source = "cache"
+        telemetry.add_detail(extracted_output=structured_outputs.model_dump())
+        finish_request(telemetry, system_prompt['content'])
+        return structured_outputs
+
+    # Patched OpenAI client, reused across warm invocations
+    client = get_client(api_key, (MODEL_PROVIDER, MODEL_NAME))
     
+    estimated_tokens = estimate_tokens(messages)
+    if rate_limiter is not None:
+        rate_limiter.acquire(estimated_tokens)
+        telemetry.mark('rate_limit_wait')
+
     # Extract structured data from natural language
+    telemetry.source = "llm"
     try: 
         structured_outputs, completion = client.chat.completions.create_with_completion(
             model=MODEL_NAME,
@@ -154,51 +191,75 @@ Business unit will be specified as BU. Do not include BU in the entity extractio
             messages=messages,
         )
     except RateLimitError as e:
+        record_failure(telemetry, e)
         raise EntityResolverException("Rate limit exceeded", Reason.RATE_LIMIT_EXCEEDED, subcomponent="extract-structured-data") from e
     except OpenAIError as e:
+        record_failure(telemetry, e)
         raise EntityResolverException("OpenAI error", Reason.API_ERROR, subcomponent="extract-structured-data") from e
     except Exception as e:
+        record_failure(telemetry, e)
         raise EntityResolverException("Unknown error", Reason.UNKNOWN, subcomponent="extract-structured-data") from e
-    
-    end = time()
-    entity_resolver_latency = end - start
+    telemetry.mark('llm')
 
-    
-    if sqs_logging_enabled:
+    # Time spent in the completion itself, without waiting for the rate limiter
+    llm_latency_ms = telemetry.timings_ms['llm']
+    pre_extraction_stats.record_llm(llm_latency_ms / 1000)
+    if rate_limiter is not None:
+        rate_limiter.record_usage(estimated_tokens, completion.usage.total_tokens)
+    result_cache.set(cache_key, structured_outputs.model_dump(), completion.usage.total_tokens, llm_latency_ms)
 
-        # inputs log
-        inputs_ = {}
-        model_input = entity_model.model_json_schema()
-        inputs_["function_name"] = "extract-structured-data"
-        inputs_['pydantic_model'] = model_input
-        inputs_['model_provider'] = MODEL_PROVIDER
-        inputs_['system_prompt'] = system_prompt
-        inputs_['completion_response_id'] = completion.id
-        inputs_['temperature'] = ""
-        inputs_['top_p'] = ""
-        inputs_['model'] = completion.model
-        inputs_['created'] = completion.created
-        inputs_['additional_user_prompt_context'] = ""
-        
-        log_cloudwatch(log_level=LogLevel.INFO, log_type=LogType.FUNCTION_INPUT, message="Extracted entity input", args=model_input)
-        model_information['settings'] = model_information['settings'] | inputs_
-
-
-        # outputs log
-        outputs = {}
-        outputs['latency_ms'] = entity_resolver_latency * 1000 # convert to ms
-        outputs['function_name'] = "extract-structured-data"
-        outputs['prompt_tokens'] = completion.usage.prompt_tokens
-        outputs['completion_tokens'] = completion.usage.completion_tokens
-        outputs['total_tokens'] = completion.usage.total_tokens
-        outputs['extracted_output'] = structured_outputs.model_dump()
-        log_cloudwatch(log_level=LogLevel.INFO, log_type=LogType.FUNCTION_OUTPUT, message="Extracted entity output", args=outputs)
-        model_information['run_statistics'] = model_information['run_statistics'] | outputs
-
-        log_info = {}
-        log_info['model_information'] = model_information
-        log_info['user_prompt'] =  message
-
-        log_cloudwatch(log_level=LogLevel.INFO, log_type=LogType.LLM_DETAIL, message="Extracted entity output", args=log_info)
+    telemetry.usage = {
+        'completion_response_id': completion.id,
+        'created': completion.created,
+        'prompt_tokens': completion.usage.prompt_tokens,
+        'completion_tokens': completion.usage.completion_tokens,
+        'total_tokens': completion.usage.total_tokens,
+        # What the prompt would have cost with the full template, to track the compaction
+        'prompt_tokens_full_template': completion.usage.prompt_tokens - telemetry.settings['system_prompt_tokens'] + template_tokens('full'),
+    }
+    telemetry.add_detail(extracted_output=structured_outputs.model_dump(), pydantic_model=ENTITY_SCHEMA)
+    finish_request(telemetry, system_prompt['content'])
     
     return structured_outputs
+
+
+def get_customer_candidates(entities, limit=5):
+    '''
+    Args:
+        entities: entity_model returned by get_entities
+        limit: Maximum number of candidates
+    Returns:
+        list: Candidate customers (customer_id, customer_number, customer_name,
+        score) for the extracted customer, best first, from the local customer
+        index. Empty when no customer was extracted or no index is configured
+    '''
+    if not entities.customer_name:
+        return []
+    return customer_index.resolve(entities.customer_name, limit)
+
+
+def get_entities_batch(api_key, messages, max_workers=None, requests_per_minute=None, tokens_per_minute=None):
+    '''
+    Extracts entities for many prompts concurrently, within the requests per
+    minute and tokens per minute budgets (ENTITY_BATCH_RPM / ENTITY_BATCH_TPM
+    unless given). Rate limited calls are retried after backing off. Set
+    OPENAI_MAX_RETRIES=0 for batch jobs so rate limits reach the scheduler
+    instead of being retried blindly by the client.
+
+    Args:
+        api_key: OpenAI API key
+        messages: User prompts
+    Returns:
+        list: entity_model for every prompt in input order, or the exception
+        raised for it
+    '''
+    limiter = RateLimiter(
+        requests_per_minute or int(os.environ.get('ENTITY_BATCH_RPM', '500')),
+        tokens_per_minute or int(os.environ.get('ENTITY_BATCH_TPM', '80000'))
+    )
+    return run_batch(
+        lambda message: extract_entities(api_key, message, rate_limiter=limiter),
+        messages,
+        limiter,
+        max_workers=max_workers or int(os.environ.get('ENTITY_BATCH_WORKERS', '8'))
+    )
@@ -0,0 +1,118 @@
+'''
+    Rule based entity extraction that runs before the LLM.
+
+    Many prompts only carry a customer id, a customer number, a customer email
+    or a subsidiary name. For those the classification rules of the system
+    prompt in main.get_entities can be applied directly with regexes and the
+    subsidiary alias matcher (alias_matcher.py). pre_extract() only answers
+    when every word of the prompt is accounted for, either by an entity or by a
+    known filler word; anything else (customer names, brands, business units,
+    small numbers, numbers not labelled as a customer's) goes to the LLM.
+'''
+import re
+import threading
+
+from alias_matcher import match_subsidiaries
+
+# Words that carry no entity, a prompt made of these and entities is fully understood
+FILLER_WORDS = frozenset("""
+    a an the of for in on at by to from with and or me my our us show list get give find what whats
+    is are was were which who how much many please all any open opened closed overdue due past
+    balance balances invoice invoices invoiced payment payments credit credits memo memos
+    receivable receivables ar aging ageing outstanding unpaid paid amount amounts total totals
+    transaction transactions detail details summary report statement statements account accounts
+    customer customers subsidiary subsidiaries id number no email e mail
+""".split())
+
+# Shorter numbers ("customer 12", "top 10") are quantities as often as customers, they go to the LLM
+MIN_NUMBER_DIGITS = 5
+CUSTOMER_ID = re.compile(rf"\bcustomer[\s_-]*id\b\s*[:#]?\s*(\d{{{MIN_NUMBER_DIGITS},}})\b", re.IGNORECASE)
+# 'customer number' may or may not be prefixed, both go to customer_name
+CUSTOMER_NUMBER = re.compile(rf"\bcustomer(?:[\s_-]*(?:number|no\.?|#))?\s*[:#]?\s*(\d{{{MIN_NUMBER_DIGITS},}})\b", re.IGNORECASE)
+# A number anywhere else may be an invoice, transaction, memo or account number, only a
+# prompt that is nothing but the number is taken as a customer number
+BARE_CUSTOMER_NUMBER = re.compile(rf"\s*(\d{{{MIN_NUMBER_DIGITS},}})\s*")
+CUSTOMER_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+WORD = re.compile(r"[a-z0-9]+")
+
+# (field, pattern) in the order they are applied
+RULES = [
+    ("customer_id", CUSTOMER_ID),
+    ("customer_email", CUSTOMER_EMAIL),
+    ("customer_name", CUSTOMER_NUMBER),
+]
+
+
+def pre_extract(message):
+    '''
+    Args:
+        message: User prompt
+    Returns:
+        dict of entity_model fields when the rules fully explain the prompt,
+        None when the prompt needs the LLM
+    '''
+    bare_number = BARE_CUSTOMER_NUMBER.fullmatch(message)
+    if bare_number:
+        return {"customer_name": bare_number.group(1)}
+
+    entities = {}
+    remaining = message
+    for field, pattern in RULES:
+        for match in pattern.finditer(remaining):
+            value = match.group(match.lastindex or 0)
+            # Two different values for the same entity is for the LLM to sort out
+            if entities.get(field, value) != value:
+                return None
+            entities[field] = value
+        remaining = pattern.sub(" ", remaining)
+
+    for mention in reversed(match_subsidiaries(remaining)):
+        if entities.get("subsidiary", mention.canonical) != mention.canonical:
+            return None
+        entities["subsidiary"] = mention.canonical
+        remaining = remaining[:mention.start] + " " + remaining[mention.end:]
+
+    if any(word not in FILLER_WORDS for word in WORD.findall(remaining.lower())):
+        return None
+    return entities
+
+
+class PreExtractionStats:
+    '''
+    Hit rate of the fast path and the latency it saved. Saved latency is
+    estimated as the average latency of the LLM calls made by this container,
+    minus the time spent in the rules, for every hit.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+        self.rules_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    def record(self, hit, seconds):
+        with self._lock:
+            self.calls += 1
+            self.hits += 1 if hit else 0
+            self.rules_seconds += seconds
+
+    def record_llm(self, seconds):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            average_llm = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+            average_rules = self.rules_seconds / self.calls if self.calls else 0.0
+            return {
+                "pre_extraction_calls": self.calls,
+                "pre_extraction_hits": self.hits,
+                "pre_extraction_hit_rate": round(self.hits / self.calls, 4) if self.calls else 0.0,
+                "average_llm_latency_ms": average_llm * 1000,
+                "latency_saved_ms": max(self.hits * (average_llm - average_rules), 0.0) * 1000,
+            }
+
+
+pre_extraction_stats = PreExtractionStats()
@@ -0,0 +1,195 @@
+'''
+    System prompt templates for get_entities and their token accounting.
+
+    SYSTEM_PROMPT is the prompt as it was written. compact_template() derives
+    a compacted version from it: stray chat text that ended up in the prompt is
+    dropped, indentation, trailing spaces and blank lines are removed and
+    repeated whitespace is collapsed. The wording of the rules is not touched.
+    The template is the first message and never changes between calls, so the
+    request prefix stays identical and cacheable; everything per call (the
+    subsidiary hint, the user prompt) comes after it.
+
+    Which template get_entities sends is chosen with ENTITY_SYSTEM_PROMPT
+    ("full", the default, or "compact"). The compact template is about 7%
+    shorter (1001 instead of 1075 estimated tokens): it removes noise, it
+    doesn't shorten the rules. prompt_tool.py measures both and checks on the
+    fixture prompts that reach the LLM that they extract the same entities;
+    set ENTITY_SYSTEM_PROMPT=compact only once `prompt_tool.py verify` passes
+    against the deployed model.
+
+    TEMPLATE_TOKENS is counted once at import, never on the request path. It
+    uses the tokenizer only when its encoding data is bundled with the function
+    (TIKTOKEN_CACHE_DIR), since tiktoken would otherwise download it, and falls
+    back to an estimate.
+'''
+import functools
+import hashlib
+import os
+import re
+
+SYSTEM_PROMPT = """
+        You are an expert in extracting key information from a given user prompt.
+        Hello, sorry here using phone is very difficult. are you available this weekend?
+        And I am sure it is good to try to sign in all related accounts before everything.
+        do you want me to share the credintials now?
+        
+The user's prompt will be in the subject area of Accounts Receivables. 
+The primary objective of the user prompt is to extract information from Accounting System. 
+The Accounting system belongs to the Company Doordash.
+Your job is to evaluate the user prompt and look for key data elements and classify them into one of the following dimensions only if they are suitable.
+subsidiary, brand, customer, customerId, customerEmail, business_unit. 
+
+It is ok if the user prompt does not have any of the key data elements. 
+You can strictly return blanks if you are unable to identify and classify into the dimensions.
+Do not try to fill things on your own.
+Do not use emails in the user prompt to fill the entities. 
+
+1) subsidiary : Name of the company that is owned or controlled by the Doordash. 
+Doordash refers to the subsidiaries either by the complete name or a short name.
+Here are a few examples of Subsidiaries referenced by Complete Names
+DoorDash, Inc.
+DoorDash Technologies Canada, Inc.
+DoorDash Technologies Australia Pty Ltd
+DoorDash Essentials, LLC
+DoorDash Kitchens
+DashLink Inc
+DoorDash Giftcards LLC
+DoorDash GiftCards 
+Doordash G&C, LLC
+DoorDash Technologies New Zealand
+
+Here are a few examples of Subsidiaries referenced by short Names
+US
+DD-US
+DD Canada
+DD Australia
+
+User prompts may also specifically prefix the key word subsidiary followed by the subsidiary name.
+Please note the difference between the words "Subsidiary Canada" and "All subsidiaries". 
+The words "Subsidiary Canada" references to a specific subsidiary and Canada will be extracted from user prompt for Subsidiary dimension.
+The words "All subsidiaries" references to all Subsidiaries. So no specific subsidiary can be referenced. Hence you will not extract any keyword for Subsidiary dimension.
+
+If there is no subsidiary extracted from the user prompt, strictly return an empty string for subsidiary.
+If there is a subsidiary return the entire subsidiary name.
+
+2) customer : refers to an individual, business, or organization or a merchant that does business with the company.
+Customers are referenced by 
+a) customer number only or 
+b) customer name only or
+c) customer number and name together or 
+d) customer email or
+d) customer Ids 
+When identifying numbers, note that 'customer id' is ALWAYS prefixed while the 'customer number' may or may not be prefixed: customer id 12345 and customer 67890. 'customer number' needs to be classified as customer name. 
+Here are some examples: 
+a) "customer id 8620760" is classified as customer id 
+b) 155617 is classified as customer_name 
+c) "customer id 8585857" is classified as customer id 
+d) customer 169239 is classified as customer_name
+When searching by customer email, users will type in an email that belongs to a customer. The email needs to be classified as customer_mail. If the email does not belong to the customer, do not extract it. strictly return an empty string. 
+Example of a customer email is 
+walnutcreek@sourdoughandco.com
+When searching generally, they may or may not use the word "Customer" as a prefix.
+If they use the prefix customer, it needs to be classified as customer_name. 
+Say the prompt says "Top 10 customers" or "All customers" where no specific customer has been referenced, customer entity need not be extracted. 
+
+Examples of customer number and name that start with a number followed by name.
+96461 Kaiser eSettlements
+121835 We Work Management, LLC
+149206 Jake's Franchising, LLC
+147374 Wendy's
+121852 We Work Management, LLC 
+
+Examples of customer name
+Kaiser
+WeWork
+Wendy's
+
+Examples of customer Ids
+97342232
+123536
+1232984
+
+If there is no customer in the user prompt strictly return an empty string for customer. 
+If there is a customer return the entire customer name.
+
+User prompts may also specifically prefix the key word brand followed by the brand name which needs to be extracted for brand. 
+
+
+Business unit will be specified as BU. Do not include BU in the entity extraction.
+        """
+
+# Chat text pasted into the prompt by mistake, it is not an instruction
+STRAY_LINES = frozenset([
+    "Hello, sorry here using phone is very difficult. are you available this weekend?",
+    "And I am sure it is good to try to sign in all related accounts before everything.",
+    "do you want me to share the credintials now?",
+])
+
+
+def compact_template(template):
+    lines = []
+    for line in template.splitlines():
+        line = re.sub(r"[ \t]+", " ", line.strip())
+        if line and line not in STRAY_LINES:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+SYSTEM_PROMPTS = {
+    "full": SYSTEM_PROMPT,
+    "compact": compact_template(SYSTEM_PROMPT),
+}
+
+
+def system_prompt_variant():
+    # The full template until a verify run has shown the compact one extracts the same entities
+    return os.environ.get("ENTITY_SYSTEM_PROMPT", "full")
+
+
+def system_message(variant=None):
+    # System message for the ENTITY_SYSTEM_PROMPT variant (or the one given)
+    return {"role": "system", "content": SYSTEM_PROMPTS[variant or system_prompt_variant()]}
+
+
+def _is_bundled(encoding_name):
+    # tiktoken keeps downloaded encodings in TIKTOKEN_CACHE_DIR under the sha1 of their URL
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR")
+    url = f"https://openaipublic.blob.core.windows.net/encodings/{encoding_name}.tiktoken"
+    return bool(cache_dir) and os.path.exists(os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest()))
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model, download=False):
+    # None when tiktoken or its encoding data is not available, downloads it only when asked to
+    try:
+        import tiktoken
+        from tiktoken.model import encoding_name_for_model
+        if not download and not _is_bundled(encoding_name_for_model(model)):
+            return None
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        print(f"Tokenizer for {model} not available, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text, model="gpt-4", download=False):
+    '''
+    Returns:
+        (int, bool): token count of text and whether it is exact, estimated
+        counts (about 4 characters per token) are used without a tokenizer
+    '''
+    encoding = _encoding(model, download)
+    if encoding is None:
+        return (len(text) + 3) // 4, False
+    return len(encoding.encode(text)), True
+
+
+# variant -> token count of the template, for the model get_entities is configured with
+TEMPLATE_TOKENS = {
+    variant: count_tokens(template, os.environ.get("MODEL_NAME", "gpt-4"))[0]
+    for variant, template in SYSTEM_PROMPTS.items()
+}
+
+
+def template_tokens(variant):
+    return TEMPLATE_TOKENS[variant]
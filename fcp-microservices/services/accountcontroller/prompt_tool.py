@@ -0,0 +1,101 @@
+'''
+    Offline tool for the get_entities system prompt.
+
+    Usage:
+        python prompt_tool.py count [fixtures.json]
+            Token counts of the full and compact templates (and of every
+            fixture prompt with each template) with the local tokenizer.
+        python prompt_tool.py compact OUTPUT
+            Writes the compact template to OUTPUT for review.
+        python prompt_tool.py verify [fixtures.json]
+            Runs the fixtures that reach the LLM through get_entities with
+            both templates and fails when the extracted entities differ
+            between them or from the expected fields. Fixtures the rules in
+            pre_extractor.py answer never see a template and are skipped.
+            Needs OPENAI_API_KEY and the Lambda layers (aws_logging_utils,
+            exceptions) on the path.
+
+    count downloads the tiktoken encoding data on first use; point
+    TIKTOKEN_CACHE_DIR at a directory holding it to run offline. The same
+    directory, bundled with the function, gives the Lambda exact template
+    counts (see prompt_templates.TEMPLATE_TOKENS).
+'''
+import json
+import os
+import sys
+
+from prompt_templates import SYSTEM_PROMPTS, count_tokens
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "entity_prompts.json")
+MODEL = os.environ.get("MODEL_NAME", "gpt-4")
+
+
+def load_fixtures(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def count(fixtures_path=DEFAULT_FIXTURES):
+    counts = {variant: count_tokens(template, MODEL, download=True) for variant, template in SYSTEM_PROMPTS.items()}
+    exact = all(is_exact for _, is_exact in counts.values())
+    print(f"{'template':<12} {'chars':>8} {'tokens':>8}" + ("" if exact else "  (estimated, tokenizer not available)"))
+    for variant, template in SYSTEM_PROMPTS.items():
+        print(f"{variant:<12} {len(template):>8} {counts[variant][0]:>8}")
+    full, compact = counts["full"][0], counts["compact"][0]
+    print(f"{'saved':<12} {'':>8} {full - compact:>8} ({(full - compact) / full:.1%})")
+
+    print()
+    print(f"{'fixture prompt':<60} {'full':>8} {'compact':>8}")
+    for fixture in load_fixtures(fixtures_path):
+        user_tokens = count_tokens(fixture["prompt"], MODEL, download=True)[0]
+        print(f"{fixture['prompt'][:60]:<60} {full + user_tokens:>8} {compact + user_tokens:>8}")
+
+
+def compact(output_path):
+    with open(output_path, "w") as f:
+        f.write(SYSTEM_PROMPTS["compact"] + "\n")
+    print(f"Wrote {output_path} ({count_tokens(SYSTEM_PROMPTS['compact'], MODEL, download=True)[0]} tokens)")
+
+
+def verify(fixtures_path=DEFAULT_FIXTURES):
+    # Cached answers would hide differences between the templates
+    os.environ["ENTITY_CACHE_SIZE"] = "0"
+    os.environ.setdefault("MODEL_NAME", MODEL)
+    os.environ.setdefault("MODEL_PROVIDER", "openai")
+    import main
+    from pre_extractor import pre_extract
+
+    api_key = os.environ["OPENAI_API_KEY"]
+    fixtures = [fixture for fixture in load_fixtures(fixtures_path) if pre_extract(fixture["prompt"]) is None]
+    skipped = len(load_fixtures(fixtures_path)) - len(fixtures)
+    failures = 0
+    for fixture in fixtures:
+        prompt = fixture["prompt"]
+        results = {}
+        for variant in SYSTEM_PROMPTS:
+            os.environ["ENTITY_SYSTEM_PROMPT"] = variant
+            results[variant] = main.get_entities(api_key, prompt).model_dump()
+        problems = []
+        if results["full"] != results["compact"]:
+            problems.append(f"full {results['full']} != compact {results['compact']}")
+        for field, expected in fixture.get("expected", {}).items():
+            if results["compact"][field] != expected:
+                problems.append(f"{field}: expected {expected!r}, got {results['compact'][field]!r}")
+        print(f"{'FAIL' if problems else 'ok':<5} {prompt}")
+        for problem in problems:
+            print(f"      {problem}")
+        failures += bool(problems)
+    print(f"{failures} of {len(fixtures)} fixtures failed ({skipped} answered by the rules, not sent to the LLM)")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("count", [])
+    if command == "count":
+        count(*args)
+    elif command == "compact":
+        compact(*args)
+    elif command == "verify":
+        sys.exit(0 if verify(*args) else 1)
+    else:
+        sys.exit(__doc__)
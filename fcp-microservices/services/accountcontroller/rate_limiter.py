@@ -0,0 +1,154 @@
+'''
+    Rate limit aware scheduling for batch entity extraction.
+
+    RateLimiter keeps two token buckets, one for requests per minute and one
+    for tokens per minute, and every LLM call acquires from both before it goes
+    out. When the API still answers with a rate limit error, the limiter backs
+    off: every caller pauses until the Retry-After delay has passed and the
+    refill rate is halved, then it creeps back up with every successful call.
+
+    run_batch() runs a function over many inputs on a thread pool through the
+    limiter, retries rate limited calls and returns results in input order.
+'''
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+from openai import RateLimitError
+
+# Completion tokens reserved per call on top of the prompt estimate
+COMPLETION_TOKEN_ALLOWANCE = 200
+
+
+def estimate_tokens(messages):
+    # Rough prompt size (about 4 characters per token) plus the completion allowance
+    return sum(len(message["content"]) for message in messages) // 4 + COMPLETION_TOKEN_ALLOWANCE
+
+
+# Seconds of budget a full bucket holds, i.e. how much may go out in one burst
+BURST_SECONDS = 1.0
+
+
+class TokenBucket:
+    '''
+    Bucket refilled continuously at per_minute * scale per minute, holding at
+    most BURST_SECONDS worth of it. Not thread safe, RateLimiter locks it.
+    '''
+    def __init__(self, per_minute):
+        self.per_minute = float(per_minute)
+        self.capacity = max(1.0, self.per_minute * BURST_SECONDS / 60)
+        self.tokens = self.capacity
+        self.scale = 1.0
+        self._updated = monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.per_minute * self.scale / 60)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        # Seconds until amount tokens are available (never more than a full bucket)
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing, 0.0) * 60 / (self.per_minute * self.scale)
+
+    def take(self, amount, now):
+        # May go negative, the debt is paid back by the refill
+        self._refill(now)
+        self.tokens -= amount
+
+
+class RateLimiter:
+    '''
+    Requests per minute and tokens per minute budget shared by the threads of
+    a batch. Rate limit responses halve the refill rate (down to min_scale)
+    and pause everyone for the Retry-After delay; every success gives back
+    recovery_step of the full rate.
+    '''
+    def __init__(self, requests_per_minute, tokens_per_minute, min_scale=0.1, recovery_step=0.01):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_scale = min_scale
+        self.recovery_step = recovery_step
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def acquire(self, tokens):
+        while True:
+            with self._lock:
+                now = monotonic()
+                wait = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if wait <= 0:
+                    self.requests.take(1, now)
+                    self.tokens.take(tokens, now)
+                    return
+            sleep(wait)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        # Settle the token estimate against the real usage and recover the rate
+        with self._lock:
+            now = monotonic()
+            self.tokens.take(actual_tokens - estimated_tokens, now)
+            for bucket in (self.requests, self.tokens):
+                bucket._refill(now)
+                bucket.scale = min(1.0, bucket.scale + self.recovery_step)
+
+    def throttle(self, retry_after=None):
+        with self._lock:
+            now = monotonic()
+            self.throttled += 1
+            # Calls that were already in flight report the same limit, back off once per pause
+            if now >= self._paused_until:
+                for bucket in (self.requests, self.tokens):
+                    bucket._refill(now)
+                    bucket.scale = max(self.min_scale, bucket.scale / 2)
+                    bucket.tokens = min(bucket.tokens, 0.0)
+            # Without a Retry-After, wait for one request at the reduced rate
+            pause = retry_after if retry_after is not None else 60 / (self.requests.per_minute * self.requests.scale)
+            self._paused_until = max(self._paused_until, now + pause)
+
+
+def rate_limit_error(error):
+    # The RateLimitError behind error (possibly wrapped, e.g. by EntityResolverException), or None
+    while error is not None:
+        if isinstance(error, RateLimitError):
+            return error
+        error = error.__cause__
+    return None
+
+
+def retry_after_seconds(error):
+    # Delay requested by the API in the Retry-After(-ms) headers, if any
+    headers = error.response.headers if getattr(error, "response", None) is not None else {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def run_batch(fn, items, limiter, max_workers=8, max_attempts=5):
+    '''
+    Calls fn(item) for every item on a thread pool. fn is expected to acquire
+    from limiter before calling the API. Rate limited calls throttle the
+    limiter and are retried up to max_attempts times.
+
+    Returns:
+        list: fn's result for every item in input order, or the exception it
+        raised last
+    '''
+    def run(item):
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return fn(item)
+            except Exception as e:
+                limited = rate_limit_error(e)
+                if limited is None or attempt == max_attempts:
+                    return e
+                limiter.throttle(retry_after_seconds(limited))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run, items))
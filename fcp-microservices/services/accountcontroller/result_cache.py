@@ -0,0 +1,121 @@
+'''
+    Result cache for the entity resolver.
+
+    Users ask the same questions over and over, so extracted entities are
+    cached under the prompt, the extra context sent with it (the subsidiary
+    hint), the model name and a hash of the prompt template. Only whitespace
+    is normalized: case and punctuation can change what the model extracts
+    ("Kaiser in US" and "Kaiser in us", "a.b@x.com" and "a-b@x.com"). A changed
+    system prompt, hint or output model therefore never serves stale results.
+
+    The first tier is an in-memory LRU shared by warm invocations. The optional
+    second tier is a sqlite file that survives container restarts when it is
+    on persistent storage. The cache is configured through environment variables:
+
+        ENTITY_CACHE_SIZE       entries kept in memory, 0 disables the cache (default 1024)
+        ENTITY_CACHE_DB_PATH    sqlite file for the on-disk tier (default: no disk tier)
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+def normalize_prompt(message):
+    # Whitespace collapsed, nothing else: every other character can matter to the model
+    return " ".join(message.split())
+
+
+def template_hash(*parts):
+    # Digest of everything that shapes the answer besides the prompt (system prompt, output schema)
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    '''
+    Two tier (memory LRU, optional sqlite) cache of extraction results. Each
+    entry keeps the extracted fields with the tokens and latency the original
+    completion cost, which is what a hit saves.
+    '''
+    def __init__(self, max_entries, db_path=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path and max_entries > 0:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entity_results (key TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.latency_saved_ms = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(message, model, prompt_template_hash, additional_context=""):
+        return template_hash(normalize_prompt(message), additional_context, model or "", prompt_template_hash)
+
+    def get(self, key):
+        '''
+        Returns the cached entry ({"output", "total_tokens", "latency_ms"}) or None.
+        '''
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+            elif self._db is not None:
+                row = self._db.execute("SELECT entry FROM entity_results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = json.loads(row[0])
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self.tokens_saved += entry["total_tokens"]
+            self.latency_saved_ms += entry["latency_ms"]
+            return entry
+
+    def set(self, key, output, total_tokens, latency_ms):
+        if not self.enabled:
+            return
+        entry = {"output": output, "total_tokens": total_tokens, "latency_ms": latency_ms}
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO entity_results (key, entry) VALUES (?, ?)", (key, json.dumps(entry)))
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "result_cache_hits": hits,
+                "result_cache_disk_hits": self.disk_hits,
+                "result_cache_misses": self.misses,
+                "result_cache_hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "result_cache_tokens_saved": self.tokens_saved,
+                "result_cache_latency_saved_ms": self.latency_saved_ms,
+            }
+
+
+result_cache = ResultCache(int(os.environ.get("ENTITY_CACHE_SIZE", "1024")), os.environ.get("ENTITY_CACHE_DB_PATH"))
@@ -0,0 +1,120 @@
+'''
+    Per-request telemetry for the entity resolver.
+
+    get_entities fills one RequestTelemetry per call (timings, token usage,
+    where the answer came from) and hands it to the TelemetryEmitter, which
+    writes it from a background thread, so the request never waits on the log
+    sink. The summary of every request is written. The heavy detail record
+    (user prompt, extracted output, output schema) only for a sampled fraction
+    of requests (ENTITY_TELEMETRY_SAMPLE_RATE, default 0.05). The system prompt
+    is referenced by its hash; its full text is written once per container
+    for every hash seen.
+'''
+import hashlib
+import os
+import queue
+import random
+import threading
+import uuid
+from time import perf_counter, time
+
+
+def prompt_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class RequestTelemetry:
+    '''
+    Everything recorded about one get_entities call.
+    '''
+    def __init__(self, function_name, sample_rate=None):
+        rate = float(os.environ.get("ENTITY_TELEMETRY_SAMPLE_RATE", "0.05")) if sample_rate is None else sample_rate
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+        self.created = time()
+        self.sampled = rate >= 1 or random.random() < rate
+        self.source = None          # "rules", "cache" or "llm"
+        self.timings_ms = {}
+        self.settings = {}
+        self.usage = {}
+        self.statistics = {}
+        self.detail = {}
+        self._started = perf_counter()
+        self._mark = self._started
+
+    def mark(self, stage):
+        # Time spent since the previous mark (or the start) is recorded under stage
+        now = perf_counter()
+        self.timings_ms[stage] = (now - self._mark) * 1000
+        self._mark = now
+
+    def add_detail(self, **values):
+        # Heavy payloads, only kept for sampled requests
+        if self.sampled:
+            self.detail.update(values)
+
+    @property
+    def latency_ms(self):
+        return (self._mark - self._started) * 1000
+
+    def summary(self):
+        return {
+            "request_id": self.request_id,
+            "function_name": self.function_name,
+            "source": self.source,
+            "latency_ms": self.latency_ms,
+            "timings_ms": self.timings_ms,
+            **self.settings,
+            **self.usage,
+            **self.statistics,
+        }
+
+
+class TelemetryEmitter:
+    '''
+    Writes telemetry records through sink(log_type, message, payload) on a
+    daemon thread. emit() never blocks: when the queue is full the record is
+    dropped and counted. Lambda freezes the container between invocations, so
+    records queued at the end of one invocation are written when the next one
+    thaws it, or never. The Lambda handler therefore calls flush() once before
+    it returns (main.flush_telemetry_after), which waits up to a timeout for
+    the queued writes.
+    '''
+    def __init__(self, sink, max_queue=1000):
+        self._sink = sink
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._prompts_written = set()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def emit(self, telemetry, system_prompt=None):
+        try:
+            self._queue.put_nowait((telemetry, system_prompt))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        # Waits until every queued record has been written, False on timeout
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def _run(self):
+        while True:
+            telemetry, system_prompt = self._queue.get()
+            try:
+                self._write(telemetry, system_prompt)
+            except Exception as e:
+                print(f"Writing telemetry {telemetry.request_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, telemetry, system_prompt):
+        if system_prompt is not None:
+            digest = telemetry.settings.get("system_prompt_hash")
+            if digest not in self._prompts_written:
+                self._prompts_written.add(digest)
+                self._sink("settings", "System prompt", {"system_prompt_hash": digest, "system_prompt": system_prompt})
+        self._sink("output", "Extracted entity output", telemetry.summary())
+        if telemetry.detail:
+            self._sink("detail", "Extracted entity detail", {"request_id": telemetry.request_id, **telemetry.detail})
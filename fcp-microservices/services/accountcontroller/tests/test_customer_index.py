@@ -0,0 +1,122 @@
+'''
+    Customer index refreshes: appends, rewrites and concurrent lookups.
+'''
+import importlib
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import customer_index  # noqa: E402
+from customer_index import CustomerIndex  # noqa: E402
+
+HEADER = "customer_id,customer_number,customer_name\n"
+
+
+def write(path, rows, mode="w"):
+    with open(path, mode) as f:
+        if mode == "w":
+            f.write(HEADER)
+        for row in rows:
+            f.write(",".join(row) + "\n")
+
+
+def test_appended_rows_are_read_incrementally(tmp_path):
+    path = tmp_path / "customers.csv"
+    write(path, [("1", "100001", "Kaiser"), ("2", "100002", "Wendy's")])
+    index = CustomerIndex(str(path))
+    assert index.refresh(force=True) == 2
+
+    write(path, [("3", "100003", "WeWork")], mode="a")
+
+    assert index.refresh(force=True) == 1
+    assert [c.customer_id for c in index.by_number_prefix("10000")] == ["1", "2", "3"]
+
+
+def test_rewrite_in_place_with_same_header_and_size_is_diffed(tmp_path):
+    path = tmp_path / "customers.csv"
+    write(path, [("1", "100001", "Kaiser"), ("2", "100002", "Wendys")])
+    index = CustomerIndex(str(path))
+    index.refresh(force=True)
+    inode = os.stat(path).st_ino
+
+    # Same inode, same header and a larger file, which looked like an append before
+    with open(path, "r+") as f:
+        f.write(HEADER + "1,100001,Kaizen\n2,100002,Wendys\n4,100004,Doordash\n")
+    assert os.stat(path).st_ino == inode
+
+    assert index.refresh(force=True) == 2
+    assert index.by_number_prefix("100001")[0].customer_name == "Kaizen"
+    assert len(index) == 3
+
+
+def test_rewrite_with_same_size_is_detected(tmp_path):
+    path = tmp_path / "customers.csv"
+    write(path, [("1", "100001", "Kaiser")])
+    index = CustomerIndex(str(path))
+    index.refresh(force=True)
+    stat = os.stat(path)
+
+    write(path, [("1", "100001", "Kaizer")])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert index.refresh(force=True) == 1
+    assert index.by_number_prefix("100001")[0].customer_name == "Kaizer"
+
+
+def test_lookups_during_refreshes(tmp_path):
+    path = tmp_path / "customers.csv"
+    write(path, [(str(i), str(100000 + i), f"Customer {i} LLC") for i in range(2000)])
+    index = CustomerIndex(str(path))
+    index.refresh(force=True)
+    errors = []
+    done = threading.Event()
+
+    def lookups():
+        while not done.is_set():
+            try:
+                index.resolve("100500 Customer 500")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=lookups) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for round_ in range(10):
+        # Every customer renamed, every refresh re-indexes all of them
+        write(path, [(str(i), str(100000 + i), f"Customer {i} Inc {round_}") for i in range(2000)])
+        index.refresh(force=True)
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_index_is_not_loaded_at_import(tmp_path, monkeypatch):
+    path = tmp_path / "customers.csv"
+    write(path, [("1", "100001", "Kaiser")])
+    monkeypatch.setenv("CUSTOMER_INDEX_PATH", str(path))
+    module = importlib.reload(customer_index)
+    try:
+        assert len(module.customer_index) == 0
+        assert module.customer_index.resolve("100001")[0].customer_id == "1"
+    finally:
+        monkeypatch.delenv("CUSTOMER_INDEX_PATH")
+        importlib.reload(customer_index)
+
+
+def test_number_decides_between_customers_sharing_a_name(tmp_path):
+    path = tmp_path / "customers.csv"
+    write(path, [("1", "147300", "Wendy's"), ("2", "147374", "Wendy's"), ("3", "147399", "Wendy's"),
+                 ("4", "121835", '"We Work Management, LLC"'), ("5", "121852", '"We Work Management, LLC"')])
+    index = CustomerIndex(str(path))
+
+    wendys = index.resolve("147374 Wendy's")
+    assert wendys[0].customer_id == "2"
+    assert wendys[0].score > wendys[1].score
+
+    assert [c.customer_id for c in index.resolve("121852 We Work Management, LLC")][:2] == ["5", "4"]
+    # Without a number the name alone decides
+    assert {c.customer_id for c in index.resolve("Wendy's")} == {"1", "2", "3"}
@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client  # noqa: E402
+
+
+def test_clients_are_shared_per_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "from-env")
+    llm_client.clear_clients()
+    try:
+        assert llm_client.get_client("key-a") is llm_client.get_client("key-a")
+        assert llm_client.get_client("key-a") is not llm_client.get_client("key-b")
+        # Without a key the OpenAI client falls back to OPENAI_API_KEY
+        client = llm_client.get_client(None)
+        assert client is llm_client.get_client(None)
+        assert client.client.api_key == "from-env"
+    finally:
+        llm_client.clear_clients()
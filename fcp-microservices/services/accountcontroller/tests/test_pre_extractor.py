@@ -0,0 +1,53 @@
+'''
+    Rule based fast path: what it answers and what it leaves to the LLM.
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pre_extractor import pre_extract  # noqa: E402
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("customer id 8620760", {"customer_id": "8620760"}),
+    ("customer 169239", {"customer_name": "169239"}),
+    ("155617", {"customer_name": "155617"}),
+    ("customer 155617 open invoices", {"customer_name": "155617"}),
+    ("customer number 12345 balance", {"customer_name": "12345"}),
+    ("invoices for walnutcreek@sourdoughandco.com", {"customer_email": "walnutcreek@sourdoughandco.com"}),
+])
+def test_rules_answer(prompt, expected):
+    assert pre_extract(prompt) == expected
+
+
+@pytest.mark.parametrize("prompt", [
+    # Small numbers are for the LLM, they are as likely a quantity as a customer
+    "customer 12",
+    "customer 12 balance",
+    "customer id 12",
+    "top 10 customers",
+    # Customer names
+    "Kaiser open invoices",
+    # Numbers that are not explicitly a customer's may be any other document or account number
+    "155617 open invoices",
+    "invoice 10023456",
+    "account 40000 balance",
+    "transaction 99887766 details",
+    "credit memo 5512345",
+    "payments amount 25000",
+    "customer 169239 invoice 10023456",
+])
+def test_left_to_the_llm(prompt):
+    assert pre_extract(prompt) is None
+
+
+def test_model_config_is_validated_before_the_rules(monkeypatch):
+    pytest.importorskip("aws_logging_utils")
+    import main
+    monkeypatch.delenv("MODEL_NAME", raising=False)
+
+    with pytest.raises(main.EntityResolverException):
+        main.get_entities("key", "customer id 8620760")
@@ -0,0 +1,40 @@
+'''
+    Template token counts: counted once at import, never downloaded on the request path.
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_templates  # noqa: E402
+
+
+def test_template_tokens_are_precomputed(monkeypatch):
+    def no_counting(*args, **kwargs):
+        raise AssertionError("template counted on the request path")
+    monkeypatch.setattr(prompt_templates, "count_tokens", no_counting)
+
+    assert prompt_templates.template_tokens("compact") == prompt_templates.TEMPLATE_TOKENS["compact"]
+    assert prompt_templates.template_tokens("compact") < prompt_templates.template_tokens("full")
+
+
+def test_encoding_is_not_downloaded_without_a_bundle(monkeypatch, tmp_path):
+    tiktoken = pytest.importorskip("tiktoken")
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: pytest.fail("encoding downloaded"))
+    prompt_templates._encoding.cache_clear()
+    try:
+        assert prompt_templates.count_tokens("open invoices", "gpt-4") == ((len("open invoices") + 3) // 4, False)
+    finally:
+        prompt_templates._encoding.cache_clear()
+
+
+def test_full_template_is_the_default(monkeypatch):
+    monkeypatch.delenv("ENTITY_SYSTEM_PROMPT", raising=False)
+    assert prompt_templates.system_prompt_variant() == "full"
+    assert prompt_templates.system_message()["content"] == prompt_templates.SYSTEM_PROMPT
+
+    monkeypatch.setenv("ENTITY_SYSTEM_PROMPT", "compact")
+    assert prompt_templates.system_message()["content"] == prompt_templates.SYSTEM_PROMPTS["compact"]
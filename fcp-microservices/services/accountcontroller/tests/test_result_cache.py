@@ -0,0 +1,41 @@
+'''
+    Result cache keys: prompts the model may answer differently never share an entry.
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache  # noqa: E402
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Kaiser in US", "Kaiser in us"),
+    ("invoices for a.b@x.com", "invoices for a-b@x.com"),
+    ("Wendy's", "Wendys"),
+    ("customer 96461", "customer #96461"),
+])
+def test_different_prompts_have_different_keys(first, second):
+    assert ResultCache.key(first, "gpt-4", "template") != ResultCache.key(second, "gpt-4", "template")
+
+
+def test_whitespace_only_differences_share_a_key():
+    assert ResultCache.key("open  invoices\tfor Kaiser ", "gpt-4", "t") == ResultCache.key("open invoices for Kaiser", "gpt-4", "t")
+
+
+def test_every_model_input_is_part_of_the_key():
+    base = ResultCache.key("DD Canada balance", "gpt-4", "template", "hint A")
+    assert base != ResultCache.key("DD Canada balance", "gpt-4", "template", "hint B")
+    assert base != ResultCache.key("DD Canada balance", "gpt-4", "template")
+    assert base != ResultCache.key("DD Canada balance", "gpt-4o", "template", "hint A")
+    assert base != ResultCache.key("DD Canada balance", "gpt-4", "other template", "hint A")
+
+
+def test_colliding_prompts_do_not_share_an_entry():
+    cache = ResultCache(16)
+    cache.set(ResultCache.key("Kaiser in US", "gpt-4", "t"), {"subsidiary": "DD-US"}, 100, 1.0)
+
+    assert cache.get(ResultCache.key("Kaiser in us", "gpt-4", "t")) is None
+    assert cache.get(ResultCache.key("Kaiser in US", "gpt-4", "t"))["output"] == {"subsidiary": "DD-US"}
@@ -0,0 +1,62 @@
+'''
+    Telemetry is written before the call returns, not when Lambda thaws the container again.
+'''
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telemetry import RequestTelemetry, TelemetryEmitter  # noqa: E402
+
+
+def test_flush_without_queued_records_returns_at_once():
+    emitter = TelemetryEmitter(lambda kind, message, payload: None)
+    assert emitter.flush(0)
+
+
+def test_flush_waits_for_queued_records():
+    release = threading.Event()
+    written = []
+
+    def slow_sink(kind, message, payload):
+        release.wait(1)
+        written.append(kind)
+
+    emitter = TelemetryEmitter(slow_sink)
+    emitter.emit(RequestTelemetry("test"))
+    assert not emitter.flush(0.05)
+
+    release.set()
+    assert emitter.flush(1)
+    assert written == ["output"]
+
+
+def test_get_entities_only_queues_its_telemetry(monkeypatch):
+    pytest.importorskip("aws_logging_utils")
+    import main
+    flushed = []
+    monkeypatch.setattr(main.telemetry_emitter, "flush", lambda timeout=None: flushed.append(timeout))
+    monkeypatch.setenv("MODEL_NAME", "gpt-4")
+    monkeypatch.setenv("MODEL_PROVIDER", "openai")
+
+    main.get_entities("key", "customer id 8620760")
+    assert flushed == []
+
+
+def test_handler_flushes_once_when_it_fails(monkeypatch):
+    pytest.importorskip("aws_logging_utils")
+    import main
+    flushed = []
+    monkeypatch.setattr(main.telemetry_emitter, "flush", lambda timeout=None: flushed.append(timeout))
+    monkeypatch.delenv("MODEL_NAME", raising=False)
+
+    @main.flush_telemetry_after
+    def handler(event, context):
+        return [main.get_entities("key", message) for message in event["messages"]]
+
+    with pytest.raises(main.EntityResolverException):
+        handler({"messages": ["customer id 8620760", "customer 169239"]}, None)
+    assert flushed == [main.TELEMETRY_FLUSH_SECONDS]
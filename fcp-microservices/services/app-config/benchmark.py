@@ -0,0 +1,106 @@
+"""
+Local benchmark for the app-config lookups against a local Postgres.
+Secrets Manager is not called, credentials come from the DSN.
+
+Usage:
+    BENCH_PG_DSN="host=localhost port=5432 dbname=postgres user=postgres password=postgres" \\
+        python benchmark.py [iterations]
+
+The benchmark creates (and drops) its own schema with stand-in versions of the
+get_app_configuration / get_app_message functions. Run it with a few thousand
+iterations to compare the query paths at high request rates.
+"""
+import os
+import sys
+from time import perf_counter
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+SCHEMA = "app_config_bench"
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql")
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+CREATE TABLE {SCHEMA}.app_configuration (config_code text, lang text, config_value text, PRIMARY KEY (config_code, lang));
+CREATE TABLE {SCHEMA}.app_message (message_code text, lang text, message_text text, PRIMARY KEY (message_code, lang));
+INSERT INTO {SCHEMA}.app_configuration SELECT 'CONFIG_' || i, 'en-US', 'value ' || i FROM generate_series(1, 200) i;
+INSERT INTO {SCHEMA}.app_message SELECT 'MSG_' || i, 'en-US', 'message ' || i FROM generate_series(1, 200) i;
+CREATE FUNCTION {SCHEMA}.get_app_configuration(p_code text, p_lang text) RETURNS TABLE (config_value text)
+    LANGUAGE sql STABLE AS $$ SELECT config_value FROM {SCHEMA}.app_configuration WHERE config_code = p_code AND lang = p_lang $$;
+CREATE FUNCTION {SCHEMA}.get_app_message(p_code text, p_lang text) RETURNS TABLE (message_text text)
+    LANGUAGE sql STABLE AS $$ SELECT message_text FROM {SCHEMA}.app_message WHERE message_code = p_code AND lang = p_lang $$;
+"""
+
+
+def timed(label, fn, iterations):
+    start = perf_counter()
+    for i in range(iterations):
+        fn(i)
+    elapsed = perf_counter() - start
+    print(f"{label:<45} {elapsed * 1000 / iterations:8.3f} ms/lookup")
+    return elapsed
+
+
+def main(iterations):
+    dsn = os.environ["BENCH_PG_DSN"]
+    params = parse_dsn(dsn)
+    os.environ["postgres_schema"] = SCHEMA
+
+    with psycopg2.connect(dsn) as setup:
+        cursor = setup.cursor()
+        cursor.execute(SETUP_SQL)
+        cursor.execute(f"SET search_path TO {SCHEMA}")
+        for sql_file in sorted(os.listdir(SQL_DIR)):
+            with open(os.path.join(SQL_DIR, sql_file)) as f:
+                cursor.execute(f.read())
+
+    import lambda_function
+    credential = {
+        "username": params.get("user"), "password": params.get("password"),
+        "host": params.get("host"), "db": params.get("dbname"), "port": params.get("port", "5432"),
+    }
+    lambda_function.getCredentials = lambda force_refresh=False: credential
+
+    def connect_per_request(i):
+        # What every lookup used to do: new connection, callproc, fetchall
+        connection = psycopg2.connect(user=credential["username"], password=credential["password"],
+                                      host=credential["host"], database=credential["db"], port=credential["port"])
+        cursor = connection.cursor()
+        cursor.callproc(SCHEMA + ".get_app_configuration", (f"CONFIG_{i % 200 + 1}", "en-US"))
+        cursor.fetchall()
+        connection.close()
+
+    def callproc_shared(i):
+        # callproc on the shared connection, parsed and planned on every call
+        with lambda_function.getConnection().cursor() as cursor:
+            cursor.callproc(SCHEMA + ".get_app_configuration", (f"CONFIG_{i % 200 + 1}", "en-US"))
+            cursor.fetchall()
+
+    try:
+        print("Connection reuse")
+        before = timed("new connection per lookup", connect_per_request, iterations)
+        after = timed("callproc (shared connection)", callproc_shared, iterations)
+        print(f"{'speedup':<45} {before / after:8.2f}x")
+
+        print("Prepared statements")
+        prepared = timed("prepared, fetchall", lambda i: lambda_function.callProcedure("get_app_configuration", (f"CONFIG_{i % 200 + 1}", "en-US")), iterations)
+        prepared_one = timed("prepared, fetchone", lambda i: lambda_function.callProcedure("get_app_configuration", (f"CONFIG_{i % 200 + 1}", "en-US"), fetch_one=True), iterations)
+        print(f"{'speedup over callproc':<45} {after / min(prepared, prepared_one):8.2f}x")
+        after = min(prepared, prepared_one)
+
+        print("Preloaded cache")
+        start = perf_counter()
+        lambda_function.loadCache()
+        print(f"{'bulk load (400 rows)':<45} {(perf_counter() - start) * 1000:8.3f} ms")
+        cached = timed("get_configuration (preloaded)", lambda i: lambda_function.get_configuration(f"CONFIG_{i % 200 + 1}"), iterations)
+        print(f"{'speedup over shared connection':<45} {after / cached:8.2f}x")
+    finally:
+        lambda_function.resetConnection()
+        with psycopg2.connect(dsn) as teardown:
+            teardown.cursor().execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
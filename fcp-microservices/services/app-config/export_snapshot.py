@@ -0,0 +1,38 @@
+"""
+Exports all configurations and en-US messages into a compact snapshot file
+that is shipped next to lambda_function.py, so a cold Lambda can answer
+without waiting on Secrets Manager and Postgres.
+
+Run it while building the image (or from the scheduled job that rebuilds it)
+with the same environment variables as the Lambda:
+
+    python export_snapshot.py [output_path]
+"""
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import lambda_function
+
+
+def export_snapshot(path=lambda_function.SNAPSHOT_PATH):
+    lang = lambda_function.CACHE_LANG
+    snapshot = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "lang": lang,
+        "configuration": dict(lambda_function.callProcedure('get_all_app_configurations', (lang,))),
+        "message": dict(lambda_function.callProcedure('get_all_app_messages', (lang,))),
+    }
+
+    # Write next to the target and rename, so a half written file is never shipped
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"), sort_keys=True, default=str)
+    os.replace(temp_path, path)
+    return snapshot
+
+
+if __name__ == "__main__":
+    snapshot = export_snapshot(*sys.argv[1:2])
+    print(f"Exported {len(snapshot['configuration'])} configurations and {len(snapshot['message'])} messages")
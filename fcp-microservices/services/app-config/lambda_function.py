@@ -1,8 +1,14 @@
 import psycopg2
+import psycopg2.errors
+from psycopg2 import sql
 import json
 import os
+import hashlib
 import boto3
+from botocore.config import Config
 import traceback
+import threading
+from time import monotonic
 
 """
 Lambda entry point for messages and configuration function,
@@ -17,6 +23,18 @@ Environment Vars
     postgres_port 
     region 
     secret_arn 
+    credentials_refresh_seconds (optional, default 3600)
+    connection_check_seconds (optional, default 30)
+    connect_timeout_seconds (optional, default 5)
+    statement_timeout_ms (optional, default 10000)
+    connection_lock_timeout_seconds (optional, default 5)
+    cache_ttl_seconds (optional, default 300)
+    cache_max_stale_seconds (optional, default 30)
+    batch_max_codes (optional, default 200)
+    notify_channel (optional, default app_config_changed)
+    snapshot_path (optional, default config_snapshot.json next to this file)
+    cache_control_default (optional, default "public, max-age=300")
+    cache_control_rules (optional, JSON {"configurations": {code: header}, "messages": {code: header}})
 Layers Used
    Layer for psycopg2 on python 3.8    
 """
@@ -24,6 +42,7 @@ def lambda_handler(event, context):
     http_method = event['httpMethod']
     resource = event['resource']
     message=""   
+    cache_control = None
     try:
         #method call for messages hence get the relevent message
         if resource == '/configurations/message/{code}' and http_method == 'GET':
@@ -33,10 +52,13 @@ def lambda_handler(event, context):
             #handle message if message does not exist
             if(message_object is None): 
                 message='{"status":"failure","message": "message does not exist"}'
+                cache_control = NOT_FOUND_CACHE_CONTROL
             elif(len(message_object)>0):
                 message='{"status":"success","message":"'+message_object[0][0]+'"}'
+                cache_control = cacheControlFor('messages', message_code)
             else: 
                 message='{"status":"failure","message": "message does not exist"}'
+                cache_control = NOT_FOUND_CACHE_CONTROL
 
         #handle configuration based on the endpoint        
         elif resource == '/configurations/{code}' and http_method == 'GET':
@@ -45,23 +67,53 @@ def lambda_handler(event, context):
             if(len(config_object)>0):
                 if(config_object[0][0] is None): 
                    message='{"status":"failure","message": "configuration does not exist"}'
+                   cache_control = NOT_FOUND_CACHE_CONTROL
                 else:
                    message='{"status":"success","message":"'+config_object[0][0].__str__()+'"}'
+                   cache_control = cacheControlFor('configurations', config_code)
             else: 
                 message='{"status":"failure","message": "configuration does not exist"}'
+                cache_control = NOT_FOUND_CACHE_CONTROL
+
+        #resolve many configuration and message codes in one call
+        elif resource == '/configurations/batch' and http_method == 'POST':
+            request = json.loads(event.get('body') or '{}')
+            config_codes = request.get('configurations') or []
+            message_codes = request.get('messages') or []
+            if not isinstance(config_codes, list) or not isinstance(message_codes, list):
+                message='{"status":"failure","message": "configurations and messages must be lists of codes"}'
+            elif len(config_codes) + len(message_codes) > BATCH_MAX_CODES:
+                message='{"status":"failure","message": "too many codes, the limit is '+str(BATCH_MAX_CODES)+'"}'
+            else:
+                message=json.dumps(get_batch([str(code) for code in config_codes], [str(code) for code in message_codes]))
         else : 
            message='{"status":"failure","message": "unknown configuration"}'
             
         #return the result
         print(json.dumps(message))
+        body = json.dumps(message)
+        headers = { 
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*" 
+        }
+        #single code lookups can be cached by browsers and API Gateway
+        if cache_control is not None:
+            etag = makeEtag(body)
+            headers["Cache-Control"] = cache_control
+            headers["ETag"] = etag
+            headers["Access-Control-Expose-Headers"] = "ETag"
+            if etagMatches(requestHeader(event, 'If-None-Match'), etag):
+                return {
+                    "isBase64Encoded": "false",
+                    "statusCode": 304,
+                    "headers": headers,
+                    "body": ""
+                }
         return {
             "isBase64Encoded": "false",
             "statusCode": 200,
-            "headers": { 
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*" 
-            },
-            "body": json.dumps(message)
+            "headers": headers,
+            "body": body
         }        
     except Exception as e:
           #traceback.print_exc() #only for testing 
@@ -76,10 +128,31 @@ def lambda_handler(event, context):
             "body": json.dumps(message)
             }  
             
+# Module level state survives across warm invocations of the same container
+CREDENTIALS_REFRESH_SECONDS = float(os.getenv('credentials_refresh_seconds', '3600'))
+CONNECTION_CHECK_SECONDS = float(os.getenv('connection_check_seconds', '30'))
+# A connection thawed after a freeze may point at a dead socket, none of its calls may hang
+CONNECT_TIMEOUT_SECONDS = int(os.getenv('connect_timeout_seconds', '5'))
+STATEMENT_TIMEOUT_MS = int(os.getenv('statement_timeout_ms', '10000'))
+CONNECTION_LOCK_TIMEOUT_SECONDS = float(os.getenv('connection_lock_timeout_seconds', '5'))
+
+_credential = None
+_credential_loaded_at = 0.0
+_connection = None
+_connection_used_at = 0.0
+_connection_lock = threading.RLock()
+_connection_opened = False
+
 """
-Method returns the credentials for postgres
+Method returns the credentials for postgres. The secret is cached and only
+fetched again from Secrets Manager after the refresh interval, or when forced
+(e.g. the password was rotated and a connect failed)
 """
-def getCredentials():
+def getCredentials(force_refresh=False):
+    global _credential, _credential_loaded_at
+    if (_credential is not None and not force_refresh
+            and monotonic() - _credential_loaded_at < CREDENTIALS_REFRESH_SECONDS):
+        return _credential
     
     credential = {}
     #GET THE SECRETS
@@ -88,7 +161,8 @@ def getCredentials():
     
     client = boto3.client(
       service_name='secretsmanager',
-      region_name=region_name
+      region_name=region_name,
+      config=Config(connect_timeout=CONNECT_TIMEOUT_SECONDS, read_timeout=CONNECT_TIMEOUT_SECONDS)
     )
     
     get_secret_value_response = client.get_secret_value(
@@ -102,48 +176,474 @@ def getCredentials():
     credential['host'] = os.getenv('postgres_host')
     credential['db'] = os.getenv('postgres_database')
     credential['port'] = os.getenv('postgres_port')
+
+    _credential = credential
+    _credential_loaded_at = monotonic()
     return credential
 
 """
-This method gets the relevent message based on the 
-message code provided
+Opens a new postgres connection. Autocommit keeps the read-only lookups
+from leaving a transaction open on the idle connection between invocations,
+which is also what lets notifications through. Connect, statement and TCP
+keepalive timeouts make a dead socket fail instead of hanging
 """
-def get_message(message_code):
-    credential = getCredentials()
-    schema = os.getenv('postgres_schema')
-    #connect to postgres
+NOTIFY_CHANNEL = os.getenv('notify_channel', 'app_config_changed')
+
+def connect(credential, listen=True):
     connection = psycopg2.connect(user=credential['username'], 
                                   password=credential['password'], 
                                   host=credential['host'], 
                                   database=credential['db'],
-                                  port = credential['port'])    
-    cursor = connection.cursor()
-    #call the function
-    lang = "en-US"
-    cursor.callproc(schema+'.get_app_message',(message_code,lang))  # No parameters in this example
-    
-    # Fetch the results
-    results = cursor.fetchall()
-    return results
+                                  port = credential['port'],
+                                  connect_timeout=CONNECT_TIMEOUT_SECONDS,
+                                  keepalives=1,
+                                  keepalives_idle=30,
+                                  keepalives_interval=10,
+                                  keepalives_count=3,
+                                  options=f'-c statement_timeout={STATEMENT_TIMEOUT_MS}')
+    connection.autocommit = True
+    if listen:
+        # Row changes are published on this channel, see applyNotifications
+        with connection.cursor() as cursor:
+            cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(NOTIFY_CHANNEL)))
+    return connection
+
+"""
+Returns the connection shared across warm invocations. If it has been idle
+longer than the check interval it is health checked with SELECT 1 first, and a
+closed or stale connection is replaced
+"""
+def getConnection():
+    with _connection_lock:
+        return _getConnection()
+
+def _getConnection():
+    global _connection, _connection_used_at, _connection_opened
+    if _connection is not None and not _connection.closed:
+        if monotonic() - _connection_used_at < CONNECTION_CHECK_SECONDS:
+            _connection_used_at = monotonic()
+            return _connection
+        try:
+            with _connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            _connection_used_at = monotonic()
+            return _connection
+        except psycopg2.Error:
+            resetConnection()
+
+    if _connection_opened:
+        # Notifications sent while we were disconnected are lost
+        markCacheStale()
+    # Prepared statements belong to the connection they were prepared on
+    _prepared.clear()
+    try:
+        _connection = connect(getCredentials())
+    except psycopg2.OperationalError:
+        # Credentials may have been rotated since they were cached
+        _connection = connect(getCredentials(force_refresh=True))
+    _connection_used_at = monotonic()
+    _connection_opened = True
+    return _connection
+
+def resetConnection():
+    global _connection
+    with _connection_lock:
+        if _connection is not None:
+            try:
+                _connection.close()
+            except psycopg2.Error:
+                pass
+        _connection = None
+
+"""
+Lookup procedures are called through prepared statements. Each one is
+PREPAREd the first time it is used on a connection and EXECUTEd with bound
+parameters afterwards, so Postgres parses and plans the call once per
+connection instead of on every lookup. Procedures not listed here go
+through callproc
+"""
+PREPARED_STATEMENTS = {
+    'get_app_configuration': ('text', 'text'),
+    'get_app_message': ('text', 'text'),
+    'get_all_app_configurations': ('text',),
+    'get_all_app_messages': ('text',),
+    'get_app_lookup_batch': ('text[]', 'text[]', 'text'),
+    'app_configuration_value': ('text', 'text'),
+    'app_message_value': ('text', 'text'),
+}
+
+# Statements prepared on the current connection, cleared when it is replaced
+_prepared = set()
+
+def prepareStatement(cursor, procedure):
+    argument_types = PREPARED_STATEMENTS[procedure]
+    cursor.execute(sql.SQL('PREPARE {} ({}) AS SELECT * FROM {}.{}({})').format(
+        sql.Identifier(procedure),
+        sql.SQL(', ').join(sql.SQL(argument_type) for argument_type in argument_types),
+        sql.Identifier(os.getenv('postgres_schema')),
+        sql.Identifier(procedure),
+        sql.SQL(', ').join(sql.SQL('$' + str(i + 1)) for i in range(len(argument_types)))))
+    _prepared.add(procedure)
+
+def executeProcedure(cursor, procedure, params):
+    if procedure not in PREPARED_STATEMENTS:
+        cursor.callproc(os.getenv('postgres_schema')+'.'+procedure, params)
+        return
+    if procedure not in _prepared:
+        prepareStatement(cursor, procedure)
+    try:
+        cursor.execute(sql.SQL('EXECUTE {} ({})').format(
+            sql.Identifier(procedure),
+            sql.SQL(', ').join(sql.Placeholder() * len(params))), params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # Deallocated behind our back (DISCARD ALL from a pooler), prepare again
+        prepareStatement(cursor, procedure)
+        cursor.execute(sql.SQL('EXECUTE {} ({})').format(
+            sql.Identifier(procedure),
+            sql.SQL(', ').join(sql.Placeholder() * len(params))), params)
+
+"""
+Calls a stored procedure on the shared connection and fetches all rows, or
+only the first row (None when there is none) with fetch_one. If the connection
+dropped in the meantime it reconnects and tries once more. The connection lock
+is held for the whole call, so two threads never run queries on the
+connection at the same time. Only the request path uses it: the background
+cache refresh has a connection of its own
+"""
+def callProcedure(procedure, params, fetch_one=False):
+    for attempt in range(2):
+        with _connection_lock:
+            connection = getConnection()
+            try:
+                with connection.cursor() as cursor:
+                    executeProcedure(cursor, procedure, params)
+                    return cursor.fetchone() if fetch_one else cursor.fetchall()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                resetConnection()
+                if attempt == 1:
+                    raise
+
+"""
+In-memory copy of all configurations and en-US messages. It is bulk loaded on
+the first lookup of a cold container and served from memory afterwards. Once
+older than the TTL it is reloaded in a background thread while lookups keep
+using the current copy. Lambda freezes the container between invocations, and
+a background thread with it, so that thread uses a connection of its own and
+never holds the shared one across a freeze. A copy more than
+cache_max_stale_seconds past the TTL is reloaded on the request path instead.
+A load on the request path that fails is retried after the TTL, lookups go
+code by code through the stored procedures meanwhile. Codes missing from the copy
+fall back to the stored procedures and are added to it. The bulk procedures
+are in sql/app_config_cache.sql
+
+Changed rows are also picked up between reloads: triggers publish each change
+on NOTIFY_CHANNEL (sql/app_config_notify.sql) and every invocation applies the
+pending notifications first, so the TTL can be long. A full load that was
+reading while a notification was applied keeps the notified value, which is
+the newer one (see loadCache)
+"""
+CACHE_TTL_SECONDS = float(os.getenv('cache_ttl_seconds', '300'))
+CACHE_MAX_STALE_SECONDS = float(os.getenv('cache_max_stale_seconds', '30'))
+CACHE_LANG = "en-US"
+
+_cache = {'configuration': {}, 'message': {}}
+_cache_loaded_at = None  # monotonic time the load in _cache started reading
+_cache_lock = threading.Lock()
+_cache_refreshing = False
+_cache_failed_at = None  # monotonic time the last load on the request path failed
+# Guards swapping _cache and applying notified changes to it
+_cache_swap_lock = threading.Lock()
+# kind -> code -> monotonic time a notified change to it was read
+_notified_at = {'configuration': {}, 'message': {}}
+
+def loadCache(call=None):
+    # call(procedure, params) runs the bulk procedures, callProcedure (the shared connection) by default
+    global _cache, _cache_loaded_at
+    call = call or callProcedure
+    started = monotonic()
+    configurations = dict(call('get_all_app_configurations', (CACHE_LANG,)))
+    messages = dict(call('get_all_app_messages', (CACHE_LANG,)))
+    loaded = {'configuration': configurations, 'message': messages}
+
+    with _cache_swap_lock:
+        if _cache_loaded_at is not None and started < _cache_loaded_at:
+            # A load that started later has already been swapped in
+            return
+        for kind, changes in _notified_at.items():
+            for code, read_at in changes.items():
+                # Changes read after this load started are newer than what it read
+                if read_at >= started:
+                    if code in _cache[kind]:
+                        loaded[kind][code] = _cache[kind][code]
+                    else:
+                        loaded[kind].pop(code, None)
+            _notified_at[kind] = {code: read_at for code, read_at in changes.items() if read_at >= started}
+        # Swap in whole dictionaries so readers never see a half loaded cache
+        _cache = loaded
+        _cache_loaded_at = started
+
+"""
+Loads the snapshot exported at build time (export_snapshot.py) so a cold
+container can answer before Secrets Manager and Postgres respond. The snapshot
+is marked stale, so the first invocation reconciles it with the database in the
+background while lookups are served from it
+"""
+SNAPSHOT_PATH = os.getenv('snapshot_path', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config_snapshot.json'))
+
+def loadSnapshot(path=SNAPSHOT_PATH):
+    global _cache, _cache_loaded_at
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return False
+    if snapshot.get('lang') != CACHE_LANG:
+        return False
+
+    _cache = {'configuration': snapshot.get('configuration', {}), 'message': snapshot.get('message', {})}
+    # Expired right away but within the stale allowance, so the first invocation
+    # answers from it while the background refresh runs
+    _cache_loaded_at = monotonic() - CACHE_TTL_SECONDS
+    return True
+
+loadSnapshot()
+
+def refreshCacheInBackground():
+    global _cache_refreshing
+    connection = None
+    try:
+        # Own connection: Lambda may freeze this thread mid query, the shared
+        # connection and its lock stay free for the next invocation
+        connection = connect(getCredentials(), listen=False)
+
+        def call(procedure, params):
+            with connection.cursor() as cursor:
+                cursor.callproc(os.getenv('postgres_schema')+'.'+procedure, params)
+                return cursor.fetchall()
+        loadCache(call)
+    except Exception as e:
+        print(f"Background cache refresh failed: {e}")
+    finally:
+        if connection is not None:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+        _cache_refreshing = False
+
+def loadCacheOnRequest():
+    # Full load before answering, backs off for a TTL after a failure
+    global _cache_failed_at
+    if _cache_failed_at is not None and monotonic() - _cache_failed_at < CACHE_TTL_SECONDS:
+        return
+    try:
+        loadCache()
+        _cache_failed_at = None
+    except Exception as e:
+        _cache_failed_at = monotonic()
+        # Lookups still work, code by code, through the stored procedures
+        print(f"Cache load failed, retrying in {CACHE_TTL_SECONDS:.0f}s: {e}")
+
+def markCacheStale():
+    # Next invocation reloads everything before answering
+    global _cache_loaded_at
+    if _cache_loaded_at is not None:
+        _cache_loaded_at = float('-inf')
+
+"""
+Applies the change notifications received since the last invocation. Changed
+codes are re-read in one round trip; codes that no longer exist are dropped.
+A truncate or an unreadable notification marks the whole cache stale
+"""
+def applyNotifications():
+    changed = {'configuration': set(), 'message': set()}
+    reload_all = False
+    if not _connection_lock.acquire(timeout=CONNECTION_LOCK_TIMEOUT_SECONDS):
+        print("Connection busy, notifications are applied on a later invocation")
+        return
+    try:
+        if _connection is None:
+            # Nothing can be pending without a connection (cold start from the snapshot)
+            return
+        try:
+            connection = getConnection()
+            connection.poll()
+        except psycopg2.Error:
+            resetConnection()
+            markCacheStale()
+            return
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            try:
+                change = json.loads(notify.payload)
+            except ValueError:
+                reload_all = True
+                continue
+            if change.get('kind') in changed:
+                if change.get('lang', CACHE_LANG) == CACHE_LANG:
+                    changed[change['kind']].add(change['code'])
+            else:
+                reload_all = True
+    finally:
+        _connection_lock.release()
+
+    if reload_all:
+        markCacheStale()
+        return
+    if not (changed['configuration'] or changed['message']):
+        return
+
+    read_at = monotonic()
+    rows = callProcedure('get_app_lookup_batch', (sorted(changed['configuration']), sorted(changed['message']), CACHE_LANG))
+    applyChangedRows(changed, rows, read_at)
+
+def applyChangedRows(changed, rows, read_at):
+    # Replace the changed codes with the rows read for them at read_at, codes without a row are dropped
+    with _cache_swap_lock:
+        for kind, codes in changed.items():
+            for code in codes:
+                _cache[kind].pop(code, None)
+                _notified_at[kind][code] = read_at
+        for kind, code, value in rows:
+            if value is not None:
+                _cache[kind][code] = value
+
+def ensureCache():
+    global _cache_refreshing
+    if _cache_loaded_at is not None:
+        try:
+            applyNotifications()
+        except Exception as e:
+            print(f"Applying cache notifications failed: {e}")
+            markCacheStale()
+
+    if _cache_loaded_at is None:
+        with _cache_lock:
+            if _cache_loaded_at is None:
+                loadCacheOnRequest()
+        return
+
+    age = monotonic() - _cache_loaded_at
+    if age > CACHE_TTL_SECONDS + CACHE_MAX_STALE_SECONDS:
+        # Too old to serve: a background refresh may be frozen with the container, reload here
+        with _cache_lock:
+            if monotonic() - _cache_loaded_at > CACHE_TTL_SECONDS + CACHE_MAX_STALE_SECONDS:
+                loadCacheOnRequest()
+        return
+
+    if age > CACHE_TTL_SECONDS:
+        with _cache_lock:
+            if _cache_refreshing:
+                return
+            _cache_refreshing = True
+        threading.Thread(target=refreshCacheInBackground, daemon=True).start()
+
+"""
+Returns the lookup result in the same shape as the stored procedure (a list
+of rows), from the cache when possible. A miss reads the value as text through
+app_configuration_value / app_message_value, like the bulk, batch and notify
+paths, so a cached value reads the same whichever path filled it. Until the
+sql/ functions are deployed it falls back to the procedure and caches nothing
+"""
+VALUE_PROCEDURES = {'configuration': 'app_configuration_value', 'message': 'app_message_value'}
+
+def cachedLookup(kind, procedure, code):
+    ensureCache()
+    entries = _cache[kind]
+    if code in entries:
+        return [(entries[code],)]
+
+    try:
+        row = callProcedure(VALUE_PROCEDURES[kind], (code, CACHE_LANG), fetch_one=True)
+    except psycopg2.errors.UndefinedFunction:
+        row = callProcedure(procedure, (code, CACHE_LANG), fetch_one=True)
+        return [] if row is None else [row]
+    if row is None or row[0] is None:
+        return []
+    entries[code] = row[0]
+    return [row]
+
+"""
+This method gets the relevent message based on the 
+message code provided
+"""
+def get_message(message_code):
+    return cachedLookup('message', 'get_app_message', message_code)
 """
 This method gets the relevent configuration based on the 
 config code provided
 """
 def get_configuration(config_code):
-    credential = getCredentials()
-    schema = os.getenv('postgres_schema')
-    connection = psycopg2.connect(user=credential['username'], 
-                                  password=credential['password'], 
-                                  host=credential['host'], 
-                                  database=credential['db'],
-                                  port = credential['port'])    
-    cursor = connection.cursor()
-    
-    # Call the stored procedure
-    lang = "en-US"
-    cursor.callproc(schema+'.get_app_configuration',(config_code,lang))  # No parameters in this example
-    
-    # Fetch the results
-    results = cursor.fetchall()
-    return results
-                                  
\ No newline at end of file
+    return cachedLookup('configuration', 'get_app_configuration', config_code)
+"""
+Resolves a list of configuration codes and message codes. Cached codes are
+answered from memory and all the others in a single round trip through
+get_app_lookup_batch. Every code gets its own status in the result:
+    {"status": "success",
+     "configurations": {code: {"status": "success", "value": ...}, ...},
+     "messages": {code: {"status": "failure", "message": "message does not exist"}, ...}}
+"""
+BATCH_MAX_CODES = int(os.getenv('batch_max_codes', '200'))
+
+def get_batch(config_codes, message_codes):
+    ensureCache()
+    requested = {'configuration': config_codes, 'message': message_codes}
+    found = {kind: {} for kind in requested}
+    missing = {kind: [] for kind in requested}
+    for kind, codes in requested.items():
+        entries = _cache[kind]
+        for code in codes:
+            if code in entries:
+                found[kind][code] = entries[code]
+            else:
+                missing[kind].append(code)
+
+    if missing['configuration'] or missing['message']:
+        rows = callProcedure('get_app_lookup_batch', (missing['configuration'], missing['message'], CACHE_LANG))
+        for kind, code, value in rows:
+            if value is not None:
+                found[kind][code] = value
+                _cache[kind][code] = value
+
+    def statuses(kind):
+        return {
+            code: {"status": "success", "value": str(found[kind][code])} if code in found[kind]
+            else {"status": "failure", "message": kind + " does not exist"}
+            for code in requested[kind]
+        }
+
+    return {"status": "success", "configurations": statuses('configuration'), "messages": statuses('message')}
+"""
+HTTP caching for the single code lookups. Cache-Control comes from
+cache_control_rules for the code, falling back to cache_control_default.
+The ETag is derived from the response body, so If-None-Match requests for an
+unchanged value get a 304 without a body
+"""
+DEFAULT_CACHE_CONTROL = os.getenv('cache_control_default', 'public, max-age=300')
+NOT_FOUND_CACHE_CONTROL = 'no-cache'
+CACHE_CONTROL_RULES = json.loads(os.getenv('cache_control_rules') or '{}')
+
+def cacheControlFor(kind, code):
+    return CACHE_CONTROL_RULES.get(kind, {}).get(code, DEFAULT_CACHE_CONTROL)
+
+def makeEtag(body):
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+def requestHeader(event, name):
+    # Header names are case insensitive, API Gateway passes them as sent
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def etagMatches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return etag in [candidate[2:] if candidate.startswith('W/') else candidate for candidate in candidates]
@@ -0,0 +1,46 @@
+-- Batch lookup used by the /configurations/batch resource of the app-config
+-- Lambda: resolves many configuration and message codes in one call.
+-- Run with search_path set to the app-config schema (postgres_schema).
+--
+-- Values come from the existing get_app_configuration / get_app_message
+-- procedures, read the way the Lambda reads them (first column of the first
+-- row) and converted to text, so every cache path returns the same value as a
+-- single lookup. app_config_cache.sql uses the two value functions as well.
+
+CREATE OR REPLACE FUNCTION app_configuration_value(p_code text, p_lang text)
+RETURNS text
+LANGUAGE plpgsql STABLE
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    result text;
+BEGIN
+    SELECT * INTO result FROM get_app_configuration(p_code, p_lang);
+    RETURN result;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION app_message_value(p_code text, p_lang text)
+RETURNS text
+LANGUAGE plpgsql STABLE
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    result text;
+BEGIN
+    SELECT * INTO result FROM get_app_message(p_code, p_lang);
+    RETURN result;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION get_app_lookup_batch(p_config_codes text[], p_message_codes text[], p_lang text)
+RETURNS TABLE (kind text, code text, value text)
+LANGUAGE sql STABLE
+SET search_path FROM CURRENT
+AS $$
+    SELECT 'configuration', c.code, app_configuration_value(c.code, p_lang)
+    FROM unnest(p_config_codes) c(code)
+    UNION ALL
+    SELECT 'message', m.code, app_message_value(m.code, p_lang)
+    FROM unnest(p_message_codes) m(code)
+$$;
@@ -0,0 +1,34 @@
+-- Bulk lookup functions used by the app-config Lambda to preload its cache.
+-- Run with search_path set to the app-config schema (postgres_schema), after
+-- app_config_batch.sql.
+--
+-- Only the list of codes is read from the tables behind get_app_configuration /
+-- get_app_message (the same tables app_config_notify.sql watches). Each value
+-- comes from the procedures through app_configuration_value / app_message_value,
+-- as text, exactly like get_app_lookup_batch and the single lookups.
+
+CREATE OR REPLACE FUNCTION get_all_app_configurations(p_lang text)
+RETURNS TABLE (config_code text, config_value text)
+LANGUAGE sql STABLE
+SET search_path FROM CURRENT
+AS $$
+    SELECT code_values.code, code_values.value
+    FROM (
+        SELECT codes.code, app_configuration_value(codes.code, p_lang) AS value
+        FROM (SELECT DISTINCT c.config_code AS code FROM app_configuration c WHERE c.lang = p_lang) codes
+    ) code_values
+    WHERE code_values.value IS NOT NULL
+$$;
+
+CREATE OR REPLACE FUNCTION get_all_app_messages(p_lang text)
+RETURNS TABLE (message_code text, message_text text)
+LANGUAGE sql STABLE
+SET search_path FROM CURRENT
+AS $$
+    SELECT code_values.code, code_values.value
+    FROM (
+        SELECT codes.code, app_message_value(codes.code, p_lang) AS value
+        FROM (SELECT DISTINCT m.message_code AS code FROM app_message m WHERE m.lang = p_lang) codes
+    ) code_values
+    WHERE code_values.value IS NOT NULL
+$$;
@@ -0,0 +1,58 @@
+-- Publishes configuration and message changes so the app-config Lambda can
+-- update its in-memory cache without waiting for the TTL.
+-- Payload: {"kind": "configuration" | "message", "code": ..., "lang": ...}
+-- A truncate publishes {"kind": "all"}, which makes the Lambda reload everything.
+-- Run with search_path set to the app-config schema (postgres_schema).
+-- The channel must match the Lambda's notify_channel (default app_config_changed).
+-- The triggers go on the tables get_app_configuration / get_app_message read,
+-- the same ones get_all_app_configurations / get_all_app_messages list codes from.
+
+CREATE OR REPLACE FUNCTION notify_app_config_change()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    row_data jsonb;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('app_config_changed', json_build_object('kind', 'all')::text);
+        RETURN NULL;
+    END IF;
+
+    row_data := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+    PERFORM pg_notify('app_config_changed', json_build_object(
+        'kind', TG_ARGV[0],
+        'code', row_data ->> TG_ARGV[1],
+        'lang', row_data ->> 'lang'
+    )::text);
+
+    -- A renamed code also invalidates the old one
+    IF TG_OP = 'UPDATE' AND to_jsonb(OLD) ->> TG_ARGV[1] IS DISTINCT FROM row_data ->> TG_ARGV[1] THEN
+        PERFORM pg_notify('app_config_changed', json_build_object(
+            'kind', TG_ARGV[0],
+            'code', to_jsonb(OLD) ->> TG_ARGV[1],
+            'lang', to_jsonb(OLD) ->> 'lang'
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS app_configuration_notify ON app_configuration;
+CREATE TRIGGER app_configuration_notify
+    AFTER INSERT OR UPDATE OR DELETE ON app_configuration
+    FOR EACH ROW EXECUTE FUNCTION notify_app_config_change('configuration', 'config_code');
+
+DROP TRIGGER IF EXISTS app_configuration_notify_truncate ON app_configuration;
+CREATE TRIGGER app_configuration_notify_truncate
+    AFTER TRUNCATE ON app_configuration
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_app_config_change('configuration', 'config_code');
+
+DROP TRIGGER IF EXISTS app_message_notify ON app_message;
+CREATE TRIGGER app_message_notify
+    AFTER INSERT OR UPDATE OR DELETE ON app_message
+    FOR EACH ROW EXECUTE FUNCTION notify_app_config_change('message', 'message_code');
+
+DROP TRIGGER IF EXISTS app_message_notify_truncate ON app_message;
+CREATE TRIGGER app_message_notify_truncate
+    AFTER TRUNCATE ON app_message
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_app_config_change('message', 'message_code');
@@ -0,0 +1,79 @@
+"""
+/configurations/batch: input validation, the code limit and per-code statuses.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_function  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def cached(monkeypatch):
+    monkeypatch.setattr(lambda_function, "_cache", {'configuration': {'TIMEOUT': '30'}, 'message': {'HELLO': 'Hello'}})
+    monkeypatch.setattr(lambda_function, "ensureCache", lambda: None)
+
+
+def batch(body, raw=False):
+    event = {'httpMethod': 'POST', 'resource': '/configurations/batch', 'body': body if raw else json.dumps(body)}
+    response = lambda_function.lambda_handler(event, None)
+    return response, json.loads(json.loads(response['body']))
+
+
+def test_cached_and_missing_codes_in_one_round_trip(monkeypatch):
+    calls = []
+
+    def call_procedure(procedure, params, fetch_one=False):
+        calls.append((procedure, params))
+        return [('configuration', 'RETRIES', '3'), ('configuration', 'GONE', None)]
+    monkeypatch.setattr(lambda_function, "callProcedure", call_procedure)
+
+    _, result = batch({'configurations': ['TIMEOUT', 'RETRIES', 'GONE'], 'messages': ['HELLO']})
+
+    assert calls == [('get_app_lookup_batch', (['RETRIES', 'GONE'], [], 'en-US'))]
+    assert result == {
+        'status': 'success',
+        'configurations': {
+            'TIMEOUT': {'status': 'success', 'value': '30'},
+            'RETRIES': {'status': 'success', 'value': '3'},
+            'GONE': {'status': 'failure', 'message': 'configuration does not exist'},
+        },
+        'messages': {'HELLO': {'status': 'success', 'value': 'Hello'}},
+    }
+    assert lambda_function._cache['configuration']['RETRIES'] == '3'
+
+
+def test_all_cached_needs_no_query(monkeypatch):
+    monkeypatch.setattr(lambda_function, "callProcedure", lambda *args, **kwargs: pytest.fail("queried the database"))
+    _, result = batch({'configurations': ['TIMEOUT'], 'messages': ['HELLO']})
+    assert result['configurations']['TIMEOUT']['value'] == '30'
+
+
+@pytest.mark.parametrize("body", [
+    {'configurations': 'TIMEOUT'},
+    {'messages': {'HELLO': True}},
+])
+def test_codes_must_be_lists(body):
+    response, result = batch(body)
+    assert response['statusCode'] == 200
+    assert result == {'status': 'failure', 'message': 'configurations and messages must be lists of codes'}
+
+
+def test_code_limit(monkeypatch):
+    monkeypatch.setattr(lambda_function, "BATCH_MAX_CODES", 3)
+    _, result = batch({'configurations': ['A', 'B'], 'messages': ['C', 'D']})
+    assert result == {'status': 'failure', 'message': 'too many codes, the limit is 3'}
+
+
+def test_empty_body_is_an_empty_batch():
+    _, result = batch(None, raw=True)
+    assert result == {'status': 'success', 'configurations': {}, 'messages': {}}
+
+
+def test_invalid_json_is_a_failure():
+    _, result = batch('{not json', raw=True)
+    assert result['status'] == 'failure'
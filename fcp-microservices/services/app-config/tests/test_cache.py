@@ -0,0 +1,220 @@
+"""
+Cache consistency checks for lambda_function, with the stored procedures
+replaced by in-memory stand-ins.
+"""
+import os
+import sys
+import threading
+from time import monotonic
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_function  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(lambda_function, "_cache", {'configuration': {}, 'message': {}})
+    monkeypatch.setattr(lambda_function, "_cache_loaded_at", None)
+    monkeypatch.setattr(lambda_function, "_cache_refreshing", False)
+    monkeypatch.setattr(lambda_function, "_cache_failed_at", None)
+    monkeypatch.setattr(lambda_function, "_notified_at", {'configuration': {}, 'message': {}})
+    monkeypatch.setattr(lambda_function, "applyNotifications", lambda: None)
+
+
+def test_load_keeps_changes_notified_while_it_was_reading(monkeypatch):
+    lambda_function._cache['configuration']['A'] = 'v1'
+
+    def call_procedure(procedure, params, fetch_one=False):
+        if procedure == 'get_all_app_configurations':
+            # The table read saw v1, then a notification for v2 is applied before the swap
+            lambda_function.applyChangedRows({'configuration': {'A'}, 'message': set()},
+                                             [('configuration', 'A', 'v2')], monotonic())
+            return [('A', 'v1'), ('B', 'b')]
+        return []
+    monkeypatch.setattr(lambda_function, "callProcedure", call_procedure)
+
+    lambda_function.loadCache()
+
+    assert lambda_function._cache['configuration'] == {'A': 'v2', 'B': 'b'}
+
+
+def test_load_drops_codes_deleted_while_it_was_reading(monkeypatch):
+    def call_procedure(procedure, params, fetch_one=False):
+        if procedure == 'get_all_app_configurations':
+            lambda_function.applyChangedRows({'configuration': {'A'}, 'message': set()},
+                                             [('configuration', 'A', None)], monotonic())
+            return [('A', 'v1')]
+        return []
+    monkeypatch.setattr(lambda_function, "callProcedure", call_procedure)
+
+    lambda_function.loadCache()
+
+    assert 'A' not in lambda_function._cache['configuration']
+
+
+def test_older_load_does_not_replace_a_newer_one(monkeypatch):
+    def call_procedure(procedure, params, fetch_one=False):
+        if procedure == 'get_all_app_configurations':
+            # A second load starts and finishes while the first one is still reading
+            monkeypatch.setattr(lambda_function, "callProcedure", newer_call_procedure)
+            lambda_function.loadCache()
+            return [('A', 'old')]
+        return []
+
+    def newer_call_procedure(procedure, params, fetch_one=False):
+        return [('A', 'new')] if procedure == 'get_all_app_configurations' else []
+    monkeypatch.setattr(lambda_function, "callProcedure", call_procedure)
+
+    lambda_function.loadCache()
+
+    assert lambda_function._cache['configuration'] == {'A': 'new'}
+
+
+def test_too_stale_cache_reloads_on_the_request_path(monkeypatch):
+    loads = []
+    monkeypatch.setattr(lambda_function, "loadCache", lambda: loads.append(True))
+    # A background refresh started before the container was frozen and never finished
+    monkeypatch.setattr(lambda_function, "_cache_refreshing", True)
+    monkeypatch.setattr(lambda_function, "_cache_loaded_at",
+                        monotonic() - lambda_function.CACHE_TTL_SECONDS - lambda_function.CACHE_MAX_STALE_SECONDS - 1)
+
+    lambda_function.ensureCache()
+
+    assert loads == [True]
+
+
+def test_expired_cache_refreshes_in_the_background(monkeypatch):
+    started = []
+    monkeypatch.setattr(lambda_function, "getCredentials", lambda force_refresh=False: {})
+    monkeypatch.setattr(lambda_function, "connect", lambda credential, listen=True: BlockingConnection())
+    monkeypatch.setattr(lambda_function, "loadCache", lambda call=None: started.append(call is not None))
+    monkeypatch.setattr(lambda_function, "_cache_loaded_at", monotonic() - lambda_function.CACHE_TTL_SECONDS - 1)
+
+    lambda_function.ensureCache()
+    for _ in range(100):
+        if started:
+            break
+        lambda_function.threading.Event().wait(0.01)
+
+    assert started == [True]
+
+
+def test_failed_load_is_retried_after_the_ttl(monkeypatch):
+    attempts = []
+
+    def failing_load():
+        attempts.append(True)
+        raise RuntimeError("get_all_app_configurations does not exist")
+    monkeypatch.setattr(lambda_function, "loadCache", failing_load)
+
+    lambda_function.ensureCache()
+    lambda_function.ensureCache()
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(lambda_function, "_cache_failed_at", monotonic() - lambda_function.CACHE_TTL_SECONDS - 1)
+    lambda_function.ensureCache()
+    assert len(attempts) == 2
+
+
+class BlockingConnection:
+    '''
+    Connection whose queries wait until released, like one frozen with the container.
+    '''
+    def __init__(self):
+        self.querying = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def callproc(self, procedure, params):
+                connection.querying.set()
+                connection.release.wait(5)
+
+            def fetchall(self):
+                return [('A', 'fresh')]
+        return Cursor()
+
+    def close(self):
+        self.closed = True
+
+
+def test_background_refresh_uses_its_own_connection(monkeypatch):
+    connection = BlockingConnection()
+    opened = []
+    monkeypatch.setenv("postgres_schema", "app_config")
+    monkeypatch.setattr(lambda_function, "getCredentials", lambda force_refresh=False: {})
+    monkeypatch.setattr(lambda_function, "connect", lambda credential, listen=True: opened.append(listen) or connection)
+    monkeypatch.setattr(lambda_function, "_cache_refreshing", True)
+
+    refresh = threading.Thread(target=lambda_function.refreshCacheInBackground)
+    refresh.start()
+    assert connection.querying.wait(5)
+    # While the refresh is stuck in its query the shared connection lock is free
+    assert lambda_function._connection_lock.acquire(timeout=1)
+    lambda_function._connection_lock.release()
+
+    connection.release.set()
+    refresh.join(5)
+    assert opened == [False]
+    assert connection.closed and not lambda_function._cache_refreshing
+    assert lambda_function._cache['configuration'] == {'A': 'fresh'}
+
+
+def test_connections_have_timeouts(monkeypatch):
+    seen = {}
+
+    class Connection:
+        autocommit = False
+
+    monkeypatch.setattr(lambda_function.psycopg2, "connect", lambda **kwargs: seen.update(kwargs) or Connection())
+    lambda_function.connect({"username": "u", "password": "p", "host": "h", "db": "d", "port": "5432"}, listen=False)
+
+    assert seen["connect_timeout"] == lambda_function.CONNECT_TIMEOUT_SECONDS
+    assert seen["keepalives"] == 1
+    assert f"statement_timeout={lambda_function.STATEMENT_TIMEOUT_MS}" in seen["options"]
+
+
+def test_miss_caches_the_same_text_as_the_bulk_load(monkeypatch):
+    called = []
+
+    def call_procedure(procedure, params, fetch_one=False):
+        called.append(procedure)
+        return ('true',)
+    monkeypatch.setattr(lambda_function, "ensureCache", lambda: None)
+    monkeypatch.setattr(lambda_function, "callProcedure", call_procedure)
+
+    assert lambda_function.get_configuration('FLAG') == [('true',)]
+    assert called == ['app_configuration_value']
+    assert lambda_function._cache['configuration']['FLAG'] == 'true'
+
+
+def test_missing_code_is_not_found(monkeypatch):
+    monkeypatch.setattr(lambda_function, "ensureCache", lambda: None)
+    monkeypatch.setattr(lambda_function, "callProcedure", lambda procedure, params, fetch_one=False: (None,))
+
+    assert lambda_function.get_message('NOPE') == []
+    assert 'NOPE' not in lambda_function._cache['message']
+
+
+def test_miss_without_the_sql_functions_uses_the_procedure_uncached(monkeypatch):
+    def call_procedure(procedure, params, fetch_one=False):
+        if procedure == 'app_configuration_value':
+            raise lambda_function.psycopg2.errors.UndefinedFunction("function app_configuration_value does not exist")
+        return (True,)
+    monkeypatch.setattr(lambda_function, "ensureCache", lambda: None)
+    monkeypatch.setattr(lambda_function, "callProcedure", call_procedure)
+
+    assert lambda_function.get_configuration('FLAG') == [(True,)]
+    assert 'FLAG' not in lambda_function._cache['configuration']
@@ -0,0 +1,80 @@
+"""
+Cache-Control, ETag and 304 handling of the single code lookups.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_function  # noqa: E402
+from lambda_function import etagMatches  # noqa: E402
+
+ETAG = '"abc123"'
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ('', False),
+    ('"abc123"', True),
+    ('W/"abc123"', True),
+    ('*', True),
+    (' * ', True),
+    ('"other", W/"abc123"', True),
+    ('"other","abc123"', True),
+    ('"other", W/"more"', False),
+    ('abc123', False),
+    ('"abc1234"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert etagMatches(if_none_match, ETAG) is expected
+
+
+@pytest.fixture(autouse=True)
+def cached(monkeypatch):
+    monkeypatch.setattr(lambda_function, "_cache", {'configuration': {'TIMEOUT': '30'}, 'message': {}})
+    monkeypatch.setattr(lambda_function, "ensureCache", lambda: None)
+    monkeypatch.setattr(lambda_function, "callProcedure", lambda procedure, params, fetch_one=False: None)
+
+
+def lookup(code, headers=None):
+    return lambda_function.lambda_handler({
+        'httpMethod': 'GET', 'resource': '/configurations/{code}', 'pathParameters': {'code': code}, 'headers': headers,
+    }, None)
+
+
+def test_found_value_is_cacheable_with_an_etag():
+    response = lookup('TIMEOUT')
+    assert response['statusCode'] == 200
+    assert response['headers']['Cache-Control'] == lambda_function.DEFAULT_CACHE_CONTROL
+    assert response['headers']['ETag'] == lambda_function.makeEtag(response['body'])
+    assert json.loads(json.loads(response['body'])) == {'status': 'success', 'message': '30'}
+
+
+@pytest.mark.parametrize("header", ['If-None-Match', 'if-none-match'])
+def test_matching_etag_gets_a_304_without_body(header):
+    etag = lookup('TIMEOUT')['headers']['ETag']
+
+    response = lookup('TIMEOUT', {header: f'W/{etag}'})
+
+    assert response['statusCode'] == 304
+    assert response['body'] == ''
+    assert response['headers']['ETag'] == etag
+
+
+def test_changed_value_gets_the_new_body():
+    etag = lookup('TIMEOUT')['headers']['ETag']
+    lambda_function._cache['configuration']['TIMEOUT'] = '60'
+
+    response = lookup('TIMEOUT', {'If-None-Match': etag})
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] != etag
+
+
+def test_per_code_rule_and_not_found(monkeypatch):
+    monkeypatch.setattr(lambda_function, "CACHE_CONTROL_RULES", {'configurations': {'TIMEOUT': 'no-store'}})
+    assert lookup('TIMEOUT')['headers']['Cache-Control'] == 'no-store'
+    assert lookup('MISSING')['headers']['Cache-Control'] == lambda_function.NOT_FOUND_CACHE_CONTROL
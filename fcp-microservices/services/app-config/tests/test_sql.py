@@ -0,0 +1,63 @@
+"""
+Checks the sql/ functions against stand-in get_app_configuration /
+get_app_message procedures on a real Postgres. Set BENCH_PG_DSN (see
+benchmark.py) to run them.
+"""
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+DSN = os.getenv("BENCH_PG_DSN")
+SCHEMA = "app_config_sql_test"
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql")
+
+# A numeric configuration value, so the text conversion is exercised
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path TO {SCHEMA};
+CREATE TABLE app_configuration (config_code text, lang text, config_value numeric, PRIMARY KEY (config_code, lang));
+CREATE TABLE app_message (message_code text, lang text, message_text text, PRIMARY KEY (message_code, lang));
+INSERT INTO app_configuration VALUES ('TIMEOUT', 'en-US', 1.50), ('TIMEOUT', 'fr-FR', 2), ('EMPTY', 'en-US', NULL);
+INSERT INTO app_message VALUES ('HELLO', 'en-US', 'Hello'), ('HELLO', 'fr-FR', 'Bonjour');
+CREATE FUNCTION get_app_configuration(p_code text, p_lang text) RETURNS TABLE (config_value numeric)
+    LANGUAGE sql STABLE AS $$ SELECT config_value FROM app_configuration WHERE config_code = p_code AND lang = p_lang $$;
+CREATE FUNCTION get_app_message(p_code text, p_lang text) RETURNS TABLE (message_text text)
+    LANGUAGE sql STABLE AS $$ SELECT message_text FROM app_message WHERE message_code = p_code AND lang = p_lang $$;
+"""
+
+
+@pytest.fixture(scope="module")
+def cursor():
+    if not DSN:
+        pytest.skip("BENCH_PG_DSN is not set")
+    connection = psycopg2.connect(DSN)
+    connection.autocommit = True
+    cursor = connection.cursor()
+    cursor.execute(SETUP_SQL)
+    for sql_file in sorted(os.listdir(SQL_DIR)):
+        with open(os.path.join(SQL_DIR, sql_file)) as f:
+            cursor.execute(f.read())
+    yield cursor
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    connection.close()
+
+
+def test_bulk_and_batch_return_the_same_text_values(cursor):
+    cursor.execute("SELECT * FROM get_all_app_configurations('en-US')")
+    bulk = dict(cursor.fetchall())
+    cursor.execute("SELECT * FROM get_app_lookup_batch(ARRAY['TIMEOUT', 'EMPTY', 'MISSING'], ARRAY['HELLO'], 'en-US')")
+    batch = {(kind, code): value for kind, code, value in cursor.fetchall()}
+
+    assert bulk == {'TIMEOUT': '1.50'}
+    assert batch == {('configuration', 'TIMEOUT'): '1.50', ('configuration', 'EMPTY'): None,
+                     ('configuration', 'MISSING'): None, ('message', 'HELLO'): 'Hello'}
+
+
+def test_values_match_the_existing_procedures(cursor):
+    cursor.execute("SELECT * FROM get_app_configuration('TIMEOUT', 'en-US')")
+    assert str(cursor.fetchone()[0]) == '1.50'
+    cursor.execute("SELECT * FROM get_all_app_messages('fr-FR')")
+    assert cursor.fetchall() == [('HELLO', 'Bonjour')]